@@ -0,0 +1,130 @@
+# cassette.py
+"""
+Record/replay chat model responses.
+
+A cassette is a JSON file mapping a hash of (model, temperature, messages) to
+the recorded response content. Recording wraps a real model and stores every
+answer; replaying serves answers from the file with optional simulated latency,
+so load tests can use realistic outputs without calling the provider.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from benchmarks.fake_llm import FakeChatModel, FakeMessage
+
+
+def cassette_key(model, temperature, messages):
+    """Stable key for one model call."""
+    payload = json.dumps(
+        [model, temperature, [[type(m).__name__, m.content] for m in messages]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Thread-safe in-memory view of a cassette file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, key):
+        with self._lock:
+            content = self.entries.get(key)
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return content
+
+    def put(self, key, content):
+        with self._lock:
+            self.entries[key] = content
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f, indent=2)
+
+
+class CassetteChatModel:
+    """
+    Serves responses from a cassette.
+
+    Parameters:
+        cassette (Cassette): Recorded responses.
+        model (str): Model name, part of the lookup key.
+        temperature (float): Temperature, part of the lookup key.
+        latency (float): Seconds to sleep per call.
+        on_miss (str): "fake" to answer misses with the fake model, "error" to raise.
+    """
+
+    def __init__(self, cassette, model, temperature, latency=0.0, on_miss="fake"):
+        self.cassette = cassette
+        self.model = model
+        self.temperature = temperature
+        self.latency = latency
+        self.on_miss = on_miss
+        self._fallback = FakeChatModel(model=model, temperature=temperature)
+
+    def invoke(self, messages, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.cassette.get(cassette_key(self.model, self.temperature, messages))
+        if content is None:
+            if self.on_miss == "error":
+                raise KeyError(f"No cassette entry for {self.model} call")
+            return self._fallback.invoke(messages)
+        return FakeMessage(content)
+
+
+class RecordingChatModel:
+    """Wraps a real model and stores each response in a cassette."""
+
+    def __init__(self, cassette, llm, model, temperature):
+        self.cassette = cassette
+        self.llm = llm
+        self.model = model
+        self.temperature = temperature
+
+    def invoke(self, messages, **kwargs):
+        result = self.llm.invoke(messages, **kwargs)
+        self.cassette.put(cassette_key(self.model, self.temperature, messages), result.content)
+        return result
+
+
+def install(path, record=False, latency=0.0, on_miss="fake"):
+    """
+    Route every ``get_chat_model`` call through a cassette.
+
+    Parameters:
+        path (str): Cassette file.
+        record (bool): Wrap the real models and record their responses.
+        latency (float): Simulated latency per replayed call, in seconds.
+        on_miss (str): Behaviour on a replay miss, "fake" or "error".
+
+    Returns:
+        Cassette: The cassette, so callers can ``save()`` it or read hit counts.
+    """
+    from core.llm import _default_factory, set_chat_model_factory
+
+    cassette = Cassette(path)
+
+    def factory(model, temperature, **kwargs):
+        if record:
+            llm = _default_factory(model=model, temperature=temperature, **kwargs)
+            return RecordingChatModel(cassette, llm, model, temperature)
+        return CassetteChatModel(cassette, model, temperature, latency=latency, on_miss=on_miss)
+
+    set_chat_model_factory(factory)
+    return cassette
@@ -0,0 +1,107 @@
+# harness.py
+"""
+Shared setup for offline benchmark runs: fake LLM plus a local storage backend.
+"""
+import os
+import sys
+import tempfile
+
+BACKENDS = ("local", "mongomock", "mongo")
+MONGOMOCK_URI = "mongodb://mongomock.local"
+
+
+def use_offline_environment(latency=0.0, tokens=60, storage_dir=None, backend="local"):
+    """
+    Point the pipeline at a fake LLM and the chosen storage backend.
+
+    With the ``local`` backend, Mongo persistence is disabled and ``MONGO_URI``
+    is cleared, so the personalization lookup is skipped and checkpoints go to
+    JSON files in ``storage_dir``. With ``mongomock`` every Mongo code path runs
+    against an in-memory mongomock client instead. ``mongo`` uses the real
+    server from ``MONGO_URI``, for sizing runs against actual storage.
+
+    Parameters:
+        latency (float): Simulated LLM latency per call, in seconds.
+        tokens (int): Words per free-text LLM response.
+        storage_dir (str, optional): Directory for the local stores. A new
+            temporary directory is created when omitted.
+        backend (str): One of "local", "mongomock" or "mongo".
+
+    Returns:
+        str: The storage directory in use.
+    """
+    from benchmarks import fake_llm
+    import memory.memory_store as memory_store
+    import memory.archive as archive
+    import memory.langraph_adapter as langraph_adapter
+    import memory.mongodb.mongo_helper as mongo_helper
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    storage_dir = storage_dir or tempfile.mkdtemp(prefix="tca-bench-")
+    memory_store.MEMORY_PATH = os.path.join(storage_dir, "user_memory.json")
+    langraph_adapter.CHECKPOINT_FILE = os.path.join(storage_dir, "langgraph_checkpoints.json")
+    archive.ARCHIVE_DIR = os.path.join(storage_dir, "archive")
+    memory_store.mongo_db = None
+    langraph_adapter.mongo_db = None
+
+    if backend == "mongomock":
+        import mongomock
+
+        os.environ["MONGO_URI"] = MONGOMOCK_URI
+        mongo_helper.MONGO_URI = MONGOMOCK_URI
+        mongo_helper.set_client(mongomock.MongoClient())
+        for module in (memory_store, langraph_adapter):
+            module.USE_MONGO = True
+            module.MONGO_URI = MONGOMOCK_URI
+    elif backend == "mongo":
+        uri = os.environ.get("MONGO_URI")
+        if not uri:
+            raise ValueError("MONGO_URI environment variable must be set for the mongo backend")
+        mongo_helper.MONGO_URI = uri
+        for module in (memory_store, langraph_adapter):
+            module.USE_MONGO = True
+            module.MONGO_URI = uri
+    else:
+        os.environ.pop("MONGO_URI", None)
+        for module in (memory_store, langraph_adapter):
+            module.USE_MONGO = False
+
+    fake_llm.install(latency=latency, tokens=tokens)
+    return storage_dir
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of values using linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values_s):
+    """Summarize a list of durations in seconds as milliseconds."""
+    values = [v * 1000.0 for v in values_s]
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) if values else 0.0,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": max(values) if values else 0.0,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (0.0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux.
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
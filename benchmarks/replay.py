@@ -0,0 +1,264 @@
+# replay.py
+"""
+Transcript replay load test for TCAPipeline.
+
+Replays recorded conversations as concurrent sessions arriving at a given
+rate, and reports turn latency percentiles, storage operations per turn,
+error rates, how many LLM requests were coalesced with an identical
+in-flight call and, with TCA_SPECULATIVE_RESPONSE=true, the speculative
+response hit rate and wasted tokens, as JSON. Each turn is one ``pipeline.process`` call followed by a
+checkpoint save, as in the demos.
+
+Accepted transcript sources:
+  - exported ``chats`` documents (JSON array or mongoexport JSONL), using
+    either ``turns`` ({"user", "bot"} dicts) or ``conversation`` ("User: ..." lines),
+  - ``langgraph_checkpoints.json`` ({user_id: checkpoint}),
+  - JSONL of {"session_id": ..., "message": ...} records.
+
+Usage:
+    python -m benchmarks.replay memory/langgraph_checkpoints.json --mode therapist \\
+        --sessions 200 --concurrency 32 --arrival-rate 10 --latency 0.3
+    python -m benchmarks.replay chats.jsonl --llm cassette --cassette run.cassette.json \\
+        --backend mongomock
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import storage_ops
+from benchmarks.harness import BACKENDS, peak_rss_mb, summarize, use_offline_environment
+
+
+def _messages_from_doc(doc):
+    if isinstance(doc.get("turns"), list):
+        return [t.get("user") for t in doc["turns"] if isinstance(t, dict) and t.get("user")]
+    if isinstance(doc.get("conversation"), list):
+        return [line.split(":", 1)[1].strip() for line in doc["conversation"]
+                if isinstance(line, str) and line.startswith("User:")]
+    return []
+
+
+def _session_id(doc, index):
+    for key in ("session_id", "user_id", "chat_id"):
+        if doc.get(key):
+            return str(doc[key])
+    return f"session-{index}"
+
+
+def load_transcripts(path):
+    """
+    Load recorded conversations from any supported source.
+
+    Parameters:
+        path (str): JSON or JSONL transcript file.
+
+    Returns:
+        list: (session_id, [user messages]) tuples, in source order.
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+        records = None
+    except json.JSONDecodeError:
+        data = None
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    sessions = {}
+    if isinstance(data, dict):
+        # langgraph_checkpoints.json: {user_id: checkpoint}
+        for user_id, state in data.items():
+            if isinstance(state, dict):
+                sessions[str(user_id)] = _messages_from_doc(state)
+    else:
+        for index, doc in enumerate(data if isinstance(data, list) else records):
+            if "message" in doc:
+                sid = str(doc.get("session_id") or doc.get("user_id") or "session-0")
+                sessions.setdefault(sid, []).append(doc["message"])
+            else:
+                sessions.setdefault(_session_id(doc, index), []).extend(_messages_from_doc(doc))
+    return [(sid, messages) for sid, messages in sessions.items() if messages]
+
+
+class ReplayStats:
+    """Thread-safe accumulation of per-turn results."""
+
+    def __init__(self):
+        self.turn_latencies = []
+        self.process_latencies = []
+        self.ops_per_turn = []
+        self.errors = {}
+        self.turns = 0
+        self._lock = threading.Lock()
+
+    def add_turn(self, total_s, process_s, ops):
+        with self._lock:
+            self.turns += 1
+            self.turn_latencies.append(total_s)
+            self.process_latencies.append(process_s)
+            self.ops_per_turn.append(ops)
+
+    def add_error(self, exc):
+        with self._lock:
+            self.turns += 1
+            name = type(exc).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self):
+        error_count = sum(self.errors.values())
+        op_totals = {}
+        for ops in self.ops_per_turn:
+            for op, count in ops.items():
+                op_totals[op] = op_totals.get(op, 0) + count
+        ok_turns = len(self.ops_per_turn) or 1
+        return {
+            "turns": self.turns,
+            "errors": {
+                "count": error_count,
+                "rate": error_count / self.turns if self.turns else 0.0,
+                "by_type": self.errors,
+            },
+            "turn_latency": summarize(self.turn_latencies),
+            "process_latency": summarize(self.process_latencies),
+            "storage_ops_per_turn": {
+                "total": sum(op_totals.values()) / ok_turns,
+                "by_op": {op: total / ok_turns for op, total in sorted(op_totals.items())},
+            },
+        }
+
+
+def replay_session(session_id, messages, mode, stats, think_time=0.0):
+    """Replay one conversation turn by turn on the current thread."""
+    from core.pipeline import TCAPipeline
+    from memory.langraph_adapter import LangGraphMemoryAdapter
+
+    storage_ops.reset()
+    pipeline = TCAPipeline(mode, session_id=session_id)
+    pipeline.load(LangGraphMemoryAdapter.load_checkpoint(session_id))
+    for message in messages:
+        storage_ops.reset()
+        start = time.perf_counter()
+        try:
+            pipeline.process(message)
+            processed = time.perf_counter()
+            # Persist this turn's deferred personalization too, as the demos do.
+            pipeline.flush_deferred()
+            LangGraphMemoryAdapter.save_checkpoint(session_id, pipeline.to_dict())
+        except Exception as e:
+            stats.add_error(e)
+            continue
+        stats.add_turn(time.perf_counter() - start, processed - start, storage_ops.snapshot())
+        if think_time:
+            time.sleep(think_time)
+
+
+def run(args):
+    storage_dir = use_offline_environment(latency=args.latency, tokens=args.tokens,
+                                          backend=args.backend)
+    cassette = None
+    if args.llm == "cassette":
+        from benchmarks import cassette as cassette_module
+        cassette = cassette_module.install(args.cassette, record=False,
+                                           latency=args.latency, on_miss=args.on_miss)
+    elif args.llm == "record":
+        from benchmarks import cassette as cassette_module
+        cassette = cassette_module.install(args.cassette, record=True)
+    storage_ops.install()
+    from core.llm import singleflight_stats
+    from core.speculation import speculation_stats
+
+    transcripts = load_transcripts(args.source)
+    if not transcripts:
+        raise ValueError(f"No conversations found in {args.source}")
+    count = args.sessions or len(transcripts)
+    rng = random.Random(args.seed)
+    stats = ReplayStats()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = []
+        for i in range(count):
+            source_id, messages = transcripts[i % len(transcripts)]
+            if args.max_turns:
+                messages = messages[:args.max_turns]
+            session_id = f"{args.session_prefix}{i}-{source_id}"
+            futures.append(pool.submit(replay_session, session_id, messages,
+                                       args.mode, stats, args.think_time))
+            if args.arrival_rate > 0 and i < count - 1:
+                # Poisson arrivals: exponential gaps with the requested mean rate.
+                time.sleep(rng.expovariate(args.arrival_rate))
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    if cassette is not None and args.llm == "record":
+        cassette.save()
+
+    report = stats.report()
+    report.update({
+        "config": {
+            "source": args.source,
+            "mode": args.mode,
+            "backend": args.backend,
+            "llm": args.llm,
+            "sessions": count,
+            "concurrency": args.concurrency,
+            "arrival_rate": args.arrival_rate,
+            "latency_s": args.latency,
+            "storage_dir": storage_dir,
+        },
+        "elapsed_s": elapsed,
+        "turns_per_s": stats.turns / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "llm_singleflight": singleflight_stats(),
+        "speculation": speculation_stats(),
+    })
+    if cassette is not None:
+        report["cassette"] = {"hits": cassette.hits, "misses": cassette.misses}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded conversations as a load test.")
+    parser.add_argument("source", help="Transcript file (chats export, checkpoints JSON or JSONL)")
+    parser.add_argument("--mode", default="therapist", choices=["therapist", "security", "therapist_with_safety"])
+    parser.add_argument("--backend", default="local", choices=BACKENDS)
+    parser.add_argument("--llm", default="fake", choices=["fake", "cassette", "record"])
+    parser.add_argument("--cassette", default="replay.cassette.json",
+                        help="Cassette file for --llm cassette/record")
+    parser.add_argument("--on-miss", default="fake", choices=["fake", "error"],
+                        help="What a cassette replay does for unrecorded calls")
+    parser.add_argument("--sessions", type=int, default=0,
+                        help="Sessions to run, cycling through transcripts (default: one each)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum concurrent sessions")
+    parser.add_argument("--arrival-rate", type=float, default=0.0,
+                        help="New sessions per second (0 starts them all at once)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause between turns (s)")
+    parser.add_argument("--max-turns", type=int, default=0, help="Truncate each transcript")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated LLM latency (s)")
+    parser.add_argument("--tokens", type=int, default=60, help="Words per fake LLM response")
+    parser.add_argument("--session-prefix", default="replay-")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    if args.llm != "fake" and not args.cassette:
+        parser.error("--cassette is required with --llm cassette/record")
+
+    logging.getLogger("core.pipeline").setLevel(logging.ERROR)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# startup.py
+"""
+Cold-start benchmark: module import time and time-to-first-turn.
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+The first turn uses the fake LLM and local storage, so the numbers reflect our
+own startup cost rather than network latency.
+
+Usage:
+    python -m benchmarks.startup --mode therapist --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MODULES = [
+    "core.pipeline",
+    "memory.memory_store",
+    "memory.langraph_adapter",
+    "memory.mongodb.mongo_helper",
+]
+
+FIRST_TURN_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from core.pipeline import TCAPipeline
+t1 = time.perf_counter()
+from benchmarks.harness import use_offline_environment
+use_offline_environment()
+t2 = time.perf_counter()
+pipeline = TCAPipeline({mode!r})
+pipeline.load({{}})
+pipeline.process("I have been feeling tired lately.")
+t3 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_turn_s": t3 - t2}}))
+"""
+
+
+def _run(args, env=None):
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _clean_env():
+    env = dict(os.environ)
+    env.pop("MONGO_URI", None)
+    env["USE_MONGO"] = "false"
+    return env
+
+
+def measure_import(module: str, top: int = 10) -> dict:
+    """
+    Import a module in a fresh interpreter under ``-X importtime``.
+
+    Returns:
+        dict: Total cumulative import time and the slowest transitive imports.
+    """
+    proc = _run(["-X", "importtime", "-c", f"import {module}"], env=_clean_env())
+    rows = []
+    for line in proc.stderr.splitlines():
+        # Lines look like "import time:   self_us |   cumulative_us |   package".
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    total_us = next((us for us, name in rows if name == module), 0)
+    slowest = sorted(rows, reverse=True)[:top]
+    return {
+        "module": module,
+        "import_ms": total_us / 1000.0,
+        "slowest": [{"module": name, "cumulative_ms": us / 1000.0} for us, name in slowest],
+    }
+
+
+def measure_first_turn(mode: str, repeat: int) -> dict:
+    """
+    Time import plus one full turn with the fake LLM, in fresh interpreters.
+
+    Returns:
+        dict: Median and max of the import and first-turn times, in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        proc = _run(["-c", FIRST_TURN_SCRIPT.format(mode=mode)], env=_clean_env())
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    imports = [s["import_s"] * 1000.0 for s in samples]
+    turns = [s["first_turn_s"] * 1000.0 for s in samples]
+    return {
+        "mode": mode,
+        "repeat": repeat,
+        "import_ms": {"median": statistics.median(imports), "max": max(imports)},
+        "first_turn_ms": {"median": statistics.median(turns), "max": max(turns)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-turn.")
+    parser.add_argument("--mode", default="therapist", choices=["therapist", "security", "therapist_with_safety"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module")
+    args = parser.parse_args()
+
+    results = {
+        "imports": [measure_import(module, args.top) for module in IMPORT_MODULES],
+        "first_turn": measure_first_turn(args.mode, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# storage_ops.py
+"""
+Per-turn counting of storage operations for load tests.
+
+Local JSON stores are counted at their file read/write helpers; Mongo is
+counted by wrapping the shared client so that every collection method call is
+one operation. Counts live in a context variable, like the per-turn Mongo
+count in ``core.metrics``: stages the pipeline runs on worker threads copy the
+turn's context, so their operations are counted with the turn that started
+them.
+"""
+import contextvars
+import threading
+
+_counts = contextvars.ContextVar("tca_bench_storage_ops", default=None)
+_lock = threading.Lock()
+
+# Collection methods that result in a server round trip.
+_MONGO_OPS = {
+    "find_one", "find", "insert_one", "insert_many", "update_one", "update_many",
+    "replace_one", "delete_one", "delete_many", "bulk_write", "aggregate",
+    "count_documents", "find_one_and_update", "find_one_and_replace",
+    "find_one_and_delete", "distinct", "create_index", "create_indexes",
+}
+
+
+def reset():
+    """Start new counters for the current context (and contexts copied from it)."""
+    _counts.set({})
+
+
+def snapshot():
+    """Return a copy of the current context's counters."""
+    counts = _counts.get()
+    if counts is None:
+        return {}
+    with _lock:
+        return dict(counts)
+
+
+def _count(op):
+    counts = _counts.get()
+    if counts is None:
+        counts = {}
+        _counts.set(counts)
+    with _lock:
+        counts[op] = counts.get(op, 0) + 1
+
+
+def _wrap(fn, op):
+    def counted(*args, **kwargs):
+        _count(op)
+        return fn(*args, **kwargs)
+    counted.__wrapped__ = fn
+    return counted
+
+
+class _CountingCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in _MONGO_OPS:
+            return _wrap(attr, f"mongo.{name}")
+        return attr
+
+
+class _CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name])
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class _CountingClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return _CountingDatabase(self._client[name])
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def install():
+    """Wrap the local store helpers and, if Mongo is in use, the shared client."""
+    import memory.memory_store as memory_store
+    import memory.langraph_adapter as langraph_adapter
+    import memory.mongodb.mongo_helper as mongo_helper
+
+    for module, name in ((memory_store, "memory_store"), (langraph_adapter, "checkpoints")):
+        if not hasattr(module._read_local, "__wrapped__"):
+            module._read_local = _wrap(module._read_local, f"local.{name}.read")
+            module._write_local = _wrap(module._write_local, f"local.{name}.write")
+        # Drop cached handles so they are re-resolved through the counting client.
+        module.mongo_db = None
+
+    if mongo_helper.MONGO_URI or mongo_helper._client is not None:
+        client = mongo_helper.get_client()
+        if not isinstance(client, _CountingClient):
+            mongo_helper.set_client(_CountingClient(client))
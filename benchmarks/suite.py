@@ -0,0 +1,218 @@
+# suite.py
+"""
+End-to-end offline benchmark suite for TCAPipeline.
+
+Runs the real pipeline against the fake LLM and a local storage backend and
+reports, as JSON:
+  - per-stage latency (analysis, pattern tracking, personalization lookup,
+    response, profile update, checkpoint save),
+  - turns/sec at several levels of concurrent sessions,
+  - checkpoint size and save time as a session grows,
+  - peak RSS,
+  - a snapshot of core.metrics (LLM calls and tokens per stage, Mongo ops).
+
+Usage:
+    python -m benchmarks.suite --latency 0.01 --sessions 1,8,32 --max-turns 1000
+    python -m benchmarks.suite --backend mongomock --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import BACKENDS, peak_rss_mb, summarize, use_offline_environment
+
+SAMPLE_INPUTS = [
+    "I have been feeling tired lately.",
+    "Work keeps piling up and I can't sleep.",
+    "My sister called today, it was nice.",
+    "I don't know if I can keep doing this.",
+    "Can you help me plan my week?",
+    "I finally went for a run this morning.",
+]
+
+
+def sample_input(i):
+    return f"{SAMPLE_INPUTS[i % len(SAMPLE_INPUTS)]} ({i})"
+
+
+class StageRecorder:
+    """Collects wall-clock durations per pipeline stage."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, fn, stage):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, pipeline):
+        """Wrap the stage methods of one pipeline instance."""
+        pipeline.meaning_engine.analyze = self.wrap(pipeline.meaning_engine.analyze, "analyze")
+        pipeline.pattern_tracker.track = self.wrap(pipeline.pattern_tracker.track, "pattern_track")
+        pipeline.load_personalization_context = self.wrap(
+            pipeline.load_personalization_context, "personalization_context")
+        pipeline.response_engine.decide = self.wrap(pipeline.response_engine.decide, "response")
+        return pipeline
+
+    def summary(self):
+        with self._lock:
+            return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+def _instrument_profile_update(recorder):
+    # process() calls the module-level update_user_profile imported into core.pipeline.
+    import core.pipeline as pipeline_module
+    original = pipeline_module.update_user_profile
+    pipeline_module.update_user_profile = recorder.wrap(original, "profile_update")
+    return lambda: setattr(pipeline_module, "update_user_profile", original)
+
+
+def _run_session(session_id, turns, mode, recorder=None):
+    from core.pipeline import TCAPipeline
+    from memory.langraph_adapter import LangGraphMemoryAdapter
+
+    pipeline = TCAPipeline(mode, session_id=session_id)
+    pipeline.load(LangGraphMemoryAdapter.load_checkpoint(session_id))
+    if recorder is not None:
+        recorder.instrument(pipeline)
+    for i in range(turns):
+        pipeline.process(sample_input(i))
+        start = time.perf_counter()
+        LangGraphMemoryAdapter.save_checkpoint(session_id, pipeline.to_dict())
+        if recorder is not None:
+            recorder.record("checkpoint_save", time.perf_counter() - start)
+
+
+def bench_stage_latency(mode, turns):
+    """Per-stage latency over one session of ``turns`` turns."""
+    recorder = StageRecorder()
+    restore = _instrument_profile_update(recorder)
+    try:
+        _run_session("bench-stages", turns, mode, recorder)
+    finally:
+        restore()
+    return recorder.summary()
+
+
+def bench_throughput(mode, session_counts, turns):
+    """Turns/sec with N sessions running concurrently, for each N."""
+    results = []
+    for n in session_counts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            futures = [pool.submit(_run_session, f"bench-tp-{n}-{i}", turns, mode)
+                       for i in range(n)]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+        results.append({
+            "sessions": n,
+            "turns": n * turns,
+            "elapsed_s": elapsed,
+            "turns_per_s": (n * turns) / elapsed if elapsed else 0.0,
+        })
+    return results
+
+
+def bench_checkpoint_growth(mode, max_turns, every):
+    """Checkpoint size and save time as a single session grows."""
+    from core.pipeline import TCAPipeline
+    from memory.langraph_adapter import LangGraphMemoryAdapter
+
+    session_id = "bench-growth"
+    pipeline = TCAPipeline(mode, session_id=session_id)
+    pipeline.load({})
+    points = []
+    for i in range(1, max_turns + 1):
+        pipeline.process(sample_input(i))
+        if i % every and i != max_turns:
+            continue
+        state = pipeline.to_dict()
+        size = len(json.dumps(state, default=str).encode("utf-8"))
+        start = time.perf_counter()
+        LangGraphMemoryAdapter.save_checkpoint(session_id, state)
+        save_s = time.perf_counter() - start
+        start = time.perf_counter()
+        LangGraphMemoryAdapter.load_checkpoint(session_id)
+        load_s = time.perf_counter() - start
+        points.append({
+            "turns": i,
+            "checkpoint_bytes": size,
+            "save_ms": save_s * 1000.0,
+            "load_ms": load_s * 1000.0,
+        })
+    return points
+
+
+def run(args):
+    from core import metrics
+
+    storage_dir = use_offline_environment(latency=args.latency, tokens=args.tokens,
+                                          backend=args.backend)
+    metrics.enable()
+    metrics.get_registry().reset()
+    session_counts = [int(n) for n in args.sessions.split(",") if n]
+    results = {
+        "config": {
+            "mode": args.mode,
+            "backend": args.backend,
+            "latency_s": args.latency,
+            "tokens": args.tokens,
+            "turns": args.turns,
+            "sessions": session_counts,
+            "max_turns": args.max_turns,
+            "python": platform.python_version(),
+            "storage_dir": storage_dir,
+        },
+        "stage_latency": bench_stage_latency(args.mode, args.turns),
+        "throughput": bench_throughput(args.mode, session_counts, args.turns),
+        "checkpoint_growth": bench_checkpoint_growth(args.mode, args.max_turns, args.every),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    results["metrics"] = metrics.get_registry().snapshot()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmarks.")
+    parser.add_argument("--mode", default="therapist", choices=["therapist", "security", "therapist_with_safety"])
+    parser.add_argument("--backend", default="local", choices=BACKENDS)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake LLM latency per call (s)")
+    parser.add_argument("--tokens", type=int, default=60, help="Words per fake LLM response")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per session")
+    parser.add_argument("--sessions", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--max-turns", type=int, default=1000, help="Turns for checkpoint growth")
+    parser.add_argument("--every", type=int, default=100, help="Growth sampling interval (turns)")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    # The pipeline prints progress messages and warns once per turn when Mongo is
+    # not configured; keep stdout clean for the JSON and stderr readable.
+    logging.getLogger("core.pipeline").setLevel(logging.ERROR)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
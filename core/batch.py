@@ -0,0 +1,302 @@
+# batch.py
+"""
+Bulk processing of many sessions' messages (nightly re-analysis, QA, backfills).
+
+``process_batch`` takes an iterable of ``(session_id, message)`` items and
+works through it in chunks of ``batch_size`` items:
+
+- Each session's messages run in input order on that session's pipeline;
+  different sessions run concurrently, up to ``concurrency`` at a time.
+- ``respond=False`` analyzes and records the turns without generating
+  responses.
+- At the end of each chunk the touched sessions' checkpoints and the profile
+  updates collected during the chunk are written with one bulk write each.
+- Results are yielded per chunk, in input order, so only one chunk of results
+  is held in memory.
+
+How sessions and their LLM calls are executed is up to the backend:
+``ThreadBackend`` (the default) runs sessions on a thread pool with ordinary
+calls; ``ProviderBatchBackend`` additionally groups the calls that concurrent
+sessions make to the same model and sends each group through the model's
+batch interface (LangChain's ``batch``, which providers with a native batch
+endpoint implement). Other backends only need ``__enter__``/``__exit__`` and
+``run_sessions``.
+
+Usage:
+    python -m core.batch messages.jsonl --mode therapist --analysis-only --output results.jsonl
+"""
+import argparse
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from core import metrics
+from core.batching import MicroBatcher
+
+CONCURRENCY = int(os.environ.get("TCA_BATCH_CONCURRENCY", "8"))
+BATCH_SIZE = int(os.environ.get("TCA_BATCH_SIZE", "500"))
+MAX_SESSIONS = int(os.environ.get("TCA_BATCH_MAX_SESSIONS", "10000"))
+
+
+class ThreadBackend:
+    """Runs sessions concurrently on a thread pool."""
+
+    def __init__(self):
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return False
+
+    def run_sessions(self, fn, groups, concurrency):
+        """
+        Call ``fn(session_id, entries)`` for every group, sessions in parallel.
+
+        Returns:
+            list: The return values, in group order.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tca-batch")
+        futures = [self._executor.submit(contextvars.copy_context().run, fn, session_id, entries)
+                   for session_id, entries in groups]
+        return [future.result() for future in futures]
+
+
+class BatchedChatModel:
+    """
+    Chat model wrapper that sends concurrent ``invoke`` calls to the wrapped
+    model's ``batch`` in groups. Calls with extra keyword arguments, and models
+    without ``batch``, are passed straight through.
+    """
+
+    def __init__(self, llm, max_size, max_wait, name):
+        self.llm = llm
+        self.batcher = MicroBatcher(self._send, max_size, max_wait, name=f"llm:{name}")
+
+    def _send(self, requests):
+        return self.llm.batch(requests, return_exceptions=True)
+
+    def invoke(self, messages, **kwargs):
+        if kwargs or not hasattr(self.llm, "batch"):
+            return self.llm.invoke(messages, **kwargs)
+        return self.batcher.call(messages)
+
+    async def ainvoke(self, messages, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.invoke, messages, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+class ProviderBatchBackend(ThreadBackend):
+    """
+    Thread backend whose LLM calls go out in provider batch requests.
+
+    While the backend is active, the chat model factory (``core.llm``) wraps
+    every new model in ``BatchedChatModel``; the previous factory is restored
+    on exit. Run it with a ``concurrency`` well above ``max_size`` so enough
+    sessions are waiting on the same model to fill a batch.
+
+    Parameters:
+        max_size (int): Largest batch sent to the provider.
+        max_wait (float): Seconds a call may wait for others to join its batch.
+    """
+
+    def __init__(self, max_size=32, max_wait=0.05):
+        super().__init__()
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._previous = None
+        self._models = []
+
+    def __enter__(self):
+        from core import llm
+
+        self._previous = llm.get_chat_model_factory()
+        previous = self._previous
+
+        def factory(model, temperature, **kwargs):
+            wrapped = BatchedChatModel(previous(model=model, temperature=temperature, **kwargs),
+                                       self.max_size, self.max_wait, model)
+            self._models.append(wrapped)
+            return wrapped
+
+        llm.set_chat_model_factory(factory)
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        from core import llm
+
+        try:
+            return super().__exit__(*exc)
+        finally:
+            llm.set_chat_model_factory(self._previous)
+
+    def stats(self):
+        """Calls, batches and mean/largest batch size per model."""
+        totals = {}
+        for m in self._models:
+            stats = m.batcher.stats()
+            total = totals.setdefault(m.batcher.name, {"items": 0, "batches": 0, "max_batch": 0})
+            total["items"] += stats["items"]
+            total["batches"] += stats["batches"]
+            total["max_batch"] = max(total["max_batch"], stats["max_batch"])
+        for total in totals.values():
+            total["mean_batch"] = total["items"] / total["batches"] if total["batches"] else 0.0
+        return totals
+
+
+def _run_session(pipelines, respond, session_id, entries):
+    pipeline = pipelines[session_id]
+    results = []
+    for index, message in entries:
+        try:
+            result, error = pipeline.process(message, respond=respond), None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        metrics.increment("tca_batch_items_total", result="error" if error else "ok")
+        results.append({"index": index, "session_id": session_id, "message": message,
+                        "result": result, "error": error})
+    return results
+
+
+def _persist(pipelines, session_ids):
+    from memory.langraph_adapter import LangGraphMemoryAdapter
+    from memory.memory_store import update_user_profiles
+
+    LangGraphMemoryAdapter.save_checkpoints({sid: pipelines[sid].to_dict() for sid in session_ids})
+    update_user_profiles({sid: pipelines[sid]._profile_updates for sid in session_ids})
+    for sid in session_ids:
+        pipelines[sid]._profile_updates = []
+
+
+def process_batch(items, mode="therapist", respond=True, concurrency=CONCURRENCY,
+                  batch_size=BATCH_SIZE, backend=None, persist=True, load_state=True,
+                  max_sessions=MAX_SESSIONS, turn_deadline=None):
+    """
+    Process ``(session_id, message)`` items; see the module docstring.
+
+    Parameters:
+        items (iterable): ``(session_id, message)`` pairs; may be a generator.
+        mode (str): Pipeline mode.
+        respond (bool): Generate responses; False for analysis only.
+        concurrency (int): Sessions processed at the same time.
+        batch_size (int): Items per chunk (the unit of persistence and output).
+        backend: Execution backend; ``ThreadBackend()`` by default.
+        persist (bool): Save checkpoints and profile updates after each chunk.
+        load_state (bool): Start each session from its saved checkpoint.
+        max_sessions (int): Pipelines kept in memory between chunks; older
+            sessions are dropped and reloaded from their checkpoint if they
+            appear again (their state is lost when ``persist`` is False).
+        turn_deadline (float, optional): Per-turn deadline override.
+
+    Yields:
+        dict: ``index``, ``session_id``, ``message``, ``result`` (the
+        ``process`` return value) and ``error`` for each item, in input order.
+    """
+    from core.pipeline import TCAPipeline
+    from memory.langraph_adapter import LangGraphMemoryAdapter
+
+    backend = backend or ThreadBackend()
+    pipelines = OrderedDict()
+    items = enumerate(items)
+    with backend:
+        while True:
+            chunk = list(itertools.islice(items, batch_size))
+            if not chunk:
+                break
+            start = time.perf_counter()
+            groups = OrderedDict()
+            for index, (session_id, message) in chunk:
+                groups.setdefault(session_id, []).append((index, message))
+
+            new = [sid for sid in groups if sid not in pipelines]
+            states = LangGraphMemoryAdapter.load_checkpoints(new) if load_state and new else {}
+            for sid in new:
+                pipeline = TCAPipeline(mode, sid, defer_personalization=False, speculative=False)
+                if states.get(sid):
+                    pipeline.load(states[sid])
+                if turn_deadline:
+                    pipeline.turn_deadline = turn_deadline
+                pipelines[sid] = pipeline
+            for sid in groups:
+                pipelines.move_to_end(sid)
+                pipelines[sid]._profile_updates = []
+
+            run = functools.partial(_run_session, pipelines, respond)
+            results = {}
+            for session_results in backend.run_sessions(run, groups.items(), concurrency):
+                for result in session_results:
+                    results[result["index"]] = result
+
+            if persist:
+                _persist(pipelines, list(groups))
+            while len(pipelines) > max_sessions:
+                pipelines.popitem(last=False)
+            metrics.observe("tca_batch_chunk_seconds", time.perf_counter() - start)
+
+            for index, _ in chunk:
+                yield results[index]
+
+
+def _read_items(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record["session_id"], record["message"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process many sessions' messages in bulk.")
+    parser.add_argument("input", help='JSONL of {"session_id": ..., "message": ...}')
+    parser.add_argument("--mode", default="therapist")
+    parser.add_argument("--analysis-only", action="store_true", help="Skip response generation")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--no-persist", action="store_true")
+    parser.add_argument("--fresh", action="store_true", help="Ignore saved checkpoints")
+    parser.add_argument("--provider-batch", type=int, metavar="N", default=0,
+                        help="Group up to N concurrent LLM calls per provider batch request")
+    parser.add_argument("--output", help="Results JSONL (default: stdout)")
+    args = parser.parse_args()
+
+    backend = ProviderBatchBackend(max_size=args.provider_batch) if args.provider_batch else None
+    out = open(args.output, "w") if args.output else sys.stdout
+    counts = {"items": 0, "errors": 0}
+    start = time.perf_counter()
+    try:
+        for result in process_batch(_read_items(args.input), mode=args.mode,
+                                    respond=not args.analysis_only, concurrency=args.concurrency,
+                                    batch_size=args.batch_size, backend=backend,
+                                    persist=not args.no_persist, load_state=not args.fresh):
+            counts["items"] += 1
+            counts["errors"] += result["error"] is not None
+            out.write(json.dumps(result, default=str) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    seconds = time.perf_counter() - start
+    counts["seconds"] = round(seconds, 2)
+    counts["items_per_second"] = round(counts["items"] / seconds, 2) if seconds else 0.0
+    if backend is not None:
+        counts["provider_batches"] = backend.stats()
+    print(json.dumps(counts, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
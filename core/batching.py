@@ -0,0 +1,123 @@
+# batching.py
+"""
+Micro-batching of independent requests.
+
+``MicroBatcher`` collects items submitted from any number of threads and hands
+them to a batch function as one list, as soon as ``max_size`` items are
+waiting or the oldest has waited ``max_wait`` seconds. Each caller gets a
+future for its own item's result. Up to ``concurrency`` batches are in flight
+at once; while all are busy, waiting items keep accumulating into the next
+batch. Batch sizes are reported in ``tca_batch_size`` (labelled with the
+batcher's name) and by ``stats()``.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from core import metrics
+
+
+class MicroBatcher:
+    """
+    Parameters:
+        fn (callable): Called with a list of items; returns one result per item,
+            in order. A result that is an ``Exception`` fails only its caller;
+            if ``fn`` raises, every caller in the batch gets the error.
+        max_size (int): Largest batch handed to ``fn``.
+        max_wait (float): Seconds the oldest item may wait for more to arrive.
+        name (str): Label for metrics and the worker thread.
+        concurrency (int): Batches handed to ``fn`` at the same time.
+    """
+
+    def __init__(self, fn, max_size=32, max_wait=0.01, name="batch", concurrency=1):
+        self.fn = fn
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.name = name
+        self.concurrency = concurrency
+        self._pending = []  # (item, future, enqueued_at)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._slots = threading.Semaphore(concurrency)
+        self._executor = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"items": 0, "batches": 0, "max_batch": 0}
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"tca-batch-{self.name}", daemon=True)
+            self._thread.start()
+
+    def submit(self, item) -> Future:
+        """Queue ``item`` and return a future for its result."""
+        future = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append((item, future, time.monotonic()))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_size:
+                self._cond.notify()
+        return future
+
+    def call(self, item, timeout=None):
+        """Submit ``item`` and wait for its result."""
+        return self.submit(item).result(timeout)
+
+    def _take(self):
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                if len(self._pending) >= self.max_size:
+                    break
+                remaining = self._pending[0][2] + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_size]
+            del self._pending[:self.max_size]
+            return batch
+
+    def _run(self):
+        while True:
+            # Only take the next batch once a slot is free, so it can keep growing meanwhile.
+            self._slots.acquire()
+            batch = self._take()
+            if self.concurrency == 1:
+                self._dispatch(batch)
+                continue
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix=f"tca-batch-{self.name}")
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        try:
+            size = len(batch)
+            with self._stats_lock:
+                self._stats["items"] += size
+                self._stats["batches"] += 1
+                self._stats["max_batch"] = max(self._stats["max_batch"], size)
+            metrics.observe("tca_batch_size", size, batcher=self.name)
+            try:
+                results = list(self.fn([item for item, _, _ in batch]))
+                if len(results) != size:
+                    raise ValueError(f"Batch function returned {len(results)} results for {size} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                return
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Items, batches and the mean and largest batch size so far."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,77 @@
+# deferred.py
+"""
+Background work that must run in order per key (per user).
+
+``KeyedWorker`` runs jobs on a shared thread pool, but never two jobs for the
+same key at once and always in submission order: jobs for one key are chained
+and drained by a single pool thread, while different keys run in parallel.
+
+The pipeline uses it to run analyzers whose output does not affect the current
+reply (personalization extraction) after the response has been returned.
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class KeyedWorker:
+    """
+    Per-key ordered job runner.
+
+    Parameters:
+        max_workers (int): Pool size, i.e. how many keys make progress at once.
+    """
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tca-deferred")
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """Queue ``fn(*args)`` behind earlier jobs for ``key``; return its Future."""
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((fn, args, future))
+                return future
+            self._queues[key] = deque()
+        self._executor.submit(self._drain, key, fn, args, future)
+        return future
+
+    def _drain(self, key, fn, args, future):
+        while True:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                fn, args, future = queue.popleft()
+
+    def pending(self):
+        """Number of keys with queued or running work."""
+        with self._lock:
+            return len(self._queues)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """The process-wide worker (``TCA_DEFERRED_WORKERS`` threads), created on first use."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = KeyedWorker(int(os.environ.get("TCA_DEFERRED_WORKERS", "8")))
+    return _worker
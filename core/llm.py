@@ -0,0 +1,287 @@
+# llm.py
+"""
+Central access point for chat models.
+
+Every plugin and engine obtains its model through ``get_chat_model`` instead of
+constructing ``ChatOpenAI`` directly. This keeps ``langchain_openai`` (and the
+openai/tiktoken stack behind it) out of the import path until the first call,
+reuses one client per (model, temperature) pair instead of building a new one
+per request, and gives benchmarks a single place to swap in a fake model.
+
+Models are returned wrapped in ``InstrumentedChatModel``, which records call
+latency and token usage per model and pipeline stage when metrics are enabled.
+
+Calls are admitted by ``core.scheduler`` (priorities, per-model rate budgets,
+adaptive concurrency and retries).
+
+Identical requests that overlap in time are coalesced ("singleflight"): while a
+call for a given (model, params, messages) is in flight, later callers wait for
+it and share its result instead of issuing their own. This works across
+threads and asyncio tasks alike. Set ``TCA_LLM_SINGLEFLIGHT=false`` to disable.
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from core import metrics
+from core.scheduler import get_scheduler
+
+_factory = None
+_models = {}
+_models_lock = threading.Lock()
+_token_meter = contextvars.ContextVar("tca_token_meter", default=None)
+
+
+@contextlib.contextmanager
+def token_meter():
+    """
+    Count tokens of LLM calls made in this context.
+
+    Yields a ``[prompt_tokens, completion_tokens]`` list updated after each call.
+    """
+    meter = [0, 0]
+    token = _token_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _token_meter.reset(token)
+
+
+def _meter(result):
+    meter = _token_meter.get()
+    if meter is not None:
+        prompt_tokens, completion_tokens = metrics.token_usage(result)
+        meter[0] += prompt_tokens
+        meter[1] += completion_tokens
+
+
+def _message_key(messages):
+    """Stable digest of a prompt (list of messages, or a plain string)."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(messages, str):
+        messages = [messages]
+    for m in messages:
+        content = getattr(m, "content", None)
+        if content is None:
+            h.update(repr(m).encode("utf-8"))
+        else:
+            h.update(type(m).__name__.encode("utf-8"))
+            h.update(b"\0")
+            h.update(str(content).encode("utf-8"))
+        h.update(b"\1")
+    return h.hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key.
+
+    The first caller (the leader) runs the call; callers arriving while it is
+    in flight wait on the same ``concurrent.futures.Future`` (wrapped with
+    ``asyncio.wrap_future`` for coroutines) and receive its result or exception.
+    Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            self.requests += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, model=""):
+        future, leader = self._join(key)
+        metrics.increment("tca_llm_singleflight_total", model=model,
+                          result="leader" if leader else "coalesced")
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, fn, model=""):
+        future, leader = self._join(key)
+        metrics.increment("tca_llm_singleflight_total", model=model,
+                          result="leader" if leader else "coalesced")
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stats(self):
+        """Requests seen, how many were coalesced, and the coalescing rate."""
+        with self._lock:
+            requests, coalesced = self.requests, self.coalesced
+        return {
+            "requests": requests,
+            "coalesced": coalesced,
+            "coalescing_rate": coalesced / requests if requests else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.coalesced = 0
+
+
+_singleflight = SingleFlight() if os.environ.get("TCA_LLM_SINGLEFLIGHT", "true").lower() == "true" else None
+
+
+def singleflight_stats():
+    """Coalescing counters for this process (all zero when disabled)."""
+    if _singleflight is None:
+        return {"requests": 0, "coalesced": 0, "coalescing_rate": 0.0}
+    return _singleflight.stats()
+
+
+# Per-request HTTP timeout; the client default (10 minutes) would outlast any turn.
+REQUEST_TIMEOUT = float(os.environ.get("TCA_LLM_REQUEST_TIMEOUT", "30"))
+
+
+def _default_factory(model, temperature, **kwargs):
+    from langchain_openai import ChatOpenAI
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    if get_scheduler() is not None:
+        # The scheduler retries within the turn deadline; avoid retrying twice.
+        kwargs.setdefault("max_retries", 0)
+    return ChatOpenAI(model=model, temperature=temperature, **kwargs)
+
+
+class InstrumentedChatModel:
+    """
+    Thin wrapper that reports each call to ``core.metrics``.
+
+    Attributes other than ``invoke``/``ainvoke`` are forwarded to the
+    underlying model.
+    """
+
+    def __init__(self, llm, model, stage, params_key=""):
+        self.llm = llm
+        self.model = model
+        self.stage = stage
+        self.params_key = params_key
+
+    def _flight_key(self, messages, kwargs):
+        call_kwargs = repr(sorted(kwargs.items())) if kwargs else ""
+        return (self.model, self.params_key, call_kwargs, _message_key(messages))
+
+    def _call(self, messages, kwargs):
+        start = time.perf_counter()
+        result = self.llm.invoke(messages, **kwargs)
+        metrics.record_llm_call(self.model, self.stage, result, time.perf_counter() - start)
+        _meter(result)
+        return result
+
+    async def _acall(self, messages, kwargs):
+        start = time.perf_counter()
+        result = await self.llm.ainvoke(messages, **kwargs)
+        metrics.record_llm_call(self.model, self.stage, result, time.perf_counter() - start)
+        _meter(result)
+        return result
+
+    def _invoke(self, messages, kwargs):
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return self._call(messages, kwargs)
+        return scheduler.call(self.model, self.stage, messages, kwargs,
+                              lambda: self._call(messages, kwargs))
+
+    async def _ainvoke(self, messages, kwargs):
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return await self._acall(messages, kwargs)
+        return await scheduler.acall(self.model, self.stage, messages, kwargs,
+                                     lambda: self._acall(messages, kwargs))
+
+    def invoke(self, messages, **kwargs):
+        if _singleflight is None:
+            return self._invoke(messages, kwargs)
+        return _singleflight.do(self._flight_key(messages, kwargs),
+                                lambda: self._invoke(messages, kwargs), self.model)
+
+    async def ainvoke(self, messages, **kwargs):
+        if _singleflight is None:
+            return await self._ainvoke(messages, kwargs)
+        return await _singleflight.do_async(self._flight_key(messages, kwargs),
+                                            lambda: self._ainvoke(messages, kwargs), self.model)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+def set_chat_model_factory(factory=None) -> None:
+    """
+    Install a custom chat model factory, or restore the default with ``None``.
+
+    Parameters:
+        factory (callable): Called as ``factory(model, temperature, **kwargs)``
+            and must return an object with an ``invoke(messages)`` method.
+    """
+    global _factory
+    with _models_lock:
+        _factory = factory
+        _models.clear()
+
+
+def get_chat_model_factory():
+    """Return the factory currently used for new chat models."""
+    return _factory or _default_factory
+
+
+def get_chat_model(model="gpt-4o", temperature=0.7, stage="default", **kwargs):
+    """
+    Return a (cached) chat model instance.
+
+    Parameters:
+        model (str): Model name.
+        temperature (float): Sampling temperature.
+        stage (str): Pipeline stage making the calls, used as a metrics label.
+        **kwargs: Extra keyword arguments forwarded to the factory.
+
+    Returns:
+        InstrumentedChatModel: A chat model exposing ``invoke(messages)``.
+    """
+    params = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+    key = (model, temperature, stage, params)
+    llm = _models.get(key)
+    metrics.record_cache("llm_client", llm is not None)
+    if llm is None:
+        with _models_lock:
+            llm = _models.get(key)
+            if llm is None:
+                factory = _factory or _default_factory
+                raw = factory(model=model, temperature=temperature, **kwargs)
+                llm = InstrumentedChatModel(raw, model, stage, repr((temperature, params)))
+                _models[key] = llm
+    return llm
@@ -1,23 +1,125 @@
 # meaning_engine.py
-from plugins.therapist.plugin import analyze_therapist_context
-from plugins.security.plugin import analyze_security_context
-from plugins.personalization.plugin import analyze_personalization_context
+# Analyzers come from ``core.registry`` and are imported on first use, so only
+# the plugins a mode needs (and their LLM dependencies) are ever loaded. When a
+# mode lists several analyzers they run concurrently on a shared thread pool,
+# each bounded by its own timeout, and their outputs are merged.
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from core import metrics, profiling, tracing
+from core.registry import get_analyzer, get_mode
+from core.resilience import get_breaker
+from core.scheduler import current_deadline
+from core.structured import FALLBACK_SOURCE
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.environ.get("TCA_ANALYZER_WORKERS", "16"))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tca-analyzer")
+    return _executor
+
+
+def _run_analyzer(name, fn, user_input):
+    with metrics.timer("tca_analyzer_seconds", analyzer=name):
+        return fn(user_input)
+
+
+def _merge(analysis, spec, result):
+    if spec.key:
+        analysis[spec.key] = result
+    else:
+        for key, value in result.items():
+            analysis.setdefault(key, value)
+
 
 class ContextualMeaningEngine:
-    def __init__(self, mode="therapist"):
+    def __init__(self, mode="therapist", deferred=()):
         self.mode = mode
+        self.spec = get_mode(mode)
+        # Analyzers named in ``deferred`` are left out of ``analyze`` and run
+        # later through ``analyze_deferred`` (see TCAPipeline).
+        self.analyzers = [s for s in self.spec.analyzers if s.name not in deferred]
+        self.deferred = [s for s in self.spec.analyzers if s.name in deferred]
 
     def analyze(self, user_input):
-        # Get mode-specific analysis
-        if self.mode == "therapist":
-            analysis = analyze_therapist_context(user_input)
-        elif self.mode == "security":
-            analysis = analyze_security_context(user_input)
-        else:
-            raise ValueError(f"Unknown mode: {self.mode}")
-
-        # Add personalization analysis
-        personalization = analyze_personalization_context(user_input)
-        print(f"Personalization analysis: {personalization}")
-        analysis["personalization"] = personalization
+        specs = self.analyzers
+        executor = _get_executor()
+        start = time.monotonic()
+        deadline_at = current_deadline()
+        futures = []
+        for spec in specs:
+            # Optional analyzers that keep failing are skipped while their breaker is open.
+            if not spec.required and not get_breaker(f"analyzer:{spec.name}").allow():
+                futures.append(None)
+                continue
+            fn = get_analyzer(spec.name)
+            # Copy the context so per-turn metrics still attribute work done in workers.
+            ctx = contextvars.copy_context()
+            futures.append(executor.submit(ctx.run, profiling.follow, _run_analyzer, spec.name, fn, user_input))
+
+        analysis = {}
+        errors = {}
+        for spec, future in zip(specs, futures):
+            if future is None:
+                errors[spec.name] = "circuit_open"
+                _merge(analysis, spec, {})
+                continue
+            # Each analyzer waits for its own timeout, but never past the turn deadline.
+            timeout_at = start + spec.timeout
+            if deadline_at is not None:
+                timeout_at = min(timeout_at, deadline_at)
+            try:
+                result = future.result(timeout=max(0.0, timeout_at - time.monotonic()))
+                if not spec.required:
+                    get_breaker(f"analyzer:{spec.name}").record_success()
+            except Exception as e:
+                reason = "timeout" if isinstance(e, FutureTimeout) else type(e).__name__
+                metrics.increment("tca_analyzer_failures_total", analyzer=spec.name, reason=reason)
+                if spec.required:
+                    raise
+                get_breaker(f"analyzer:{spec.name}").record_failure()
+                # A timed-out call keeps running in its worker; its result is discarded.
+                future.cancel()
+                errors[spec.name] = reason if reason == "timeout" else f"{reason}: {e}"
+                logger.warning("Analyzer '%s' failed (%s), continuing without it", spec.name, errors[spec.name])
+                result = {}
+            if isinstance(result, dict) and result.get("source") == FALLBACK_SOURCE:
+                # The analyzer could not parse its reply and returned its default.
+                metrics.increment("tca_analyzer_failures_total", analyzer=spec.name, reason="invalid_output")
+                errors[spec.name] = "invalid_output"
+            _merge(analysis, spec, result)
+        if errors:
+            analysis["analyzer_errors"] = errors
+
+        if "personalization" in analysis:
+            tracing.event("personalization", personalization=analysis["personalization"])
+        return analysis
+
+    def analyze_deferred(self, user_input):
+        """Run the deferred analyzers in the calling thread; failures yield ``{}``."""
+        analysis = {}
+        for spec in self.deferred:
+            try:
+                result = _run_analyzer(spec.name, get_analyzer(spec.name), user_input)
+            except Exception as e:
+                metrics.increment("tca_analyzer_failures_total", analyzer=spec.name,
+                                  reason=type(e).__name__)
+                logger.warning("Deferred analyzer '%s' failed (%s: %s)", spec.name, type(e).__name__, e)
+                result = {}
+            _merge(analysis, spec, result)
+        if "personalization" in analysis:
+            tracing.event("personalization", personalization=analysis["personalization"])
         return analysis
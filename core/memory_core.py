@@ -1,4 +1,5 @@
 # memory_core.py
+from datetime import datetime
 
 class TemporalMemoryCore:
     def __init__(self):
@@ -6,8 +7,12 @@ class TemporalMemoryCore:
             "emotion_trends": [],
             "intents": [],
             "topics": [],
+            "tones": [],
             "turns": [],
-            "personalization": []
+            "personalization": [],
+            "risk_levels": [],
+            "timestamps": [],
+            "sources": []
         }
 
     def load(self, state_dict):
@@ -18,7 +23,16 @@ class TemporalMemoryCore:
         self.session_state["emotion_trends"].append(analysis.get("emotion"))
         self.session_state["intents"].append(analysis.get("intent"))
         self.session_state["topics"].append(analysis.get("topic"))
+        # Checkpoints saved before tones were tracked start them late; readers align from the end.
+        self.session_state.setdefault("tones", []).append(analysis.get("tone"))
         self.session_state["personalization"].append(analysis.get("personalization"))
+        # Risk comes from security mode, or the parallel screen in therapist_with_safety.
+        risk = analysis.get("risk_level") or (analysis.get("security") or {}).get("risk_level")
+        # Checkpoints saved before these were tracked start them late; readers align from the end.
+        self.session_state.setdefault("risk_levels", []).append(risk)
+        self.session_state.setdefault("timestamps", []).append(datetime.utcnow().isoformat(timespec="seconds"))
+        # Who produced the labels (e.g. "local_classifier"); None for the LLM.
+        self.session_state.setdefault("sources", []).append(analysis.get("source"))
         return self.session_state
 
     def append_turn(self, user_input, bot_response):
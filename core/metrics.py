@@ -0,0 +1,325 @@
+# metrics.py
+"""
+In-process metrics for the pipeline: stage latency histograms, LLM call and
+token counters, Mongo operations per turn, cache hit rates and checkpoint size.
+
+Metrics are off unless ``TCA_METRICS=true`` (or ``enable()`` is called). When
+off, every recording function returns after a single flag check and
+``stage_timer`` hands back a shared no-op context manager.
+
+Recorded values go to every registered sink. The default sink is a
+``PrometheusRegistry`` that aggregates in memory and renders the Prometheus
+text format for a ``/metrics`` endpoint; other sinks (StatsD, logging, ...)
+can be added with ``add_sink``.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+_enabled = os.environ.get("TCA_METRICS", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+# Histogram buckets per metric name; anything not listed is a latency.
+BUCKETS = {
+    "tca_mongo_ops_per_turn": COUNT_BUCKETS,
+    "tca_checkpoint_bytes": BYTES_BUCKETS,
+    "tca_log_sink_batch_size": (1, 10, 50, 100, 250, 500, 1000, 2500),
+    "tca_batch_size": (1, 2, 4, 8, 16, 32, 64, 128, 256),
+}
+
+HELP = {
+    "tca_turn_seconds": "End-to-end latency of TCAPipeline.process.",
+    "tca_stage_seconds": "Latency of each pipeline stage.",
+    "tca_llm_seconds": "Latency of LLM calls by model and stage.",
+    "tca_llm_calls_total": "LLM calls by model and stage.",
+    "tca_llm_prompt_tokens_total": "Prompt tokens by model and stage.",
+    "tca_llm_completion_tokens_total": "Completion tokens by model and stage.",
+    "tca_model_route_total": "Routed LLM calls by stage, model, tier (primary/escalated) and mode.",
+    "tca_model_escalations_total": "Escalations to the larger model by stage and reason.",
+    "tca_llm_queue_seconds": "Time LLM calls waited for admission by model and priority.",
+    "tca_llm_retries_total": "LLM call retries by model and reason.",
+    "tca_llm_throttled_total": "LLM calls rejected with a rate-limit error.",
+    "tca_llm_singleflight_total": "LLM requests that made a call (leader) or shared one in flight (coalesced).",
+    "tca_mongo_ops_total": "MongoDB commands by command name.",
+    "tca_mongo_ops_per_turn": "MongoDB commands issued during one turn.",
+    "tca_cache_requests_total": "Cache lookups by cache and result (hit/miss).",
+    "tca_checkpoint_bytes": "Serialized checkpoint size.",
+    "tca_checkpoint_save_seconds": "Checkpoint save latency.",
+    "tca_archive_restore_seconds": "Latency of restoring an archived checkpoint to the hot tier.",
+    "tca_archive_moves_total": "Checkpoints moved between tiers by direction (archive/restore).",
+    "tca_report_cache_total": "Research report cache lookups by result (fresh/stale/miss).",
+    "tca_report_cache_refresh_total": "Background report refreshes by result (ok/error).",
+    "tca_batch_items_total": "process_batch items by result (ok/error).",
+    "tca_batch_chunk_seconds": "Time to process and persist one process_batch chunk.",
+    "tca_batch_size": "Requests per micro-batch by batcher.",
+    "tca_ingest_chunks_total": "Vector store ingestion chunks by result (inserted/duplicate).",
+    "tca_log_sink_events_total": "Log sink events by sink and result (written/dropped/failed).",
+    "tca_log_sink_batch_size": "Events per insert_many written by a log sink.",
+    "tca_trace_events_total": "Trace events by result (emitted/sampled_out/dropped).",
+    "tca_structured_parse_total": "Structured LLM replies by schema and first-parse result.",
+    "tca_structured_repairs_total": "Repair attempts for invalid structured replies by result.",
+    "tca_analyzer_seconds": "Latency of each analyzer plugin.",
+    "tca_analyzer_failures_total": "Analyzer plugin failures by analyzer and reason.",
+    "tca_deferred_wait_seconds": "Time a turn waited for the previous turn's deferred analyses.",
+    "tca_degradations_total": "Optional stages that fell back, by stage and reason.",
+    "tca_circuit_open_total": "Times a stage's circuit breaker opened.",
+    "tca_speculation_total": "Speculative responses by result (hit/miss/error).",
+    "tca_speculation_wasted_tokens_total": "Tokens spent on discarded speculative responses.",
+    "tca_prescreen_total": "Security pre-screen verdicts (block/allow/escalate).",
+    "tca_local_classifier_total": "Therapist analyses answered locally or escalated to the LLM.",
+}
+
+
+class MetricsSink:
+    """Interface for metric sinks. Labels are passed as a sorted tuple of pairs."""
+
+    def observe(self, name, value, labels):
+        raise NotImplementedError
+
+    def increment(self, name, value, labels):
+        raise NotImplementedError
+
+
+class PrometheusRegistry(MetricsSink):
+    """Aggregates histograms and counters in memory and renders them as text."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, labels):
+        bounds = BUCKETS.get(name, LATENCY_BUCKETS)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(labels)
+            if hist is None:
+                hist = series[labels] = {"buckets": [0] * len(bounds), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def increment(self, name, value, labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """Return a JSON-friendly copy of all series."""
+        def key(labels):
+            return ",".join(f"{k}={v}" for k, v in labels) or "_"
+
+        with self._lock:
+            return {
+                "counters": {name: {key(l): v for l, v in series.items()}
+                             for name, series in self._counters.items()},
+                "histograms": {name: {key(l): {"sum": h["sum"], "count": h["count"]}
+                                      for l, h in series.items()}
+                               for name, series in self._histograms.items()},
+            }
+
+    def render(self):
+        """Render all series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted(self._histograms):
+                bounds = BUCKETS.get(name, LATENCY_BUCKETS)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in sorted(self._histograms[name].items()):
+                    for bound, count in zip(bounds, hist["buckets"]):
+                        le = labels + (("le", _format_number(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(le)} {count}")
+                    inf = labels + (("le", "+Inf"),)
+                    lines.append(f"{name}_bucket{_format_labels(inf)} {hist['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_number(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for k, v in labels)
+    return "{" + body + "}"
+
+
+_registry = PrometheusRegistry()
+_sinks = [_registry]
+_turn_ops = contextvars.ContextVar("tca_turn_ops", default=None)
+
+
+def enable(enabled=True) -> None:
+    """Turn metric recording on or off at runtime."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def get_registry() -> PrometheusRegistry:
+    """The default in-memory registry backing the ``/metrics`` endpoint."""
+    return _registry
+
+
+def add_sink(sink: MetricsSink) -> None:
+    _sinks.append(sink)
+
+
+def remove_sink(sink: MetricsSink) -> None:
+    _sinks.remove(sink)
+
+
+def observe(name, value, **labels) -> None:
+    """Record one histogram observation."""
+    if not _enabled:
+        return
+    key = tuple(sorted(labels.items()))
+    for sink in _sinks:
+        sink.observe(name, value, key)
+
+
+def increment(name, value=1, **labels) -> None:
+    """Increase a counter."""
+    if not _enabled:
+        return
+    key = tuple(sorted(labels.items()))
+    for sink in _sinks:
+        sink.increment(name, value, key)
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+_NULL_TIMER = nullcontext()
+
+
+def timer(name, **labels):
+    """Context manager observing the elapsed seconds into histogram ``name``."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def stage_timer(stage):
+    """Time one pipeline stage into ``tca_stage_seconds``."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer("tca_stage_seconds", {"stage": stage})
+
+
+def record_llm_call(model, stage, result, seconds) -> None:
+    """Record latency, call count and token usage for one LLM response."""
+    if not _enabled:
+        return
+    observe("tca_llm_seconds", seconds, model=model, stage=stage)
+    increment("tca_llm_calls_total", model=model, stage=stage)
+    prompt_tokens, completion_tokens = token_usage(result)
+    if prompt_tokens:
+        increment("tca_llm_prompt_tokens_total", prompt_tokens, model=model, stage=stage)
+    if completion_tokens:
+        increment("tca_llm_completion_tokens_total", completion_tokens, model=model, stage=stage)
+
+
+def token_usage(result):
+    """Extract (prompt_tokens, completion_tokens) from a chat model response, if reported."""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    metadata = getattr(result, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def record_cache(cache, hit) -> None:
+    """Count a cache lookup as a hit or a miss."""
+    if not _enabled:
+        return
+    increment("tca_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def begin_turn():
+    """Start counting Mongo operations for the current turn (context-local)."""
+    if not _enabled:
+        return None
+    return _turn_ops.set([0])
+
+
+def end_turn(token):
+    """Record the Mongo operations counted since ``begin_turn`` and return the count."""
+    if token is None:
+        return None
+    ops = _turn_ops.get()
+    _turn_ops.reset(token)
+    if ops is not None:
+        observe("tca_mongo_ops_per_turn", ops[0])
+        return ops[0]
+    return None
+
+
+def record_mongo_op(command) -> None:
+    if not _enabled:
+        return
+    increment("tca_mongo_ops_total", command=command)
+    ops = _turn_ops.get()
+    if ops is not None:
+        ops[0] += 1
+
+
+def mongo_listeners():
+    """
+    pymongo command listeners that feed ``tca_mongo_ops_*``.
+
+    Returned as a list for ``MongoClient(event_listeners=...)``; the listener
+    class is defined here so pymongo is only imported by callers that use it.
+    """
+    from pymongo import monitoring
+
+    class MongoCommandCounter(monitoring.CommandListener):
+        def started(self, event):
+            record_mongo_op(event.command_name)
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    return [MongoCommandCounter()]
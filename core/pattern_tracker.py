@@ -1,22 +1,30 @@
 # pattern_tracker.py
+import logging
 
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage
-import json
-import re
+from langchain_core.messages import SystemMessage, HumanMessage
+from core.routing import invoke_routed
+from core.structured import Field, Schema
+
+PATTERN_SCHEMA = Schema("pattern_tracking", {
+    "change": Field(str, choices=("emotion_drift", "stable")),
+    "details": Field(str, description="brief explanation of your assessment"),
+    "confidence": Field(float, required=False, description="0-1, how sure you are"),
+})
+
+logger = logging.getLogger(__name__)
 
 class PatternShiftTracker:
     def __init__(self, temperature=0.7):
         """
-        Initializes the PatternShiftTracker with an LLM instance for nuanced analysis.
+        Initializes the PatternShiftTracker. The model is chosen per call by
+        ``core.routing`` (stage "pattern_tracking").
         
         Parameters:
             temperature (float): Controls the randomness of the LLM output.
         """
-        # Create an instance of ChatOpenAI (or any other LLM interface)
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=temperature)
+        self.temperature = temperature
 
-    def track(self, turn_history, current_analysis):
+    def track(self, turn_history, current_analysis, raise_errors=False):
         """
         Tracks changes in emotional tone by comparing the previous turn with the current analysis.
         If an emotional drift is detected, uses an LLM to provide a detailed explanation.
@@ -24,6 +32,8 @@ class PatternShiftTracker:
         Parameters:
             turn_history (list): List of past conversation turns (dictionaries).
             current_analysis (dict): Analysis of the current user input, expected to include an "emotion" key.
+            raise_errors (bool): Re-raise LLM failures instead of returning "stable",
+                so the caller can apply its own fallback.
 
         """
         # No history available? Return early.
@@ -41,9 +51,7 @@ class PatternShiftTracker:
                 f" - Previous emotion: {str(last_emotion)!r}\n"
                 f" - Current emotion: {str(current_emotion)!r}\n"
                 "First, determine if this represents a significant emotional shift or if it's relatively stable.\n"
-                "Then provide a brief explanation of your assessment.\n"
-                "Format your response as a JSON with two fields: 'change': Either 'emotion_drift' or 'stable', 'details': Your explanation \n"
-                "Ensure your response is valid JSON."
+                f"Reply with {PATTERN_SCHEMA.describe()}."
             )
             messages = [
                 SystemMessage(content="You are an expert in psychological analysis and conversation dynamics."),
@@ -51,30 +59,14 @@ class PatternShiftTracker:
             ]
 
             try:
-                # Invoke the language model and extract the response
-                llm_response = self.llm.invoke(messages)
-                response_content = llm_response.content
-                
-                # Print the raw response for debugging
-                # print(f"Raw LLM response: {response_content}")
-                
-                # Try to extract JSON from the response if it's not pure JSON
-                json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    # print(f"Extracted JSON: {json_str}")
-                    result = json.loads(json_str)
-                else:
-                    # If no JSON found, create a default response
-                    result = {
-                        "change": "stable",
-                        "details": "Could not parse LLM response as JSON. Defaulting to stable."
-                    }
-                
-                return result
+                # Parsed and validated against PATTERN_SCHEMA, with a bounded repair step.
+                return invoke_routed("pattern_tracking", messages, PATTERN_SCHEMA,
+                                     temperature=self.temperature)
             except Exception as e:
+                if raise_errors:
+                    raise
                 # Log the error and return stable state
-                print(f"Error parsing LLM response: {str(e)}")
+                logger.warning("Error parsing LLM response: %s", e)
                 return {
                     "change": "stable", 
                     "details": f"LLM analysis failed: {str(e)}, defaulting to stable"
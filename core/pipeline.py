@@ -1,9 +1,13 @@
 # core/pipeline.py
 import os
-import json
 import logging
-from pymongo import MongoClient
-from bson import ObjectId  # Import ObjectId if needed
+import random
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from core import metrics, tracing
+from core.resilience import RESPONSE_RESERVE, call_optional, degradation, stage_budget
+from core.routing import active_mode
+from core.scheduler import current_deadline, deadline
 from memory.memory_store import (
     get_user_id, 
     load_user_memory, 
@@ -12,18 +16,41 @@ from memory.memory_store import (
     update_user_profile
 )
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Suppress external libraries' logs.
-logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.getLogger("httpcore").setLevel(logging.WARNING)
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-logging.getLogger("openai").setLevel(logging.WARNING)
-logging.getLogger("pymongo").setLevel(logging.WARNING)
+def configure_logging(level=logging.DEBUG):
+    """
+    Configure root logging for the demos.
+
+    This used to run at import time; it is now opt-in so that importing the
+    pipeline does not reconfigure logging for the host application. If
+    ``TCA_LOG_TO_MONGO`` names a collection, pipeline log records and trace
+    events at ``level`` or above are also written there through a buffered,
+    non-blocking sink.
+    """
+    logging.basicConfig(level=level)
+
+    collection = os.environ.get("TCA_LOG_TO_MONGO")
+    if collection:
+        from memory.mongodb.log_sink import BufferedMongoSink, MongoLogHandler
+        from memory.mongodb.mongo_helper import get_collection
+        sink = BufferedMongoSink(get_collection(collection), name=collection)
+        handler = MongoLogHandler(sink)
+        # Trace events are stored once, by MongoTraceSink; skip their core.trace log copies.
+        handler.addFilter(lambda record: record.name != "core.trace")
+        logging.getLogger("core").addHandler(handler)
+        tracing.add_sink(tracing.MongoTraceSink(sink, level))
+
+    # Suppress external libraries' logs.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("httpcore").setLevel(logging.WARNING)
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("openai").setLevel(logging.WARNING)
+    logging.getLogger("pymongo").setLevel(logging.WARNING)
 
 class TCAPipeline:
-    def __init__(self, mode="therapist", session_id="default-user"):
+    def __init__(self, mode="therapist", session_id="default-user", defer_personalization=None,
+                 speculative=None):
         from core.memory_core import TemporalMemoryCore
         from core.meaning_engine import ContextualMeaningEngine
         from core.pattern_tracker import PatternShiftTracker
@@ -32,13 +59,53 @@ class TCAPipeline:
         self.mode = mode
         self.session_id = session_id
         self.memory_core = TemporalMemoryCore()
-        self.meaning_engine = ContextualMeaningEngine(mode)
+
+        # Personalization extraction does not change the reply, so it can run in
+        # the background after the response (per-user ordered) and be merged
+        # before this user's next turn.
+        if defer_personalization is None:
+            defer_personalization = os.environ.get("TCA_DEFER_PERSONALIZATION", "false").lower() == "true"
+        deferred = ("personalization",) if defer_personalization else ()
+        self.meaning_engine = ContextualMeaningEngine(mode, deferred=deferred)
+        self._deferred = []  # (memory slot, analysis, future) awaiting merge
         self.pattern_tracker = PatternShiftTracker()
-        self.response_engine = AdaptiveResponseEngine(mode)
+        self.response_engine = AdaptiveResponseEngine(self.meaning_engine.spec.response)
         self.turns = []  # Conversation history
         self.components = {}  # Extra components state
         self.user_profile = {}  # User profile data
 
+        # On-demand turn profiling: pass profile=True to process(), or sample a
+        # fraction of turns with TCA_PROFILE_SAMPLE_RATE.
+        self.profile_sample_rate = float(os.environ.get("TCA_PROFILE_SAMPLE_RATE", "0") or 0)
+        self.profile_dir = os.environ.get("TCA_PROFILE_DIR", "profiles")
+        self.profile_format = os.environ.get("TCA_PROFILE_FORMAT", "speedscope")
+        self.last_profile_paths = []
+        # Mongo round trips of the last turn (recorded while metrics are enabled).
+        self.last_turn_mongo_ops = None
+
+        # Overall time budget for one turn. Required stages (analysis, response)
+        # bound LLM queueing and retries by it; optional stages get a slice and
+        # fall back when they overrun it (see core.resilience).
+        self.turn_deadline = float(os.environ.get("TCA_TURN_DEADLINE", "60"))
+        self._last_personalization_context = {}
+
+        # Opt-in: start the response from the previous turn's analysis while the
+        # current one runs, and keep it if the analyses match (core.speculation).
+        if speculative is None:
+            speculative = os.environ.get("TCA_SPECULATIVE_RESPONSE", "false").lower() == "true"
+        self.speculative = speculative
+
+        # When set to a list (by process_batch), profile updates are collected
+        # here and written in bulk instead of once per turn.
+        self._profile_updates = None
+
+        # Security mode settles clear-cut inputs with a signature pre-screen
+        # before any LLM call; set TCA_SECURITY_PRESCREEN=false to disable.
+        self.prescreen = None
+        if mode == "security" and os.environ.get("TCA_SECURITY_PRESCREEN", "true").lower() == "true":
+            from plugins.security.prescreen import get_prescreen
+            self.prescreen = get_prescreen()
+
     def load(self, checkpoint_state: dict):
         """
         Load the pipeline state from a checkpoint dictionary.
@@ -51,31 +118,31 @@ class TCAPipeline:
         # Load user profile from session memory if available
         if "session_memory" in checkpoint_state and "user_profile" in checkpoint_state["session_memory"]:
             self.user_profile = checkpoint_state["session_memory"]["user_profile"]
-            logger.info(f"Loaded user profile: {json.dumps(self.user_profile, indent=2)}")
 
-        # Use default=str in json.dumps to automatically convert non-serializable types 
-        logger.debug("Loaded checkpoint state: %s", 
-                     json.dumps(checkpoint_state, indent=2, default=str))
+        # Size-capped: long histories keep only their latest entries.
+        tracing.event("checkpoint_loaded", session_id=self.session_id, turns=len(self.turns),
+                      user_profile=self.user_profile, checkpoint=checkpoint_state)
 
     def load_personalization_context(self) -> dict:
         """
         Load personalization information from MongoDB.
-        This includes the user profile, todos, instructions, and research goals.
+        This includes the user profile, todos, instructions, and research goals,
+        and only the latest entries of the profile history.
         """
         mongo_uri = os.environ.get("MONGO_URI")
         if not mongo_uri:
             logger.warning("MONGO_URI not set, skipping personalization context.")
             return {}
-        client = MongoClient(mongo_uri)
-        db = client["gptr_db"]
-        session_id = self.session_id
+        # Reuse the process-wide client instead of opening a new one per turn.
+        from memory.mongodb.mongo_helper import get_db
+        from memory.mongodb.repository import UserRepository
 
         # Retrieve personalization data.
-        profile = db["users"].find_one({"user_id": session_id})
-        logger.debug("Personalization context loaded: %s", json.dumps(profile, indent=2, default=str))
+        profile = UserRepository(get_db()).personalization_context(self.session_id)
+        tracing.event("personalization_context", profile=profile)
         return profile
 
-    def process(self, user_input: str) -> dict:
+    def process(self, user_input: str, profile: bool = False, respond: bool = True) -> dict:
         """
         Process a single user input through various stages:
           - Analysis via Meaning Engine,
@@ -83,20 +150,147 @@ class TCAPipeline:
           - Updating memory,
           - Response generation.
         Personalization context is injected before generating a response.
+
+        Parameters:
+            user_input (str): The user's message.
+            profile (bool): Capture a wall-clock/CPU profile of this turn.
+            respond (bool): Generate a response. With False the turn is only
+                analyzed and recorded; the result carries the analysis and
+                pattern and ``"response": None``.
+        """
+        if profile or (self.profile_sample_rate and random.random() < self.profile_sample_rate):
+            return self._process_profiled(user_input, respond)
+        return self._process_measured(user_input, respond)
+
+    @classmethod
+    def process_batch(cls, items, mode="therapist", **kwargs):
         """
+        Process many ``(session_id, message)`` items; see ``core.batch.process_batch``.
+
+        Yields:
+            dict: One result per item, in input order.
+        """
+        from core.batch import process_batch
+        return process_batch(items, mode=mode, **kwargs)
+
+    def _process_profiled(self, user_input: str, respond: bool = True) -> dict:
+        from core.profiling import TurnProfiler
+
+        turn_id = len(self.turns)
+        with TurnProfiler() as profiler:
+            response = self._process_measured(user_input, respond)
+        tag = f"{self.session_id}-turn{turn_id}-{int(profiler.started_at)}"
+        self.last_profile_paths = profiler.write(self.profile_dir, tag, self.profile_format)
+        logger.info("Turn profile written: %s", ", ".join(self.last_profile_paths))
+        return response
+
+    def _process_measured(self, user_input: str, respond: bool = True) -> dict:
+        turn = metrics.begin_turn()
+        start = time.perf_counter()
+        try:
+            with deadline(self.turn_deadline), active_mode(self.mode), tracing.turn(self.session_id):
+                return self._process_turn(user_input, respond)
+        finally:
+            metrics.observe("tca_turn_seconds", time.perf_counter() - start, mode=self.mode)
+            self.last_turn_mongo_ops = metrics.end_turn(turn)
+
+    def _process_turn(self, user_input: str, respond: bool = True) -> dict:
+        # Merge background results from the previous turn first.
+        if self._deferred:
+            remaining = current_deadline() - time.monotonic() if current_deadline() else None
+            self.flush_deferred(timeout=remaining)
+
+        # Step 0: Pre-screen (security mode); only ambiguous inputs reach the LLM.
+        screen = None
+        if self.prescreen is not None:
+            with metrics.stage_timer("prescreen"):
+                screen = self.prescreen.screen(user_input)
+            metrics.increment("tca_prescreen_total", verdict=screen["verdict"])
+            if screen["verdict"] != "escalate":
+                return self._process_screened(user_input, screen)
+
+        degraded = []
+
+        speculation = None
+        if respond and self.speculative and self.turns and self.components.get("last_analysis"):
+            speculation = self._speculate(user_input)
+
         # Step 1: Analyze the input using the Meaning Engine.
-        analysis = self.meaning_engine.analyze(user_input)
-        logger.debug("Analysis: %s", json.dumps({"meaning_engine_analysis": analysis}, indent=2, default=str))
+        with metrics.stage_timer("analyze"):
+            analysis = self.meaning_engine.analyze(user_input)
+        if screen is not None:
+            analysis["prescreen"] = screen
+        for name, error in analysis.get("analyzer_errors", {}).items():
+            if error == "invalid_output":
+                degraded.append(degradation(f"analyzer:{name}", error, "default analysis"))
+                continue
+            reason = error if error in ("timeout", "circuit_open") else "error"
+            degraded.append(degradation(f"analyzer:{name}", reason, "empty result"))
+        tracing.event("analysis", analysis=analysis)
         
         # Step 2: Track any shifts in conversation context.
-        pattern = self.pattern_tracker.track(self.turns, analysis)
-        logger.debug("Pattern tracking result: %s", json.dumps({"pattern_tracker_result": pattern}, indent=2, default=str))
+        reserve = RESPONSE_RESERVE * self.turn_deadline
+        with metrics.stage_timer("pattern_tracking"):
+            pattern, d = call_optional(
+                "pattern_tracking",
+                lambda: self.pattern_tracker.track(self.turns, analysis, raise_errors=True),
+                stage_budget("pattern_tracking", self.turn_deadline, reserve),
+                lambda: self._local_pattern(analysis), "local emotion comparison")
+        if d:
+            degraded.append(d)
+        tracing.event("pattern", pattern=pattern)
         
         # Step 3: Update memory with analysis details.
         self.memory_core.update(analysis, pattern)
         
+        # Analysis-only turns (process_batch(..., respond=False)) stop here.
+        if not respond:
+            response = {"response": None, "mode": self.response_engine.mode,
+                        "analysis": analysis, "pattern": pattern}
+        else:
+            response = self._respond(user_input, analysis, speculation, reserve, degraded)
+
+        # Step 7: Update persistent memory and conversation turns.
+        self.memory_core.append_turn(user_input, response.get("response"))
+        self.turns.append({"user": user_input, "bot": response.get("response")})
+        
+        # Step 8: Update user profile if it contains profile updates
+        if self._profile_updates is not None:
+            self._profile_updates.append(analysis)
+        elif self.meaning_engine.deferred:
+            self._defer(user_input, analysis)
+        else:
+            with metrics.stage_timer("profile_update"):
+                _, d = call_optional(
+                    "profile_update", lambda: update_user_profile(self.session_id, analysis),
+                    stage_budget("profile_update", self.turn_deadline),
+                    lambda: None, "not awaited")
+            if d:
+                degraded.append(d)
+
+        if degraded:
+            response["degraded"] = degraded
+        
+        # Step 9: Update components with extra information if needed.
+        self.components = {
+            "last_analysis": analysis,
+            "pattern": pattern,
+            "memory_core": self.memory_core.to_dict()
+        }
+        return response
+
+    def _respond(self, user_input: str, analysis: dict, speculation, reserve: float, degraded: list) -> dict:
+        """Steps 4-6: personalization context, history and response generation."""
         # Step 4: Load personalization context from MongoDB.
-        personalization_context = self.load_personalization_context()
+        with metrics.stage_timer("personalization_context"):
+            personalization_context, d = call_optional(
+                "personalization_context", self.load_personalization_context,
+                stage_budget("personalization_context", self.turn_deadline, reserve),
+                lambda: self._last_personalization_context, "previous turn's context")
+        if d:
+            degraded.append(d)
+        else:
+            self._last_personalization_context = personalization_context
 
         # Step 5: Build conversation history.
         conversation_history = self.turns[:]  # Shallow copy.
@@ -106,19 +300,97 @@ class TCAPipeline:
         augmented_analysis = analysis.copy()
         augmented_analysis["personalization_context"] = personalization_context
 
-        response = self.response_engine.decide(augmented_analysis,
-                                               self.memory_core.to_dict(),
-                                               conversation_history)
-        logger.debug("Adaptive response: %s", json.dumps({"adaptive_response": response}, indent=2, default=str))
-        
-        # Step 7: Update persistent memory and conversation turns.
-        self.memory_core.append_turn(user_input, response.get("response"))
-        self.turns.append({"user": user_input, "bot": response.get("response")})
-        
-        # Step 8: Update user profile if it contains profile updates
-        update_user_profile(self.session_id, analysis)
-        
-        # Step 9: Update components with extra information if needed.
+        with metrics.stage_timer("response"):
+            response = None
+            if speculation is not None:
+                remaining = current_deadline() - time.monotonic() if current_deadline() else None
+                response = speculation.resolve(analysis, remaining)
+            if response is None:
+                response = self.response_engine.decide(augmented_analysis,
+                                                       self.memory_core.to_dict(),
+                                                       conversation_history)
+        tracing.event("response", response=response)
+        return response
+
+    def _speculate(self, user_input: str):
+        """Start generating the response from the previous turn's analysis."""
+        from core.speculation import Speculation
+
+        basis = dict(self.components["last_analysis"])
+        augmented = dict(basis)
+        augmented["personalization_context"] = self._last_personalization_context
+        # Snapshot the trends; the live memory is updated while this runs.
+        memory_state = {k: list(v) if isinstance(v, list) else v
+                        for k, v in self.memory_core.to_dict().items()}
+        history = self.turns[:] + [{"user": user_input, "bot": ""}]
+        return Speculation(lambda: self.response_engine.decide(augmented, memory_state, history), basis)
+
+    def _local_pattern(self, analysis: dict) -> dict:
+        """Pattern fallback: compare this turn's emotion with the previous turn's."""
+        previous = (self.components.get("last_analysis") or {}).get("emotion")
+        current = analysis.get("emotion")
+        if not self.turns or previous is None:
+            return {"change": "none", "details": "No previous emotion to compare."}
+        change = "stable" if previous == current else "emotion_drift"
+        return {"change": change, "details": f"Local comparison: {previous} -> {current}."}
+
+    def _defer(self, user_input: str, analysis: dict) -> None:
+        """Queue the deferred analyzers and the profile update for this turn."""
+        from core.deferred import get_worker
+
+        slot = len(self.memory_core.session_state["personalization"]) - 1
+        future = get_worker().submit(self.session_id, self._run_deferred, user_input, dict(analysis))
+        self._deferred.append((slot, analysis, future))
+
+    def _run_deferred(self, user_input: str, analysis: dict) -> dict:
+        # Runs on the background worker, in order with this user's other jobs.
+        with metrics.stage_timer("deferred_analysis"), active_mode(self.mode):
+            extra = self.meaning_engine.analyze_deferred(user_input)
+        analysis.update(extra)
+        with metrics.stage_timer("profile_update"):
+            update_user_profile(self.session_id, analysis)
+        return extra
+
+    def flush_deferred(self, timeout=None) -> None:
+        """
+        Wait for background analyses of earlier turns and merge them into memory.
+
+        Called automatically at the start of each turn; call it before a final
+        checkpoint save so the last turn's results are included.
+
+        Parameters:
+            timeout (float, optional): Seconds to wait in total; unfinished jobs
+                stay queued for the next flush.
+        """
+        start = time.monotonic()
+        pending = []
+        for slot, analysis, future in self._deferred:
+            wait = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+            try:
+                extra = future.result(timeout=wait)
+            except FutureTimeout:
+                pending.append((slot, analysis, future))
+                continue
+            except Exception as e:
+                logger.warning("Deferred analysis failed: %s", e)
+                continue
+            analysis.update(extra)
+            personalization = self.memory_core.session_state["personalization"]
+            if 0 <= slot < len(personalization):
+                personalization[slot] = analysis.get("personalization")
+        self._deferred = pending
+        metrics.observe("tca_deferred_wait_seconds", time.monotonic() - start)
+
+    def _process_screened(self, user_input: str, screen: dict) -> dict:
+        """Record a turn decided by the pre-screen without calling the LLM."""
+        from plugins.security.prescreen import screened_analysis, screened_response
+
+        analysis = screened_analysis(screen)
+        pattern = {"change": "stable", "details": f"Pre-screen verdict: {screen['verdict']}"}
+        self.memory_core.update(analysis, pattern)
+        response = screened_response(screen)
+        self.memory_core.append_turn(user_input, response["response"])
+        self.turns.append({"user": user_input, "bot": response["response"]})
         self.components = {
             "last_analysis": analysis,
             "pattern": pattern,
@@ -0,0 +1,259 @@
+# profiling.py
+"""
+On-demand sampling profiler for a single pipeline turn.
+
+A background thread samples the stack of the thread running the turn at a
+fixed interval. Each sample is weighted twice: by the wall-clock time since the
+previous sample, and by the CPU time the thread consumed in that window (read
+from the thread's CPU clock where the platform provides one). The wall profile
+therefore includes time spent blocked on I/O (LLM requests, Mongo round trips,
+file writes); the CPU profile shows where the interpreter was actually busy.
+
+Stages that run on worker threads (analyzers, optional stages, speculative
+responses) are sampled too: the active profiler lives in a context variable,
+and the executors run their work through ``follow``, which adds the worker
+thread to the turn's profiler while it runs. Worker stacks sit under a
+``thread <name>`` root frame.
+
+Profiles are written as collapsed stacks (``.folded``, for flamegraph.pl or
+speedscope) or as a single speedscope JSON file with both profiles.
+
+Nothing here runs unless a turn is profiled: ``TCAPipeline.process`` only
+checks a flag and a sample rate.
+"""
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.005
+FORMATS = ("speedscope", "collapsed")
+
+_active = contextvars.ContextVar("tca_profiler", default=None)
+
+
+def _thread_cpu_clock(thread_id):
+    """Return a clock id for the thread's CPU time, or None if unsupported."""
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+def follow(fn, *args, **kwargs):
+    """
+    Call ``fn``, sampling the current thread if its context is being profiled.
+
+    Executors call this inside ``ctx.run`` so a turn's profile includes the
+    work it hands to worker threads.
+    """
+    profiler = _active.get()
+    if profiler is None:
+        return fn(*args, **kwargs)
+    thread_id = profiler.add_thread()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.remove_thread(thread_id)
+
+
+class TurnProfiler:
+    """
+    Samples a turn's threads while active: the caller's, plus any worker
+    thread running under ``follow`` in the turn's context.
+
+    Parameters:
+        interval (float): Seconds between samples.
+        thread_id (int, optional): Thread to sample; defaults to the caller's.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = []  # (stack, wall_seconds, cpu_seconds)
+        self.frames = {}  # frame key -> index
+        self.frame_list = []
+        self.started_at = None
+        self.duration = 0.0
+        self._t0 = None
+        self._stop = threading.Event()
+        self._thread = None
+        # thread id -> [root frame key or None, cpu clock, last wall, last cpu]
+        self._threads = {}
+        self._threads_lock = threading.Lock()
+        self._token = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._add(self.thread_id, None)
+        if self.thread_id == threading.get_ident():
+            self._token = _active.set(self)
+        self._thread = threading.Thread(target=self._run, name="tca-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+        self.duration = time.perf_counter() - self._t0
+
+    def _add(self, thread_id, root):
+        clock = _thread_cpu_clock(thread_id)
+        cpu = None
+        if clock is not None:
+            try:
+                cpu = time.clock_gettime(clock)
+            except OSError:
+                clock = None
+        with self._threads_lock:
+            self._threads[thread_id] = [root, clock, time.perf_counter(), cpu]
+
+    def add_thread(self):
+        """Start sampling the calling thread; returns its id for ``remove_thread``."""
+        thread_id = threading.get_ident()
+        if thread_id not in self._threads:
+            name = threading.current_thread().name
+            self._add(thread_id, ("<thread>", 0, f"thread {name}"))
+        return thread_id
+
+    def remove_thread(self, thread_id):
+        if thread_id == self.thread_id:
+            return
+        with self._threads_lock:
+            self._threads.pop(thread_id, None)
+
+    def _frame_index(self, key):
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frame_list)
+            self.frame_list.append(key)
+        return index
+
+    def _stack(self, frame, root):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(self._frame_index(
+                (code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name))))
+            frame = frame.f_back
+        if root is not None:
+            stack.append(self._frame_index(root))
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self._threads.items())
+            for thread_id, state in threads:
+                root, clock, last_wall, last_cpu = state
+                now = time.perf_counter()
+                wall = now - last_wall
+                state[2] = now
+                cpu = 0.0
+                if clock is not None:
+                    try:
+                        now_cpu = time.clock_gettime(clock)
+                    except OSError:
+                        # The sampled thread has exited.
+                        with self._threads_lock:
+                            self._threads.pop(thread_id, None)
+                        continue
+                    cpu = now_cpu - last_cpu
+                    state[3] = now_cpu
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples.append((self._stack(frame, root), wall, cpu))
+
+    def _frame_name(self, index):
+        filename, line, name = self.frame_list[index]
+        if filename == "<thread>":
+            return name
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def collapsed(self, weight="wall"):
+        """
+        Aggregate samples into collapsed-stack lines ``a;b;c <microseconds>``.
+
+        Parameters:
+            weight (str): "wall" or "cpu".
+        """
+        column = 1 if weight == "wall" else 2
+        totals = {}
+        for sample in self.samples:
+            stack = sample[0]
+            totals[stack] = totals.get(stack, 0.0) + sample[column]
+        lines = []
+        for stack, seconds in sorted(totals.items()):
+            micros = int(round(seconds * 1e6))
+            if micros:
+                lines.append(";".join(self._frame_name(i) for i in stack) + f" {micros}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name):
+        """Return a speedscope document holding the wall and CPU profiles."""
+        frames = [{"name": n, "file": f, "line": l} for f, l, n in self.frame_list]
+
+        def profile(label, column):
+            samples = [list(s[0]) for s in self.samples]
+            weights = [s[column] for s in self.samples]
+            return {
+                "type": "sampled",
+                "name": f"{name} ({label})",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "contextual-awareness core.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [profile("wall", 1), profile("cpu", 2)],
+        }
+
+    def write(self, directory, tag, fmt="speedscope"):
+        """
+        Write the profile to ``directory`` and return the written paths.
+
+        Parameters:
+            directory (str): Output directory (created if needed).
+            tag (str): File name stem, e.g. "<user>-turn<id>".
+            fmt (str): "speedscope" or "collapsed".
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown profile format: {fmt}")
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", tag))
+        if fmt == "speedscope":
+            path = stem + ".speedscope.json"
+            with open(path, "w") as f:
+                json.dump(self.speedscope(tag), f)
+            return [path]
+        paths = []
+        for weight in ("wall", "cpu"):
+            path = f"{stem}.{weight}.folded"
+            with open(path, "w") as f:
+                f.write(self.collapsed(weight))
+            paths.append(path)
+        return paths
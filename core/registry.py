@@ -0,0 +1,224 @@
+# registry.py
+"""
+Analyzer plugin registry.
+
+Analyzers are registered by name as ``"module:function"`` strings and imported
+only when a mode that uses them runs for the first time. Modes list the
+analyzers to run on each input; ``ContextualMeaningEngine`` runs them
+concurrently and merges their outputs into one analysis dict.
+
+Registrations come from three places, later ones overriding earlier ones:
+
+1. The built-in analyzers and modes below.
+2. Installed packages exposing ``tca.analyzers`` entry points
+   (``name = "package.module:function"``).
+3. A JSON file named by ``TCA_PLUGINS``::
+
+       {
+         "analyzers": {"marketing": "plugins.marketing.plugin:analyze_marketing_context"},
+         "modes": {
+           "marketing": {
+             "response": "therapist",
+             "analyzers": [
+               {"name": "marketing", "timeout": 20},
+               {"name": "personalization", "key": "personalization", "required": false}
+             ]
+           }
+         }
+       }
+
+Each analyzer in a mode is merged at the top level of the analysis, or under
+``key`` when one is given. A failing or timed-out analyzer raises if it is
+``required``; otherwise its slot is filled with ``{}`` and the error is noted
+under ``analysis["analyzer_errors"]``.
+"""
+import importlib
+import json
+import os
+import threading
+
+ENTRY_POINT_GROUP = "tca.analyzers"
+DEFAULT_TIMEOUT = 60.0
+
+_BUILTIN_ANALYZERS = {
+    "therapist": "plugins.therapist.plugin:analyze_therapist_context",
+    "security": "plugins.security.plugin:analyze_security_context",
+    "personalization": "plugins.personalization.plugin:analyze_personalization_context",
+}
+
+
+class AnalyzerSpec:
+    """
+    One analyzer slot in a mode.
+
+    Parameters:
+        name (str): Registered analyzer name.
+        key (str, optional): Merge the output under this key instead of the top level.
+        timeout (float): Seconds to wait for the output.
+        required (bool): Whether a failure fails the whole analysis.
+    """
+
+    def __init__(self, name, key=None, timeout=DEFAULT_TIMEOUT, required=True):
+        self.name = name
+        self.key = key
+        self.timeout = float(timeout)
+        self.required = required
+
+    @classmethod
+    def from_config(cls, data):
+        if isinstance(data, str):
+            return cls(data)
+        return cls(data["name"], key=data.get("key"),
+                   timeout=data.get("timeout", DEFAULT_TIMEOUT),
+                   required=data.get("required", True))
+
+
+class ModeSpec:
+    """
+    Analyzers to run for a mode, and the response style used afterwards.
+
+    Parameters:
+        name (str): Mode name.
+        analyzers (list): ``AnalyzerSpec`` instances, in merge order.
+        response (str, optional): Response engine mode; defaults to ``name``.
+    """
+
+    def __init__(self, name, analyzers, response=None):
+        self.name = name
+        self.analyzers = list(analyzers)
+        self.response = response or name
+
+
+def _personalization():
+    return AnalyzerSpec("personalization", key="personalization", timeout=30.0, required=False)
+
+
+def _builtin_modes():
+    return {
+        "therapist": ModeSpec("therapist", [AnalyzerSpec("therapist"), _personalization()]),
+        "security": ModeSpec("security", [AnalyzerSpec("security"), _personalization()]),
+        # Therapist replies, with a security screen of the same message in parallel.
+        "therapist_with_safety": ModeSpec("therapist_with_safety", [
+            AnalyzerSpec("therapist"),
+            AnalyzerSpec("security", key="security", timeout=30.0, required=False),
+            _personalization(),
+        ], response="therapist"),
+    }
+
+
+_targets = {}
+_analyzers = {}
+_modes = {}
+_loaded = False
+_lock = threading.RLock()
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if _loaded:
+            return
+        _targets.update(_BUILTIN_ANALYZERS)
+        _modes.update(_builtin_modes())
+        _load_entry_points()
+        path = os.environ.get("TCA_PLUGINS")
+        if path:
+            _apply_config(_read_config(path))
+        _loaded = True
+
+
+def _load_entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # pragma: no cover - Python < 3.8
+        return
+    try:
+        found = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:  # Python < 3.10 returns a dict of groups.
+        found = entry_points().get(ENTRY_POINT_GROUP, [])
+    for ep in found:
+        # Keep the entry point itself so the package is imported on first use only.
+        _targets[ep.name] = ep
+
+
+def _read_config(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _apply_config(config):
+    # Fills the tables directly: called from ``_load`` before ``_loaded`` is set.
+    with _lock:
+        for name, target in config.get("analyzers", {}).items():
+            _targets[name] = target
+            _analyzers.pop(name, None)
+        for name, mode in config.get("modes", {}).items():
+            _modes[name] = ModeSpec(name, [AnalyzerSpec.from_config(a) for a in mode["analyzers"]],
+                                    mode.get("response"))
+
+
+def load_config(path) -> None:
+    """Register analyzers and modes from a JSON config file."""
+    config = _read_config(path)
+    _load()
+    _apply_config(config)
+
+
+def register_analyzer(name, target) -> None:
+    """
+    Register an analyzer.
+
+    Parameters:
+        name (str): Analyzer name used in mode definitions.
+        target: A ``"module:function"`` string, or the callable itself.
+    """
+    _load()
+    with _lock:
+        _targets[name] = target
+        _analyzers.pop(name, None)
+
+
+def register_mode(name, analyzers, response=None) -> None:
+    """Register (or replace) a mode made of ``AnalyzerSpec`` entries."""
+    _load()
+    with _lock:
+        _modes[name] = ModeSpec(name, analyzers, response)
+
+
+def get_mode(name) -> ModeSpec:
+    _load()
+    mode = _modes.get(name)
+    if mode is None:
+        raise ValueError(f"Unknown mode: {name}")
+    return mode
+
+
+def get_analyzer(name):
+    """Return the analyzer callable, importing its module on first use."""
+    _load()
+    fn = _analyzers.get(name)
+    if fn is not None:
+        return fn
+    with _lock:
+        fn = _analyzers.get(name)
+        if fn is None:
+            target = _targets.get(name)
+            if target is None:
+                raise ValueError(f"Unknown analyzer: {name}")
+            if isinstance(target, str):
+                module, _, attr = target.partition(":")
+                fn = getattr(importlib.import_module(module), attr)
+            elif hasattr(target, "load"):
+                fn = target.load()
+            else:
+                fn = target
+            _analyzers[name] = fn
+    return fn
+
+
+def modes():
+    """Names of all registered modes."""
+    _load()
+    return sorted(_modes)
@@ -0,0 +1,178 @@
+# resilience.py
+"""
+Deadline slices, fallbacks and circuit breakers for optional pipeline stages.
+
+Each turn runs under the deadline set by ``core.scheduler.deadline``. Optional
+stages (pattern tracking, the personalization profile fetch, the profile
+update) are given a slice of it with ``call_optional``: the stage runs on a
+worker thread and, if it fails, overruns its slice, or its circuit breaker is
+open, the caller gets a fallback value and a degradation record instead. A
+stage that keeps failing is skipped for a cool-down period rather than
+costing every turn its full slice.
+
+Degradations are returned to the pipeline, which lists them under
+``response["degraded"]``.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from core import metrics, profiling
+from core.scheduler import current_deadline
+
+FAILURE_THRESHOLD = int(os.environ.get("TCA_BREAKER_FAILURES", "3"))
+COOLDOWN_SECONDS = float(os.environ.get("TCA_BREAKER_COOLDOWN", "30"))
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the turn deadline kept free for response generation.
+RESPONSE_RESERVE = 0.3
+
+# Fraction of the turn deadline each optional stage may use.
+STAGE_BUDGETS = {
+    "pattern_tracking": 0.2,
+    "personalization_context": 0.05,
+    "profile_update": 0.1,
+}
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls pass. After ``threshold`` consecutive failures it opens and
+    calls are skipped for ``cooldown`` seconds; then one probe call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                if self.opened_at is None or self._probing:
+                    metrics.increment("tca_circuit_open_total", stage=self.name)
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_executor = None
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states():
+    """Current state of every circuit breaker."""
+    return {name: b.state for name, b in _breakers.items()}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _breakers_lock:
+            if _executor is None:
+                workers = int(os.environ.get("TCA_STAGE_WORKERS", "16"))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tca-stage")
+    return _executor
+
+
+def remaining_time():
+    """Seconds left before the current turn's deadline, or None without one."""
+    deadline_at = current_deadline()
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
+
+def stage_budget(stage, turn_deadline, reserve=0.0):
+    """
+    Seconds ``stage`` may run: its share of the turn deadline, capped by what
+    is left after keeping ``reserve`` seconds for later required stages.
+    """
+    budget = STAGE_BUDGETS.get(stage, 0.1) * turn_deadline
+    remaining = remaining_time()
+    if remaining is not None:
+        budget = min(budget, remaining - reserve)
+    return max(0.0, budget)
+
+
+def degradation(stage, reason, fallback):
+    metrics.increment("tca_degradations_total", stage=stage, reason=reason)
+    return {"stage": stage, "reason": reason, "fallback": fallback}
+
+
+def call_optional(stage, fn, budget, fallback, fallback_name):
+    """
+    Run an optional stage within ``budget`` seconds.
+
+    Parameters:
+        stage (str): Stage name (breaker and metrics label).
+        fn (callable): The stage; called with no arguments.
+        budget (float): Seconds to wait for it.
+        fallback (callable): Produces the substitute result.
+        fallback_name (str): How the substitute was obtained, for the record.
+
+    Returns:
+        tuple: (result, degradation dict or None).
+    """
+    if budget <= 0:
+        return fallback(), degradation(stage, "no_time_left", fallback_name)
+    breaker = get_breaker(stage)
+    if not breaker.allow():
+        return fallback(), degradation(stage, "circuit_open", fallback_name)
+
+    ctx = contextvars.copy_context()
+    future = _get_executor().submit(ctx.run, profiling.follow, fn)
+    try:
+        result = future.result(timeout=budget)
+    except FutureTimeout:
+        # The call keeps running in its worker; its result is dropped.
+        breaker.record_failure()
+        return fallback(), degradation(stage, "timeout", fallback_name)
+    except Exception as e:
+        breaker.record_failure()
+        logger.warning("Stage '%s' failed (%s: %s), using %s", stage, type(e).__name__, e, fallback_name)
+        return fallback(), degradation(stage, "error", fallback_name)
+    breaker.record_success()
+    return result, None
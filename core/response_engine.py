@@ -1,11 +1,17 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
+from core.llm import get_chat_model
+from core.routing import route
 
 class AdaptiveResponseEngine:
     def __init__(self, mode="therapist", temperature=0.7):
         self.mode = mode
-        # Create an LLM instance
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=temperature)
+        self.temperature = temperature
+
+    @property
+    def llm(self):
+        """The routed response model (clients are created once and cached by core.llm)."""
+        return get_chat_model(model=route("response").model, temperature=self.temperature,
+                              stage="response")
 
     def decide(self, analysis, memory_state, conversation_history):
         if self.mode == "therapist":
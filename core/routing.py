@@ -0,0 +1,173 @@
+# routing.py
+"""
+Model routing per pipeline stage and mode.
+
+Each stage resolves to a ``Route``: the model to call first and, for
+classification-style stages, a bigger model to escalate to when the first
+reply fails schema validation or reports a confidence below
+``min_confidence``. Only user-facing response generation defaults to the
+large model.
+
+Routes can be overridden with ``TCA_MODEL_ROUTES`` (inline JSON or a file)::
+
+    {
+      "default": {"pattern_tracking": {"model": "gpt-4o-mini", "escalate_to": null}},
+      "modes": {"security": {"security_analysis": {"model": "gpt-4o", "escalate_to": null}}}
+    }
+
+The active mode is taken from ``active_mode()``, which ``TCAPipeline`` sets
+for the duration of each turn. Every routed call and escalation is counted in
+``core.metrics`` and in ``routing_stats()``.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+
+from core import metrics
+from core.llm import get_chat_model
+from core.structured import StructuredOutputError, invoke_structured, json_mode
+
+SMALL_MODEL = "gpt-4o-mini"
+LARGE_MODEL = "gpt-4o"
+DEFAULT_MIN_CONFIDENCE = 0.6
+
+DEFAULT_ROUTES = {
+    "therapist_analysis": {"model": SMALL_MODEL, "escalate_to": LARGE_MODEL},
+    "security_analysis": {"model": SMALL_MODEL, "escalate_to": LARGE_MODEL},
+    "pattern_tracking": {"model": SMALL_MODEL, "escalate_to": LARGE_MODEL},
+    "personalization": {"model": SMALL_MODEL, "escalate_to": LARGE_MODEL},
+    "response": {"model": LARGE_MODEL, "escalate_to": None},
+    "consolidation": {"model": SMALL_MODEL, "escalate_to": None},
+}
+
+_mode = contextvars.ContextVar("tca_mode", default=None)
+
+
+@contextlib.contextmanager
+def active_mode(mode):
+    """Route calls made in this context using ``mode``'s overrides."""
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def current_mode():
+    """The mode set by the enclosing ``active_mode``, if any."""
+    return _mode.get()
+
+
+class Route:
+    """
+    Models for one stage.
+
+    Parameters:
+        model (str): Model tried first.
+        escalate_to (str, optional): Model used when the first reply is invalid
+            or not confident enough.
+        min_confidence (float): Escalate when a reported ``confidence`` is lower.
+    """
+
+    def __init__(self, model, escalate_to=None, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        self.model = model
+        self.escalate_to = escalate_to
+        self.min_confidence = min_confidence
+
+
+def _load_routes():
+    raw = os.environ.get("TCA_MODEL_ROUTES")
+    if not raw:
+        return {}
+    if not raw.lstrip().startswith("{"):
+        with open(raw, "r") as f:
+            return json.load(f)
+    return json.loads(raw)
+
+
+_overrides = None
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def route(stage, mode=None):
+    """Resolve the ``Route`` for ``stage`` in ``mode`` (default: the active mode)."""
+    global _overrides
+    if _overrides is None:
+        _overrides = _load_routes()
+    mode = mode or _mode.get()
+    config = dict(DEFAULT_ROUTES.get(stage, {"model": LARGE_MODEL}))
+    config.update(_overrides.get("default", {}).get(stage, {}))
+    if mode:
+        config.update(_overrides.get("modes", {}).get(mode, {}).get(stage, {}))
+    return Route(config["model"], config.get("escalate_to"),
+                 config.get("min_confidence", DEFAULT_MIN_CONFIDENCE))
+
+
+def _record(stage, model, tier, reason=None):
+    mode = _mode.get() or "none"
+    metrics.increment("tca_model_route_total", stage=stage, model=model, tier=tier, mode=mode)
+    with _stats_lock:
+        stats = _stats.setdefault(stage, {"calls": 0, "escalations": 0, "reasons": {}})
+        if tier == "primary":
+            stats["calls"] += 1
+        else:
+            stats["escalations"] += 1
+            stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+    if reason:
+        metrics.increment("tca_model_escalations_total", stage=stage, reason=reason, mode=mode)
+
+
+def _confidence(result):
+    value = result.get("confidence")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def invoke_routed(stage, messages, schema, temperature=0.3, mode=None):
+    """
+    Call the routed model for ``stage`` and return its validated reply.
+
+    The first model gets no repair attempts when an escalation model is
+    configured: an invalid or low-confidence reply goes to the bigger model
+    instead (which keeps the usual repair budget).
+
+    Raises:
+        StructuredOutputError: If the final model's reply does not validate.
+    """
+    r = route(stage, mode)
+    llm = get_chat_model(model=r.model, temperature=temperature, stage=stage, **json_mode(r.model))
+    _record(stage, r.model, "primary")
+    if not r.escalate_to:
+        return invoke_structured(llm, messages, schema)
+
+    try:
+        result = invoke_structured(llm, messages, schema, max_repairs=0)
+        confidence = _confidence(result)
+        if confidence is None or confidence >= r.min_confidence:
+            return result
+        reason = "low_confidence"
+    except StructuredOutputError:
+        reason = "invalid"
+
+    _record(stage, r.escalate_to, "escalated", reason)
+    big = get_chat_model(model=r.escalate_to, temperature=temperature, stage=stage,
+                         **json_mode(r.escalate_to))
+    return invoke_structured(big, messages, schema)
+
+
+def routing_stats():
+    """Routed calls, escalations and escalation rate per stage."""
+    with _stats_lock:
+        return {
+            stage: {
+                "calls": s["calls"],
+                "escalations": s["escalations"],
+                "escalation_rate": s["escalations"] / s["calls"] if s["calls"] else 0.0,
+                "reasons": dict(s["reasons"]),
+            }
+            for stage, s in _stats.items()
+        }
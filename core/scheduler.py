@@ -0,0 +1,384 @@
+# scheduler.py
+"""
+Rate-limit-aware scheduling for LLM calls.
+
+Every call made through ``core.llm`` passes through ``get_scheduler().call``:
+
+- Admission is per model and strictly by priority: user-facing response
+  generation first, then analysis (analyzers, pattern tracking), then
+  personalization extraction and anything else (summaries, reports).
+- Each model has token buckets for requests and tokens per minute
+  (configured with ``TCA_LLM_LIMITS``; unlimited if not set). Token cost is
+  estimated from the prompt before the call and reconciled with the reported
+  usage afterwards.
+- Concurrency adapts with AIMD: it grows by ~1 per window of successful calls,
+  halves on a rate-limit (429) response, and backs off gently when latency
+  rises well above its moving average.
+- Rate-limit and transient errors are retried with jittered exponential backoff
+  (honouring ``Retry-After``) as long as the retry fits inside the current turn's
+  deadline (``deadline()``); waiting for admission is bounded the same way.
+
+Under saturation calls queue and slow down instead of all failing at once.
+Set ``TCA_LLM_SCHEDULER=false`` to bypass it.
+
+``TCA_LLM_LIMITS`` is JSON (inline or a file path)::
+
+    {"gpt-4o": {"rpm": 5000, "tpm": 800000, "max_concurrency": 64},
+     "default": {"rpm": 500, "tpm": 30000}}
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from core import metrics
+
+PRIORITY_RESPONSE = 0
+PRIORITY_ANALYSIS = 1
+PRIORITY_BACKGROUND = 2
+
+STAGE_PRIORITIES = {
+    "response": PRIORITY_RESPONSE,
+    "therapist_analysis": PRIORITY_ANALYSIS,
+    "security_analysis": PRIORITY_ANALYSIS,
+    "pattern_tracking": PRIORITY_ANALYSIS,
+    "personalization": PRIORITY_BACKGROUND,
+}
+
+DEFAULT_DEADLINE = 120.0
+BURST_SECONDS = 10.0
+DEFAULT_COMPLETION_TOKENS = 256
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+_deadline = contextvars.ContextVar("tca_llm_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current turn's deadline passed while waiting for or retrying an LLM call."""
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound LLM waiting and retries in this context to ``seconds`` from now."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    """Monotonic time by which the current turn must finish, if one is set."""
+    return _deadline.get()
+
+
+def stage_priority(stage):
+    return STAGE_PRIORITIES.get(stage, PRIORITY_BACKGROUND)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously.
+
+    Parameters:
+        per_minute (float): Refill rate.
+        burst_seconds (float): Capacity, in seconds of refill.
+    """
+
+    def __init__(self, per_minute, burst_seconds=BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` is available (0 if it is now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Debit (positive) or refund (negative) after the real cost is known."""
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class ModelScheduler:
+    """
+    Admission control for one model.
+
+    Parameters:
+        model (str): Model name (metrics label).
+        rpm (float, optional): Requests per minute budget.
+        tpm (float, optional): Tokens per minute budget.
+        max_concurrency (int): Upper bound for the adaptive limit.
+        initial_concurrency (int): Starting limit.
+    """
+
+    def __init__(self, model, rpm=None, tpm=None, max_concurrency=128, initial_concurrency=32,
+                 min_concurrency=1):
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.in_flight = 0
+        self.latency_ewma = None
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _budget_wait(self, cost, now):
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.wait_time(1, now)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(cost, now))
+        return wait
+
+    def acquire(self, priority, cost, deadline_at=None):
+        """Block until this call may start; higher priority (lower number) goes first."""
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiters[0] == entry and self.in_flight < max(1, int(self.limit)):
+                        wait = self._budget_wait(cost, now)
+                        if wait <= 0:
+                            heapq.heappop(self._waiters)
+                            if self.requests is not None:
+                                self.requests.take(1)
+                            if self.tokens is not None:
+                                self.tokens.take(cost)
+                            self.in_flight += 1
+                            self._cond.notify_all()
+                            break
+                    if deadline_at is not None:
+                        remaining = deadline_at - now
+                        if remaining <= 0:
+                            raise DeadlineExceeded(f"{self.model}: deadline passed while queued")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+        metrics.observe("tca_llm_queue_seconds", time.monotonic() - start,
+                        model=self.model, priority=str(priority))
+
+    def release(self, latency=None, throttled=False, cost_delta=0):
+        """Finish a call and feed the outcome into the AIMD controller."""
+        with self._cond:
+            self.in_flight -= 1
+            if cost_delta and self.tokens is not None:
+                self.tokens.adjust(cost_delta)
+            if throttled:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            elif latency is not None:
+                if self.latency_ewma is not None and latency > 2 * self.latency_ewma:
+                    self.limit = max(self.min_concurrency, self.limit * 0.9)
+                else:
+                    self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                self.latency_ewma = latency if self.latency_ewma is None else (
+                    0.9 * self.latency_ewma + 0.1 * latency)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "latency_ewma_s": self.latency_ewma,
+            }
+
+
+def _status_code(error):
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def is_rate_limited(error):
+    return type(error).__name__ == "RateLimitError" or _status_code(error) == 429
+
+
+def is_transient(error):
+    if isinstance(error, (ConnectionError, TimeoutError)) and not isinstance(error, DeadlineExceeded):
+        return True
+    if type(error).__name__ in ("APITimeoutError", "APIConnectionError", "InternalServerError"):
+        return True
+    code = _status_code(error)
+    return code is not None and code >= 500
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages, kwargs):
+    """Rough prompt + completion token cost used for budgeting before the call."""
+    if isinstance(messages, str):
+        chars = len(messages)
+    else:
+        chars = sum(len(str(getattr(m, "content", m))) for m in messages)
+    completion = kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return chars // 4 + completion
+
+
+def _load_limits():
+    raw = os.environ.get("TCA_LLM_LIMITS")
+    if not raw:
+        return {}
+    if not raw.lstrip().startswith("{"):
+        with open(raw, "r") as f:
+            return json.load(f)
+    return json.loads(raw)
+
+
+class LLMScheduler:
+    """Per-model schedulers plus the retry loop shared by sync and async calls."""
+
+    def __init__(self, limits=None):
+        self.limits = _load_limits() if limits is None else limits
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model):
+        scheduler = self._models.get(model)
+        if scheduler is None:
+            with self._lock:
+                scheduler = self._models.get(model)
+                if scheduler is None:
+                    config = self.limits.get(model) or self.limits.get("default") or {}
+                    scheduler = self._models[model] = ModelScheduler(model, **config)
+        return scheduler
+
+    def _backoff(self, model, attempt, error, deadline_at):
+        """Seconds to sleep before retrying, or None if the error is final."""
+        throttled = is_rate_limited(error)
+        if attempt > MAX_RETRIES or not (throttled or is_transient(error)):
+            return None
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        metrics.increment("tca_llm_retries_total", model=model,
+                          reason="rate_limited" if throttled else "transient")
+        return delay
+
+    def call(self, model, stage, messages, kwargs, fn):
+        """Run ``fn()`` (one LLM request) under admission control with retries."""
+        scheduler = self.for_model(model)
+        priority = stage_priority(stage)
+        cost = estimate_tokens(messages, kwargs)
+        deadline_at = current_deadline() or time.monotonic() + DEFAULT_DEADLINE
+        attempt = 0
+        while True:
+            scheduler.acquire(priority, cost, deadline_at)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                if throttled:
+                    metrics.increment("tca_llm_throttled_total", model=model)
+                scheduler.release(throttled=throttled)
+                attempt += 1
+                delay = self._backoff(model, attempt, e, deadline_at)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            used = sum(metrics.token_usage(result))
+            scheduler.release(time.monotonic() - start, cost_delta=used - cost if used else 0)
+            return result
+
+    async def acall(self, model, stage, messages, kwargs, fn):
+        """Async counterpart of ``call``; ``fn()`` returns an awaitable."""
+        scheduler = self.for_model(model)
+        priority = stage_priority(stage)
+        cost = estimate_tokens(messages, kwargs)
+        deadline_at = current_deadline() or time.monotonic() + DEFAULT_DEADLINE
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            # Admission may block; wait for it off the event loop.
+            admitted = loop.run_in_executor(None, scheduler.acquire, priority, cost, deadline_at)
+            try:
+                await asyncio.shield(admitted)
+            except asyncio.CancelledError:
+                # The slot may still be granted after we stop waiting; give it back.
+                admitted.add_done_callback(
+                    lambda f: f.cancelled() or f.exception() is not None or scheduler.release())
+                raise
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                if throttled:
+                    metrics.increment("tca_llm_throttled_total", model=model)
+                scheduler.release(throttled=throttled)
+                attempt += 1
+                delay = self._backoff(model, attempt, e, deadline_at)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            used = sum(metrics.token_usage(result))
+            scheduler.release(time.monotonic() - start, cost_delta=used - cost if used else 0)
+            return result
+
+    def stats(self):
+        return {model: s.stats() for model, s in self._models.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The process-wide scheduler, or None when ``TCA_LLM_SCHEDULER=false``."""
+    global _scheduler
+    if _scheduler is None:
+        if os.environ.get("TCA_LLM_SCHEDULER", "true").lower() != "true":
+            return None
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def scheduler_stats():
+    """Current adaptive limit, in-flight and queued calls per model."""
+    return _scheduler.stats() if _scheduler is not None else {}
@@ -0,0 +1,124 @@
+# speculation.py
+"""
+Speculative response generation.
+
+Most turns have the same emotion and intent as the previous one, so the
+response can start from the previous turn's analysis while the current
+analysis is still running. ``Speculation`` starts that response on a worker
+thread; once the fresh analysis is known, ``resolve`` keeps the speculative
+reply if the analysis matches within tolerance (the fields the response prompt
+uses), and otherwise discards it so the pipeline regenerates. A discarded call
+cannot be interrupted mid-request; its tokens are counted as wasted when it
+finishes.
+
+Hit rate and wasted tokens are reported through ``core.metrics``
+(``tca_speculation_total``, ``tca_speculation_wasted_tokens_total``) and
+``speculation_stats()``.
+"""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from core import metrics, profiling
+from core.llm import token_meter
+
+# Analysis fields that shape the response prompt; the tolerance is an exact,
+# case-insensitive match on each.
+MATCH_KEYS = ("emotion", "intent")
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "errors": 0, "wasted_tokens": 0}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = int(os.environ.get("TCA_SPECULATIVE_WORKERS", "8"))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tca-speculative")
+    return _executor
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def _normalize(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+def analyses_match(basis, analysis, keys=MATCH_KEYS):
+    """Whether ``analysis`` agrees with ``basis`` on every field in ``keys``."""
+    return all(_normalize(basis.get(k)) == _normalize(analysis.get(k)) for k in keys)
+
+
+class Speculation:
+    """
+    A response generated from a guessed analysis.
+
+    Parameters:
+        fn (callable): Produces the response; called with no arguments on a worker.
+        basis (dict): The analysis the response was generated from.
+    """
+
+    def __init__(self, fn, basis):
+        self.basis = basis
+        self.tokens = None
+        ctx = contextvars.copy_context()
+        self.future = _get_executor().submit(ctx.run, profiling.follow, self._run, fn)
+
+    def _run(self, fn):
+        with token_meter() as meter:
+            self.tokens = meter
+            return fn()
+
+    def _discard(self):
+        def count_waste(future):
+            if self.tokens is not None:
+                wasted = sum(self.tokens)
+                _count("wasted_tokens", wasted)
+                metrics.increment("tca_speculation_wasted_tokens_total", wasted)
+        if not self.future.cancel():
+            self.future.add_done_callback(count_waste)
+
+    def resolve(self, analysis, timeout=None):
+        """
+        Return the speculative response if ``analysis`` matches its basis,
+        else None (the caller should generate a fresh one).
+        """
+        if not analyses_match(self.basis, analysis):
+            _count("misses")
+            metrics.increment("tca_speculation_total", result="miss")
+            self._discard()
+            return None
+        try:
+            response = self.future.result(timeout=timeout)
+        except FutureTimeout:
+            self._discard()
+            response = None
+        except Exception as e:
+            logger.warning("Speculative response failed (%s: %s), regenerating", type(e).__name__, e)
+            response = None
+        if response is None:
+            _count("errors")
+            metrics.increment("tca_speculation_total", result="error")
+            return None
+        _count("hits")
+        metrics.increment("tca_speculation_total", result="hit")
+        return response
+
+
+def speculation_stats():
+    """Hits, misses, errors, hit rate and tokens spent on discarded responses."""
+    with _lock:
+        stats = dict(_stats)
+    attempts = stats["hits"] + stats["misses"] + stats["errors"]
+    stats["hit_rate"] = stats["hits"] / attempts if attempts else 0.0
+    return stats
@@ -0,0 +1,252 @@
+# structured.py
+"""
+Structured (JSON) output for analyzer LLM calls.
+
+Each analyzer declares a ``Schema`` once at import time. Calls go through
+``invoke_structured``, which asks the model for JSON mode, decodes the reply
+with the fastest available JSON decoder, validates and coerces it against the
+schema, and on failure runs a bounded repair loop that shows the model its
+own reply and the validation error. If the reply still does not validate,
+``StructuredOutputError`` is raised rather than silently substituting defaults;
+analyzers that fall back to a default mark it with ``source: FALLBACK_SOURCE``
+so the turn records the degradation.
+
+Parse outcomes and repairs are counted in ``core.metrics`` under
+``tca_structured_parse_total`` and ``tca_structured_repairs_total``.
+"""
+import json
+import re
+
+from core import metrics
+
+try:
+    from orjson import loads as _loads
+except ImportError:  # pragma: no cover - optional speedup
+    _loads = json.loads
+
+# Passed to ChatOpenAI so the provider guarantees syntactically valid JSON.
+JSON_MODE = {"response_format": {"type": "json_object"}}
+
+# Models that reject response_format; their replies rely on parsing and repair.
+_NO_JSON_MODE = {"gpt-4", "gpt-4-0314", "gpt-4-0613", "gpt-4-32k", "gpt-4-32k-0613"}
+
+DEFAULT_MAX_REPAIRS = 1
+
+# ``analysis["source"]`` of a default returned because the reply was unusable.
+FALLBACK_SOURCE = "fallback"
+
+_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+
+def json_mode(model):
+    """Keyword arguments for ``get_chat_model`` enabling JSON mode where the model supports it."""
+    return {} if model in _NO_JSON_MODE else {"model_kwargs": JSON_MODE}
+
+
+class StructuredOutputError(ValueError):
+    """Raised when an LLM reply cannot be parsed into the expected schema."""
+
+    def __init__(self, schema, message, content=None):
+        super().__init__(f"{schema}: {message}")
+        self.schema = schema
+        self.content = content
+
+
+class Field:
+    """
+    One expected key of a structured reply.
+
+    Parameters:
+        type (type): str, int, float, bool, list or dict.
+        required (bool): Whether the key must be present.
+        choices (tuple, optional): Allowed values for str fields (case-insensitive;
+            values are normalized to the listed spelling).
+        items (type, optional): Element type for list fields.
+        description (str, optional): Short hint used in prompts and repairs.
+    """
+
+    def __init__(self, type, required=True, choices=None, items=None, description=""):
+        self.type = type
+        self.required = required
+        self.choices = tuple(choices) if choices else None
+        self.items = items
+        self.description = description
+
+
+def _compile_field(name, field):
+    """Build a validator ``value -> coerced value`` for one field."""
+    expected = field.type
+    if expected is str:
+        lookup = {c.lower(): c for c in field.choices} if field.choices else None
+
+        def check(value):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            if not isinstance(value, str):
+                raise ValueError(f"'{name}' must be a string")
+            value = value.strip()
+            if lookup is not None:
+                normalized = lookup.get(value.lower())
+                if normalized is None:
+                    raise ValueError(f"'{name}' must be one of {list(field.choices)}")
+                return normalized
+            return value
+        return check
+    if expected is list:
+        item_type = field.items
+
+        def check(value):
+            if isinstance(value, str):
+                value = [value] if value.strip() else []
+            if not isinstance(value, list):
+                raise ValueError(f"'{name}' must be a list")
+            if item_type is str:
+                value = [v if isinstance(v, str) else json.dumps(v) for v in value]
+            return value
+        return check
+    if expected is dict:
+        def check(value):
+            if value in ("", None):
+                return {}
+            if not isinstance(value, dict):
+                raise ValueError(f"'{name}' must be an object")
+            return value
+        return check
+    if expected in (int, float):
+        def check(value):
+            if isinstance(value, bool):
+                raise ValueError(f"'{name}' must be a number")
+            try:
+                return expected(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{name}' must be a number")
+        return check
+    if expected is bool:
+        def check(value):
+            if not isinstance(value, bool):
+                raise ValueError(f"'{name}' must be true or false")
+            return value
+        return check
+    raise TypeError(f"Unsupported field type for '{name}': {expected}")
+
+
+class Schema:
+    """
+    A compiled JSON object schema.
+
+    Parameters:
+        name (str): Schema name, used in errors and metrics labels.
+        fields (dict): Mapping of key to ``Field``.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self._validators = [(key, field.required, _compile_field(key, field))
+                            for key, field in fields.items()]
+
+    def describe(self):
+        """Compact description of the expected object for prompts."""
+        parts = []
+        for key, field in self.fields.items():
+            if field.choices:
+                kind = "|".join(field.choices)
+            elif field.type is list:
+                kind = f"list of {getattr(field.items, '__name__', 'any')}"
+            else:
+                kind = {dict: "object", str: "string"}.get(field.type, field.type.__name__)
+            optional = "" if field.required else ", optional"
+            hint = f" - {field.description}" if field.description else ""
+            parts.append(f'"{key}" ({kind}{optional}){hint}')
+        return "a JSON object with keys: " + "; ".join(parts)
+
+    def validate(self, data):
+        """Validate and coerce a decoded object; raise ValueError on mismatch."""
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        result = {}
+        errors = []
+        for key, required, check in self._validators:
+            if key not in data or data[key] is None:
+                if required:
+                    errors.append(f"missing '{key}'")
+                continue
+            try:
+                result[key] = check(data[key])
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            raise ValueError("; ".join(errors))
+        # Keep extra keys the model chose to add (e.g. a confidence score).
+        for key, value in data.items():
+            result.setdefault(key, value)
+        return result
+
+    def parse(self, content):
+        """Decode and validate raw model output."""
+        text = content.strip() if isinstance(content, str) else content
+        if not isinstance(text, str):
+            raise ValueError("reply is not text")
+        if not text.startswith("{"):
+            fenced = _FENCE.match(text)
+            if fenced:
+                text = fenced.group(1)
+            else:
+                start, end = text.find("{"), text.rfind("}")
+                if start == -1 or end <= start:
+                    raise ValueError("no JSON object in reply")
+                text = text[start:end + 1]
+        try:
+            data = _loads(text)
+        except ValueError as e:
+            raise ValueError(f"invalid JSON: {e}")
+        return self.validate(data)
+
+
+def invoke_structured(llm, messages, schema, max_repairs=DEFAULT_MAX_REPAIRS):
+    """
+    Call ``llm`` and return its reply parsed against ``schema``.
+
+    Parameters:
+        llm: Chat model exposing ``invoke(messages)``.
+        messages (list): Prompt messages.
+        schema (Schema): Expected reply structure.
+        max_repairs (int): Extra calls allowed to fix an invalid reply.
+
+    Returns:
+        dict: The validated object.
+
+    Raises:
+        StructuredOutputError: If no reply validates within the repair budget.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    result = llm.invoke(messages)
+    try:
+        parsed = schema.parse(result.content)
+        metrics.increment("tca_structured_parse_total", schema=schema.name, result="ok")
+        return parsed
+    except ValueError as e:
+        error = str(e)
+        content = result.content
+        metrics.increment("tca_structured_parse_total", schema=schema.name, result="failed")
+
+    for _ in range(max_repairs):
+        repair_messages = list(messages) + [
+            AIMessage(content=str(content)),
+            HumanMessage(content=(
+                f"That reply was not valid ({error}). "
+                f"Respond with only {schema.describe()}."
+            )),
+        ]
+        result = llm.invoke(repair_messages)
+        try:
+            parsed = schema.parse(result.content)
+            metrics.increment("tca_structured_repairs_total", schema=schema.name, result="ok")
+            return parsed
+        except ValueError as e:
+            error = str(e)
+            content = result.content
+            metrics.increment("tca_structured_repairs_total", schema=schema.name, result="failed")
+
+    raise StructuredOutputError(schema.name, error, content)
@@ -0,0 +1,237 @@
+# tracing.py
+"""
+Structured trace events with low overhead.
+
+``event(name, **fields)`` records what a stage saw or produced (an analysis,
+a pattern, a loaded checkpoint). It costs almost nothing unless a sink wants
+events at that level:
+
+- Nothing is copied or serialized when no sink is enabled for the level. A
+  callable field (``checkpoint=lambda: state``) is only called when one is.
+- Turns are sampled as a whole: ``turn(session_id)`` decides once, with
+  probability ``TCA_TRACE_SAMPLE_RATE``, whether that turn's events are kept,
+  and tags them with the session and a turn number.
+- Payloads are copied with a size cap: at most ``TCA_TRACE_MAX_ITEMS`` values
+  per event, strings cut at ``TCA_TRACE_MAX_CHARS``, and long lists keep
+  their latest entries. Tracing a turn therefore costs the same on turn 500
+  as on turn 1.
+- The copy is handed to sinks; ``AsyncSink`` serializes and writes it on a
+  background thread, dropping (and counting) events when its queue is full.
+
+Sinks have ``wants(level)`` and ``handle(event)``. The default is an
+``AsyncSink(LoggingSink())``, which writes one JSON line per event to the
+``core.trace`` logger when that logger is enabled for the level;
+``MongoTraceSink`` stores events through a ``BufferedMongoSink``. Use
+``add_sink``/``remove_sink`` to change them.
+"""
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime
+
+from core import metrics
+
+SAMPLE_RATE = float(os.environ.get("TCA_TRACE_SAMPLE_RATE", "1.0"))
+MAX_ITEMS = int(os.environ.get("TCA_TRACE_MAX_ITEMS", "200"))
+MAX_CHARS = int(os.environ.get("TCA_TRACE_MAX_CHARS", "2000"))
+QUEUE_SIZE = 10000
+
+_turn = contextvars.ContextVar("tca_trace_turn", default=None)
+_turn_numbers = itertools.count(1)
+
+
+################################################################################
+# Sinks
+################################################################################
+
+class LoggingSink:
+    """Writes events as JSON to a logger, if it is enabled for their level."""
+
+    def __init__(self, logger_name="core.trace"):
+        self.logger = logging.getLogger(logger_name)
+
+    def wants(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def handle(self, event):
+        self.logger.log(event["levelno"], "%s %s", event["event"], json.dumps(event, default=str))
+
+
+class MongoTraceSink:
+    """Stores events in MongoDB through a ``BufferedMongoSink``."""
+
+    def __init__(self, sink, level=logging.DEBUG):
+        self.sink = sink
+        self.level = level
+
+    def wants(self, level):
+        return level >= self.level
+
+    def handle(self, event):
+        self.sink.emit(event)
+
+
+class AsyncSink:
+    """
+    Hands events to ``inner`` on a background thread.
+
+    Parameters:
+        inner: The sink doing the actual (possibly slow) work.
+        max_queue (int): Events buffered before new ones are dropped.
+    """
+
+    def __init__(self, inner, max_queue=QUEUE_SIZE):
+        self.inner = inner
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wants(self, level):
+        return self.inner.wants(level)
+
+    def handle(self, event):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="tca-trace", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            metrics.increment("tca_trace_events_total", result="dropped")
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            try:
+                self.inner.handle(event)
+            except Exception as e:
+                logging.getLogger(__name__).warning("Trace sink failed: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued event has been handled."""
+        self._queue.join()
+
+
+_sinks = [AsyncSink(LoggingSink())]
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """Register ``sink``; returns it."""
+    global _sinks
+    with _sinks_lock:
+        _sinks = _sinks + [sink]
+    return sink
+
+
+def remove_sink(sink):
+    global _sinks
+    with _sinks_lock:
+        _sinks = [s for s in _sinks if s is not sink]
+
+
+def flush():
+    """Wait for asynchronous sinks to handle the events queued so far."""
+    for sink in _sinks:
+        if hasattr(sink, "flush"):
+            sink.flush()
+
+
+def enabled(level=logging.DEBUG):
+    """True if some sink wants events at ``level``."""
+    return any(sink.wants(level) for sink in _sinks)
+
+
+################################################################################
+# Events
+################################################################################
+
+def _snapshot(value, budget):
+    """Copy ``value`` into JSON types, visiting at most ``budget[0]`` values."""
+    budget[0] -= 1
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= MAX_CHARS else f"{value[:MAX_CHARS]}... ({len(value)} chars)"
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if budget[0] <= 0:
+                out["..."] = f"{len(value) - len(out)} more keys"
+                break
+            out[str(key)] = _snapshot(item, budget)
+        return out
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = value if isinstance(value, (list, tuple)) else list(value)
+        latest = []
+        for item in reversed(items):
+            if budget[0] <= 0:
+                break
+            latest.append(_snapshot(item, budget))
+        latest.reverse()
+        if len(latest) < len(items):
+            latest.insert(0, f"... {len(items) - len(latest)} earlier")
+        return latest
+    return _snapshot(str(value), budget)
+
+
+@contextlib.contextmanager
+def turn(session_id, sample_rate=None):
+    """
+    Scope one turn: decide whether its events are sampled and tag them.
+
+    Parameters:
+        session_id (str): Session the turn belongs to.
+        sample_rate (float, optional): Overrides ``TCA_TRACE_SAMPLE_RATE``.
+    """
+    rate = SAMPLE_RATE if sample_rate is None else sample_rate
+    token = _turn.set({"session_id": session_id, "turn": next(_turn_numbers),
+                       "sampled": rate >= 1 or random.random() < rate})
+    try:
+        yield
+    finally:
+        _turn.reset(token)
+
+
+def event(name, level=logging.DEBUG, **fields):
+    """
+    Record a trace event.
+
+    Parameters:
+        name (str): Event name, e.g. ``"analysis"``.
+        level (int): ``logging`` level of the event.
+        **fields: Payload; callables are called only if the event is kept.
+
+    Returns:
+        bool: True if a sink received the event.
+    """
+    sinks = [sink for sink in _sinks if sink.wants(level)]
+    if not sinks:
+        return False
+    context = _turn.get()
+    sampled = context["sampled"] if context is not None else SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE
+    if not sampled:
+        metrics.increment("tca_trace_events_total", result="sampled_out")
+        return False
+
+    budget = [MAX_ITEMS]
+    record = {"event": name, "level": logging.getLevelName(level), "levelno": level,
+              "created_at": datetime.utcnow().isoformat()}
+    if context is not None:
+        record["session_id"] = context["session_id"]
+        record["turn"] = context["turn"]
+    record["fields"] = {key: _snapshot(value() if callable(value) else value, budget)
+                        for key, value in fields.items()}
+    for sink in sinks:
+        sink.handle(record)
+    metrics.increment("tca_trace_events_total", result="emitted")
+    return True
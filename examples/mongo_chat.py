@@ -14,11 +14,13 @@ Before running, set these environment variables (via your shell or .env file):
 import os
 import asyncio
 
-from core.pipeline import TCAPipeline
+from core.pipeline import TCAPipeline, configure_logging
 from memory.chats.chats import load_chat_history, save_chat_history
 from memory.vectorstore.vectorstore import load_vector_store
 
 def main():
+    configure_logging()
+
     # Get session id and whether to use Mongo-based persistence.
     session_id = os.environ.get("USER_ID", "default-user")
     use_mongo = os.environ.get("USE_MONGO", "false").lower() == "true"
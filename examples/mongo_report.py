@@ -3,13 +3,16 @@ load_dotenv()
 
 import os
 import asyncio
+from collections import deque
 from datetime import datetime
 from typing import Dict, Any
 
 from pymongo import MongoClient
 
 # Import your schema definitions
-from memory.mongodb.schema import Report, Log, Chat
+from memory.mongodb.schema import Log, Chat
+from memory.mongodb.log_sink import BufferedMongoSink
+from memory.mongodb.report_cache import ReportCache
 
 # Import the necessary classes from your vector store and GPTR packages
 from langchain_community.embeddings import OpenAIEmbeddings
@@ -58,34 +61,34 @@ def create_mongo_vector_store():
 ################################################################################
 
 class CustomLogsHandler:
-    """A custom logs handler class to process and store logs as JSON into MongoDB."""
-    def __init__(self, logs_collection):
-        self.logs_collection = logs_collection
-        self.logs = []
+    """
+    A custom logs handler class to process and store logs as JSON into MongoDB.
+
+    Entries are queued on a ``BufferedMongoSink`` and written in batches by a
+    background thread, so streaming a log never waits on MongoDB. Call
+    ``close()`` when the run ends to flush what is still queued.
+    """
+    def __init__(self, logs_collection, keep_recent=1000):
+        self.sink = BufferedMongoSink(logs_collection, name="gptr_logs")
+        # Only the most recent entries are kept in memory.
+        self.logs = deque(maxlen=keep_recent)
 
     async def send_json(self, data: Dict[str, Any]) -> None:
-        """Handle a JSON log entry by storing it locally and in MongoDB."""
-        # Append to an in-memory list (if you need to keep runtime logs)
+        """Handle a JSON log entry by keeping it locally and queueing it for MongoDB."""
         self.logs.append(data)
         print(f"My custom Log: {data}")
-        # Also add a created_at timestamp and insert into the MongoDB logs collection
-        data["created_at"] = datetime.utcnow().isoformat()
-        self.logs_collection.insert_one(data)
+        await self.sink.asend(data)
+
+    async def close(self) -> None:
+        """Flush queued entries without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.sink.close)
+        print(f"Log sink: {self.sink.stats()}")
 
 ################################################################################
-# 3. Helper Functions to Save Report & Chat Data
+# 3. Helper Functions to Save Chat Data
+#    (reports are stored by the report cache, see memory/mongodb/report_cache.py)
 ################################################################################
 
-def save_report_to_db(report_content: str):
-    """Save a final report to the reports collection in MongoDB."""
-    report = Report(
-        report_id=str(datetime.utcnow().timestamp()),
-        content=report_content,
-        created_at=datetime.utcnow().isoformat()
-    )
-    REPORTS_COLLECTION.insert_one(report.dict())
-    print("Report saved to MongoDB.")
-
 def save_chat_to_db(conversation: list):
     """Save a chat transcript to the chats collection in MongoDB."""
     chat = Chat(
@@ -100,13 +103,8 @@ def save_chat_to_db(conversation: list):
 # 4. Main Flow Function
 ################################################################################
 
-async def run_flow():
-    # Create a MongoDB vector store instance
-    vector_store = create_mongo_vector_store()
-
-    # Define your research query
-    query = "how would you design a personalization module for a chatbot?"
-
+async def research(query, report_type, report_source, vector_store):
+    """Run GPT Researcher from scratch and return the report text."""
     # Initialize your custom logs handler to stream and save log messages
     custom_logs_handler = CustomLogsHandler(LOGS_COLLECTION)
 
@@ -116,21 +114,39 @@ async def run_flow():
     # • websocket set to your custom logs handler (for streaming logs)
     researcher = GPTResearcher(
         query=query,
-        report_type="research_report",
-        report_source="web",
+        report_type=report_type,
+        report_source=report_source,
         vector_store=vector_store,
         websocket=custom_logs_handler
     )
 
-    # Conduct research—this will embed and store the scraped web data into the MongoDB vector store.
-    await researcher.conduct_research()
+    try:
+        # Conduct research—this will embed and store the scraped web data into the MongoDB vector store.
+        await researcher.conduct_research()
 
-    # Generate the research report from the previously stored context.
-    report = await researcher.write_report()
-    print("Final Report:", report)
+        # Generate the research report from the previously stored context.
+        return await researcher.write_report()
+    finally:
+        await custom_logs_handler.close()
 
-    # Save the report into the MongoDB reports collection.
-    save_report_to_db(report)
+async def run_flow():
+    # Create a MongoDB vector store instance
+    vector_store = create_mongo_vector_store()
+
+    # Define your research query
+    query = "how would you design a personalization module for a chatbot?"
+    report_type = "research_report"
+    report_source = "web"
+
+    # Reuse a recent report for the same (normalized) query and configuration.
+    # A stale one is served right away and refreshed in the background.
+    report_cache = ReportCache(REPORTS_COLLECTION)
+    source = {"report_source": report_source, "vector_store": "gptr_db.vector_store"}
+    report, status = await report_cache.get_or_create(
+        query, report_type, source,
+        lambda: research(query, report_type, report_source, vector_store),
+    )
+    print(f"Final Report ({status}):", report)
 
     # (Optional) Capture the conversation for the current run and save it into a chats collection.
     # In practice this may come from your state or logs.
@@ -146,6 +162,9 @@ async def run_flow():
     for idx, doc in enumerate(related_contexts):
         print(f"Result {idx+1}: {doc.page_content}")
 
+    # Let a background refresh finish before the script exits.
+    await report_cache.wait_refreshes()
+
 ################################################################################
 # 5. Run the Flow
 ################################################################################
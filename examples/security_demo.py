@@ -2,9 +2,11 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from core.pipeline import TCAPipeline
+from core.pipeline import TCAPipeline, configure_logging
 from memory.langraph_adapter import LangGraphMemoryAdapter
 
+configure_logging()
+
 user_id = "demo_user"
 
 print("=== Security App ===")
@@ -18,6 +20,9 @@ pipeline.load(prior_state)
 while True:
     user_input = input("You: ")
     if user_input.lower() in ["exit", "quit"]:
+        # Merge background (deferred) analysis of the last turn before leaving.
+        pipeline.flush_deferred()
+        LangGraphMemoryAdapter.save_checkpoint(user_id, pipeline.to_dict())
         break
 
     result = pipeline.process(user_input)
@@ -1,9 +1,11 @@
 # therapist_demo.py
 from dotenv import load_dotenv
 load_dotenv()
-from core.pipeline import TCAPipeline
+from core.pipeline import TCAPipeline, configure_logging
 from memory.langraph_adapter import LangGraphMemoryAdapter
 
+configure_logging()
+
 user_id = "demo_user"
 
 print("=== Therapist App ===")
@@ -17,6 +19,9 @@ pipeline.load(prior_state)
 while True:
     user_input = input("You: ")
     if user_input.lower() in ["exit", "quit"]:
+        # Merge background (deferred) analysis of the last turn before leaving.
+        pipeline.flush_deferred()
+        LangGraphMemoryAdapter.save_checkpoint(user_id, pipeline.to_dict())
         break
 
     result = pipeline.process(user_input)
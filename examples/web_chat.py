@@ -6,8 +6,9 @@ from pathlib import Path
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
-from flask import Flask, render_template, request, jsonify
-from core.pipeline import TCAPipeline
+from flask import Flask, Response, render_template, request, jsonify
+from core import metrics
+from core.pipeline import TCAPipeline, configure_logging
 from memory.langraph_adapter import LangGraphMemoryAdapter
 from memory.memory_store import (
     get_user_id, 
@@ -19,6 +20,7 @@ from memory.memory_store import (
 from dotenv import load_dotenv
 
 load_dotenv()
+configure_logging()
 
 # Initialize Flask app with the correct template folder
 template_dir = os.path.join(os.path.dirname(__file__), 'templates')
@@ -56,17 +58,32 @@ def send_message():
     if not user_input:
         return jsonify({'error': 'No message provided'}), 400
 
-    # Process the message through the pipeline
-    result = pipeline.process(user_input)
-    
-    # Save updated memory
-    LangGraphMemoryAdapter.save_checkpoint(user_id, pipeline.to_dict())
-    
-    return jsonify({
+    # Process the message through the pipeline. "X-TCA-Profile: 1" captures a
+    # wall-clock/CPU profile of this turn under TCA_PROFILE_DIR.
+    profile = request.headers.get('X-TCA-Profile', '').lower() in ('1', 'true', 'yes')
+    result = pipeline.process(user_input, profile=profile)
+
+    response = jsonify({
         'response': result['response'],
         'timestamp': result.get('timestamp', '')
     })
 
+    # Save updated memory once this turn's deferred personalization (if any)
+    # has been merged; this runs after the reply is sent, so it stays off the
+    # response path.
+    @response.call_on_close
+    def save_memory():
+        pipeline.flush_deferred()
+        LangGraphMemoryAdapter.save_checkpoint(user_id, pipeline.to_dict())
+
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus scrape target; empty unless TCA_METRICS=true.
+    return Response(metrics.get_registry().render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/update_profile', methods=['POST'])
 def update_profile():
     profile_data = request.json.get('profile', {})
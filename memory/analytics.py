@@ -0,0 +1,401 @@
+# analytics.py
+"""
+Population analytics over the per-turn analysis stored in checkpoints.
+
+Three reports, each broken down by cohort:
+
+- ``label_distribution``: how often each emotion (intent, topic, risk level)
+  occurs, as counts and shares.
+- ``drift_rates``: how often a user's emotion changes from one turn to the
+  next, per cohort overall and as the mean and percentiles of per-user rates.
+- ``risk_timeseries``: risk levels per hour, day or month, with the share of
+  high and critical turns.
+
+On Mongo the heavy part runs server-side: each report is one aggregation
+pipeline that projects only the analysis arrays it needs from ``chats`` and
+unwinds, groups and counts them there, so only small grouped rows (or, for
+drift, three numbers per user) come back. The local backend reads the
+checkpoint file once and keeps the same columns. Either way the result is
+finished with vectorized NumPy over the categorical label arrays (``np.unique``
+codes and ``np.bincount`` tallies).
+
+Counts folded away by ``memory.consolidation`` are included in the
+distributions and drift rates; risk time series only cover turns that still
+have timestamps. Archived checkpoints are not included.
+
+Cohorts: ``None`` (everyone), ``"month"`` (month of the last session) or a
+dotted checkpoint field such as ``"session_memory.user_profile.plan"``.
+
+Usage:
+    python -m memory.analytics distribution --field emotion --cohort month
+    python -m memory.analytics drift
+    python -m memory.analytics risk --interval day --since 2025-01-01
+"""
+import argparse
+import json
+
+FIELDS = {"emotion": "emotion_trends", "intent": "intents", "topic": "topics",
+          "risk_level": "risk_levels"}
+INTERVALS = {"hour": 13, "day": 10, "month": 7}  # ISO timestamp prefix lengths
+ELEVATED_RISK = ("high", "critical")
+_TO_END = 2 ** 31 - 1  # $slice count that takes the rest of the array
+
+
+def _numpy():
+    import numpy as np
+    return np
+
+
+def _key(field):
+    if field not in FIELDS:
+        raise ValueError(f"Unknown field {field!r}; expected one of {sorted(FIELDS)}")
+    return FIELDS[field]
+
+
+def _tally(columns, weights=None):
+    """
+    Count the combinations of several categorical columns.
+
+    Returns:
+        tuple: (labels per column, count array with one axis per column)
+    """
+    np = _numpy()
+    labels, codes = [], []
+    for column in columns:
+        values, inverse = np.unique(np.asarray(column, dtype=str), return_inverse=True)
+        labels.append(values)
+        codes.append(inverse.ravel())
+    shape = tuple(len(values) for values in labels)
+    size = int(np.prod(shape))
+    if not size:
+        return labels, np.zeros(shape, dtype=np.int64)
+    flat = np.ravel_multi_index(codes, shape)
+    counts = np.bincount(flat, weights=weights, minlength=size)
+    return labels, counts.reshape(shape).astype(np.int64)
+
+
+################################################################################
+# Reading
+################################################################################
+
+def _consolidated_name(key):
+    from memory.consolidation import TREND_KEYS
+    return TREND_KEYS[key]
+
+
+def _db(db):
+    if db is not None:
+        return db
+    from memory.langraph_adapter import _get_mongo_db
+    return _get_mongo_db()
+
+
+def _cohort_expr(cohort):
+    if cohort is None:
+        return {"$literal": "all"}
+    if cohort == "month":
+        return {"$substrBytes": [{"$ifNull": ["$updated_at", ""]}, 0, 7]}
+    return {"$toString": {"$ifNull": [f"${cohort}", "unknown"]}}
+
+
+def _local_cohort(cohort, state):
+    if cohort is None:
+        return "all"
+    if cohort == "month":
+        return (state.get("updated_at") or "")[:7]
+    value = state
+    for part in cohort.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return "unknown" if value is None else str(value)
+
+
+def _local_rows(match, cohort):
+    """(cohort, session_memory) for every local checkpoint matching ``match``."""
+    import memory.langraph_adapter as adapter
+
+    since = (match or {}).get("updated_at", {}).get("$gte", "")
+    for state in adapter._read_local().values():
+        if (state.get("updated_at") or "") >= since:
+            yield _local_cohort(cohort, state), state.get("session_memory") or {}
+
+
+def _match(since):
+    # ``chats`` also holds chat histories (keyed by session_id); only checkpoints have a user_id.
+    match = {"user_id": {"$exists": True}}
+    if since:
+        match["updated_at"] = {"$gte": since}
+    return match
+
+
+def _pipeline(match, stages):
+    return ([{"$match": match}] if match else []) + stages
+
+
+################################################################################
+# Label distributions
+################################################################################
+
+def label_distribution(field="emotion", cohort=None, since=None, db=None):
+    """
+    Counts and shares of each label of ``field`` per cohort.
+
+    Parameters:
+        field (str): ``emotion``, ``intent``, ``topic`` or ``risk_level``.
+        cohort (str, optional): Cohort definition (see the module docstring).
+        since (str, optional): Only checkpoints saved at or after this ISO time.
+        db: Mongo database; by default the configured one, or the local file.
+
+    Returns:
+        dict: ``{cohort: {"total", "counts", "share"}}``, labels most frequent first.
+    """
+    np = _numpy()
+    key = _key(field)
+    folded = f"session_memory.consolidated.{_consolidated_name(key)}"
+    db = _db(db)
+    cohorts, labels, weights = [], [], []
+    if db is not None:
+        live = _pipeline(_match(since), [
+            {"$project": {"_id": 0, "cohort": _cohort_expr(cohort), "label": f"$session_memory.{key}"}},
+            {"$unwind": "$label"},
+            {"$match": {"label": {"$type": "string"}}},
+            {"$group": {"_id": {"cohort": "$cohort", "label": "$label"}, "count": {"$sum": 1}}},
+        ])
+        old = _pipeline(dict(_match(since), **{folded: {"$type": "object"}}), [
+            {"$project": {"_id": 0, "cohort": _cohort_expr(cohort), "kv": {"$objectToArray": f"${folded}"}}},
+            {"$unwind": "$kv"},
+            {"$group": {"_id": {"cohort": "$cohort", "label": "$kv.k"}, "count": {"$sum": "$kv.v"}}},
+        ])
+        for pipeline in (live, old):
+            for row in db["chats"].aggregate(pipeline, allowDiskUse=True):
+                cohorts.append(row["_id"]["cohort"])
+                labels.append(row["_id"]["label"])
+                weights.append(row["count"])
+    else:
+        lengths, folded_rows = [], []
+        for name, memory in _local_rows(_match(since), cohort):
+            values = memory.get(key) or []
+            cohorts.append(name)
+            labels.extend(values)
+            lengths.append(len(values))
+            for label, count in ((memory.get("consolidated") or {}).get(_consolidated_name(key)) or {}).items():
+                folded_rows.append((name, label, count))
+        cohorts = np.repeat(np.asarray(cohorts, dtype=str), lengths)
+        labels = np.asarray(labels, dtype=object)
+        keep = np.not_equal(labels, None)
+        cohorts, labels = cohorts[keep], labels[keep].astype(str)
+        weights = np.ones(len(labels))
+        if folded_rows:
+            names, folded_labels, counts = zip(*folded_rows)
+            cohorts = np.concatenate([cohorts, np.asarray(names, dtype=str)])
+            labels = np.concatenate([labels, np.asarray(folded_labels, dtype=str)])
+            weights = np.concatenate([weights, np.asarray(counts, dtype=float)])
+
+    (cohort_names, label_names), counts = _tally([cohorts, labels], np.asarray(weights, dtype=float))
+    report = {}
+    for i, name in enumerate(cohort_names):
+        row = counts[i]
+        order = np.argsort(-row, kind="stable")
+        order = order[row[order] > 0]
+        total = int(row.sum())
+        report[str(name)] = {
+            "total": total,
+            "counts": {str(label_names[j]): int(row[j]) for j in order},
+            "share": {str(label_names[j]): round(float(row[j]) / total, 4) for j in order},
+        }
+    return report
+
+
+################################################################################
+# Drift rates
+################################################################################
+
+def _changes_expr(array):
+    """Server-side transitions and changes between consecutive non-null entries."""
+    pairs = {"$zip": {"inputs": [array, {"$slice": [array, 1, _TO_END]}]}}
+    a, b = {"$arrayElemAt": ["$$p", 0]}, {"$arrayElemAt": ["$$p", 1]}
+    both = {"$and": [{"$ne": [a, None]}, {"$ne": [b, None]}]}
+    return {
+        "t": {"$size": {"$filter": {"input": pairs, "as": "p", "cond": both}}},
+        "c": {"$size": {"$filter": {"input": pairs, "as": "p", "cond": {"$and": [both, {"$ne": [a, b]}]}}}},
+    }
+
+
+def drift_rates(field="emotion", cohort=None, since=None, db=None, percentiles=(50, 90)):
+    """
+    How often ``field`` changes between consecutive turns, per cohort.
+
+    Parameters:
+        field (str): ``emotion``, ``intent``, ``topic`` or ``risk_level``.
+        cohort (str, optional): Cohort definition (see the module docstring).
+        since (str, optional): Only checkpoints saved at or after this ISO time.
+        db: Mongo database; by default the configured one, or the local file.
+        percentiles (tuple): Percentiles of the per-user rate to report.
+
+    Returns:
+        dict: ``{cohort: {"users", "transitions", "changes", "drift_rate",
+        "mean_user_rate", "p50", "p90", ...}}``. ``drift_rate`` pools all
+        transitions; the others are over users with at least one transition.
+    """
+    np = _numpy()
+    key = _key(field)
+    db = _db(db)
+    # Consolidation only keeps change counts for emotions.
+    with_folded = key == "emotion_trends"
+    if db is not None:
+        array = {"$ifNull": [f"$session_memory.{key}", []]}
+        project = {"_id": 0, "cohort": _cohort_expr(cohort), "r": _changes_expr(array)}
+        if with_folded:
+            project["fc"] = {"$ifNull": ["$session_memory.consolidated.emotion_changes", 0]}
+            project["ft"] = {"$ifNull": ["$session_memory.consolidated.turns", 0]}
+        cohorts, transitions, changes = [], [], []
+        for row in db["chats"].aggregate(_pipeline(_match(since), [{"$project": project}]),
+                                         allowDiskUse=True):
+            cohorts.append(row["cohort"])
+            transitions.append(row["r"]["t"] + max(0, row.get("ft", 0) - 1))
+            changes.append(row["r"]["c"] + row.get("fc", 0))
+        transitions = np.asarray(transitions, dtype=np.int64)
+        changes = np.asarray(changes, dtype=np.int64)
+    else:
+        cohorts, labels, lengths, folded_t, folded_c = [], [], [], [], []
+        for name, memory in _local_rows(_match(since), cohort):
+            values = memory.get(key) or []
+            consolidated = (memory.get("consolidated") or {}) if with_folded else {}
+            cohorts.append(name)
+            labels.extend(values)
+            lengths.append(len(values))
+            folded_t.append(max(0, consolidated.get("turns", 0) - 1))
+            folded_c.append(consolidated.get("emotion_changes", 0))
+        users = np.repeat(np.arange(len(cohorts)), lengths)
+        labels = np.asarray(labels, dtype=object)
+        valid = np.not_equal(labels, None)
+        codes = np.zeros(len(labels), dtype=np.int64)
+        if valid.any():
+            codes[valid] = np.unique(labels[valid].astype(str), return_inverse=True)[1].ravel()
+        pair = (users[1:] == users[:-1]) & valid[1:] & valid[:-1]
+        changed = pair & (codes[1:] != codes[:-1])
+        transitions = np.bincount(users[1:][pair], minlength=len(cohorts)) + np.asarray(folded_t, dtype=np.int64)
+        changes = np.bincount(users[1:][changed], minlength=len(cohorts)) + np.asarray(folded_c, dtype=np.int64)
+
+    names, inverse = np.unique(np.asarray(cohorts, dtype=str), return_inverse=True)
+    inverse = inverse.ravel()
+    report = {}
+    for i, name in enumerate(names):
+        members = inverse == i
+        t, c = transitions[members], changes[members]
+        active = t > 0
+        rates = c[active] / t[active]
+        entry = {
+            "users": int(members.sum()),
+            "transitions": int(t.sum()),
+            "changes": int(c.sum()),
+            "drift_rate": round(float(c.sum() / t.sum()), 4) if t.sum() else 0.0,
+            "mean_user_rate": round(float(rates.mean()), 4) if rates.size else 0.0,
+        }
+        for p in percentiles:
+            entry[f"p{p}"] = round(float(np.percentile(rates, p)), 4) if rates.size else 0.0
+        report[str(name)] = entry
+    return report
+
+
+################################################################################
+# Risk time series
+################################################################################
+
+def risk_timeseries(cohort=None, interval="day", since=None, db=None):
+    """
+    Risk level counts per time bucket and cohort.
+
+    Parameters:
+        cohort (str, optional): Cohort definition (see the module docstring).
+        interval (str): ``hour``, ``day`` or ``month``.
+        since (str, optional): Only turns at or after this ISO time.
+        db: Mongo database; by default the configured one, or the local file.
+
+    Returns:
+        dict: ``{cohort: {"buckets", "levels": {level: [count per bucket]},
+        "total", "elevated_share"}}``; ``elevated_share`` is the share of
+        high and critical turns in each bucket.
+    """
+    from plugins.security.plugin import RISK_LEVELS
+
+    np = _numpy()
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval {interval!r}; expected one of {sorted(INTERVALS)}")
+    width = INTERVALS[interval]
+    start = (since or "")[:width]
+    db = _db(db)
+    if db is not None:
+        pipeline = _pipeline(_match(since), [
+            {"$match": {"session_memory.risk_levels": {"$type": "string"}}},
+            {"$project": {"_id": 0, "cohort": _cohort_expr(cohort), "points": {"$zip": {"inputs": [
+                "$session_memory.risk_levels", {"$ifNull": ["$session_memory.timestamps", []]}]}}}},
+            {"$unwind": "$points"},
+            {"$project": {"cohort": 1, "risk": {"$arrayElemAt": ["$points", 0]},
+                          "bucket": {"$substrBytes": [{"$arrayElemAt": ["$points", 1]}, 0, width]}}},
+            {"$match": {"risk": {"$type": "string"}, "bucket": {"$gte": start}}},
+            {"$group": {"_id": {"cohort": "$cohort", "bucket": "$bucket", "risk": "$risk"},
+                        "count": {"$sum": 1}}},
+        ])
+        cohorts, buckets, risks, weights = [], [], [], []
+        for row in db["chats"].aggregate(pipeline, allowDiskUse=True):
+            cohorts.append(row["_id"]["cohort"])
+            buckets.append(row["_id"]["bucket"])
+            risks.append(row["_id"]["risk"])
+            weights.append(row["count"])
+        weights = np.asarray(weights, dtype=float)
+    else:
+        cohorts, risks, timestamps, lengths = [], [], [], []
+        for name, memory in _local_rows(_match(since), cohort):
+            levels, times = memory.get("risk_levels") or [], memory.get("timestamps") or []
+            n = min(len(levels), len(times))
+            cohorts.append(name)
+            risks.extend(levels[:n])
+            timestamps.extend(times[:n])
+            lengths.append(n)
+        cohorts = np.repeat(np.asarray(cohorts, dtype=str), lengths)
+        risks = np.asarray(risks, dtype=object)
+        # Casting to a shorter string dtype truncates each timestamp to its bucket.
+        buckets = np.asarray(timestamps, dtype=str).astype(f"<U{width}")
+        keep = np.not_equal(risks, None) & (buckets >= start)
+        cohorts, buckets, risks, weights = cohorts[keep], buckets[keep], risks[keep], None
+
+    (cohort_names, bucket_names, risk_names), counts = _tally([cohorts, buckets, risks], weights)
+    levels = [level for level in RISK_LEVELS if level in risk_names]
+    levels += [str(level) for level in risk_names if level not in RISK_LEVELS]
+    order = [int(np.flatnonzero(risk_names == level)[0]) for level in levels]
+    elevated = [i for i, level in zip(order, levels) if level in ELEVATED_RISK]
+    report = {}
+    for i, name in enumerate(cohort_names):
+        grid = counts[i]
+        used = grid.sum(axis=1) > 0
+        grid = grid[used]
+        totals = grid.sum(axis=1)
+        report[str(name)] = {
+            "buckets": [str(b) for b in bucket_names[used]],
+            "levels": {level: grid[:, j].tolist() for level, j in zip(levels, order)},
+            "total": totals.tolist(),
+            "elevated_share": np.round(grid[:, elevated].sum(axis=1) / totals, 4).tolist(),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion, drift and risk analytics over stored checkpoints.")
+    parser.add_argument("report", choices=["distribution", "drift", "risk"])
+    parser.add_argument("--field", default="emotion", choices=sorted(FIELDS))
+    parser.add_argument("--cohort", help='"month" or a dotted checkpoint field (default: everyone)')
+    parser.add_argument("--interval", default="day", choices=sorted(INTERVALS))
+    parser.add_argument("--since", help="ISO date or time")
+    args = parser.parse_args()
+
+    if args.report == "distribution":
+        result = label_distribution(args.field, args.cohort, args.since)
+    elif args.report == "drift":
+        result = drift_rates(args.field, args.cohort, args.since)
+    else:
+        result = risk_timeseries(args.cohort, args.interval, args.since)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# archive.py
+"""
+Tiered checkpoint storage: hot checkpoints and a compressed archive.
+
+Checkpoints of sessions idle for longer than ``TCA_ARCHIVE_IDLE_DAYS`` are
+moved out of the hot store (the ``chats`` collection or the local checkpoint
+file) into compressed archive storage:
+
+- Mongo: one document per user in ``TCA_ARCHIVE_COLLECTION`` (default
+  ``chats_archive``) holding the gzip-compressed JSON checkpoint.
+- Local: one ``<user_id>.json.gz`` file per user in ``TCA_ARCHIVE_DIR``.
+
+``LangGraphMemoryAdapter.load_checkpoint`` falls back to ``restore`` when a
+user has no hot checkpoint, which moves the archived one back and returns it,
+so archived users are served transparently on their next visit. A session that
+is saved again while it is being archived stays hot.
+
+``tier_stats()`` reports the size of each tier and restore latency, and
+``python -m memory.archive`` runs the archival pass (see ``--help``).
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from core import metrics
+
+IDLE_DAYS = float(os.environ.get("TCA_ARCHIVE_IDLE_DAYS", "30"))
+ARCHIVE_COLLECTION = os.environ.get("TCA_ARCHIVE_COLLECTION", "chats_archive")
+ARCHIVE_DIR = os.environ.get("TCA_ARCHIVE_DIR", "memory/archive")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_restores = []  # recent restore latencies, seconds
+_MAX_SAMPLES = 1000
+
+
+def _compress(state):
+    return gzip.compress(json.dumps(state, default=str).encode("utf-8"), compresslevel=6)
+
+
+def _decompress(data):
+    return json.loads(gzip.decompress(bytes(data)).decode("utf-8"))
+
+
+def _archive_path(user_id):
+    return os.path.join(ARCHIVE_DIR, quote(str(user_id), safe="") + ".json.gz")
+
+
+def _cutoff(idle_days):
+    return (datetime.utcnow() - timedelta(days=idle_days)).isoformat()
+
+
+def _record_restore(seconds, backend):
+    metrics.observe("tca_archive_restore_seconds", seconds, backend=backend)
+    with _lock:
+        _restores.append(seconds)
+        del _restores[:-_MAX_SAMPLES]
+
+
+################################################################################
+# Archiving
+################################################################################
+
+def archive_idle(idle_days=IDLE_DAYS, batch_size=500):
+    """
+    Move checkpoints not saved for ``idle_days`` days to the archive.
+
+    Returns:
+        dict: Number of checkpoints archived and bytes before/after compression.
+    """
+    from memory.langraph_adapter import _get_mongo_db
+
+    db = _get_mongo_db()
+    if db is not None:
+        return _archive_mongo(db, _cutoff(idle_days), batch_size)
+    return _archive_local(_cutoff(idle_days))
+
+
+def _archive_mongo(db, cutoff, batch_size):
+    from pymongo import DeleteOne, ReplaceOne
+
+    hot, cold = db["chats"], db[ARCHIVE_COLLECTION]
+    cold.create_index("user_id", unique=True)
+    stats = {"archived": 0, "kept_hot": 0, "raw_bytes": 0, "stored_bytes": 0}
+    # ``chats`` also holds chat histories keyed by session_id; only checkpoints are archived.
+    query = {"user_id": {"$exists": True},
+             "$or": [{"updated_at": {"$lt": cutoff}}, {"updated_at": {"$exists": False}}]}
+    while True:
+        docs = list(hot.find(query, {"_id": 0}).sort("user_id", 1).limit(batch_size))
+        if not docs:
+            break
+        archived_at = datetime.utcnow().isoformat()
+        records = []
+        for doc in docs:
+            data = _compress(doc)
+            records.append({"user_id": doc["user_id"], "data": data, "updated_at": doc.get("updated_at"),
+                            "archived_at": archived_at, "raw_bytes": len(json.dumps(doc, default=str)),
+                            "stored_bytes": len(data)})
+        cold.bulk_write([ReplaceOne({"user_id": r["user_id"]}, r, upsert=True) for r in records],
+                        ordered=False)
+        # Only drop checkpoints that were not saved again since they were read.
+        hot.bulk_write([DeleteOne({"user_id": r["user_id"], "updated_at": r["updated_at"]})
+                        for r in records], ordered=False)
+        ids = [r["user_id"] for r in records]
+        still_hot = {d["user_id"] for d in hot.find({"user_id": {"$in": ids}}, {"user_id": 1})}
+        if still_hot:
+            cold.delete_many({"user_id": {"$in": list(still_hot)}})
+        for r in records:
+            if r["user_id"] in still_hot:
+                stats["kept_hot"] += 1
+            else:
+                stats["archived"] += 1
+                stats["raw_bytes"] += r["raw_bytes"]
+                stats["stored_bytes"] += r["stored_bytes"]
+        if len(docs) < batch_size or len(still_hot) == len(docs):
+            break
+    metrics.increment("tca_archive_moves_total", stats["archived"], direction="archive")
+    return stats
+
+
+def _archive_local(cutoff):
+    import memory.langraph_adapter as adapter
+
+    stats = {"archived": 0, "kept_hot": 0, "raw_bytes": 0, "stored_bytes": 0}
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with adapter._local_lock:
+        all_data = adapter._read_local()
+        idle = [user_id for user_id, state in all_data.items()
+                if (state.get("updated_at") or "") < cutoff]
+        for user_id in idle:
+            data = _compress(all_data[user_id])
+            path = _archive_path(user_id)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            stats["raw_bytes"] += len(json.dumps(all_data.pop(user_id), default=str))
+            stats["stored_bytes"] += len(data)
+            stats["archived"] += 1
+        if idle:
+            adapter._write_local(all_data)
+    metrics.increment("tca_archive_moves_total", stats["archived"], direction="archive")
+    return stats
+
+
+################################################################################
+# Restoring
+################################################################################
+
+def restore(user_id, db=None, hot=None):
+    """
+    Move ``user_id``'s archived checkpoint back to the hot store.
+
+    Parameters:
+        user_id (str): The user.
+        db: Mongo database, or None for the local stores.
+        hot (dict, optional): Fields written to the hot store since archiving
+            (e.g. the profile copy); they take precedence over archived ones.
+
+    Returns:
+        dict or None: The checkpoint, or None if nothing is archived.
+    """
+    start = time.perf_counter()
+    hot = {k: v for k, v in (hot or {}).items() if k != "_id"}
+    if db is not None:
+        record = db[ARCHIVE_COLLECTION].find_one({"user_id": user_id})
+        if record is None:
+            return None
+        state = _decompress(record["data"])
+        state.pop("_id", None)
+        state.update(hot)
+        db["chats"].update_one({"user_id": user_id}, {"$set": state}, upsert=True)
+        db[ARCHIVE_COLLECTION].delete_one({"user_id": user_id})
+        backend = "mongo"
+    else:
+        import memory.langraph_adapter as adapter
+
+        path = _archive_path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            state = _decompress(f.read())
+        state.update(hot)
+        with adapter._local_lock:
+            all_data = adapter._read_local()
+            state.update(all_data.get(user_id) or {})
+            all_data[user_id] = state
+            adapter._write_local(all_data)
+        os.remove(path)
+        backend = "local"
+    _record_restore(time.perf_counter() - start, backend)
+    metrics.increment("tca_archive_moves_total", direction="restore")
+    logger.info("Restored archived checkpoint for user %s", user_id)
+    return state
+
+
+################################################################################
+# Stats
+################################################################################
+
+def _tier_counts(db):
+    totals = list(db[ARCHIVE_COLLECTION].aggregate([
+        {"$group": {"_id": None, "count": {"$sum": 1}, "raw_bytes": {"$sum": "$raw_bytes"},
+                    "stored_bytes": {"$sum": "$stored_bytes"}}},
+    ]))
+    archive = totals[0] if totals else {}
+    return {
+        "hot": {"count": db["chats"].count_documents({"user_id": {"$exists": True}})},
+        "archive": {"count": archive.get("count", 0), "bytes": archive.get("raw_bytes", 0),
+                    "storage_bytes": archive.get("stored_bytes", 0)},
+    }
+
+
+def tier_stats():
+    """
+    Size of the hot and archive tiers, and restore latency in this process.
+
+    Returns:
+        dict: ``hot`` and ``archive`` (count, bytes) and ``restores`` (count,
+        mean and p95 seconds). Without ``collStats`` the hot tier reports its
+        count only.
+    """
+    from memory.langraph_adapter import _get_mongo_db
+    import memory.langraph_adapter as adapter
+
+    db = _get_mongo_db()
+    if db is not None:
+        try:
+            tiers = {}
+            for tier, name in (("hot", "chats"), ("archive", ARCHIVE_COLLECTION)):
+                info = db.command("collstats", name)
+                tiers[tier] = {"count": info.get("count", 0), "bytes": info.get("size", 0),
+                               "storage_bytes": info.get("storageSize", 0),
+                               "index_bytes": info.get("totalIndexSize", 0)}
+        except Exception as e:
+            # e.g. mongomock, or servers without collStats: count checkpoints and
+            # add up the sizes recorded on the archive records.
+            logger.debug("collstats unavailable (%s); counting documents instead", e)
+            tiers = _tier_counts(db)
+    else:
+        hot_bytes = os.path.getsize(adapter.CHECKPOINT_FILE) if os.path.exists(adapter.CHECKPOINT_FILE) else 0
+        files = [os.path.join(ARCHIVE_DIR, n) for n in os.listdir(ARCHIVE_DIR)] if os.path.isdir(ARCHIVE_DIR) else []
+        tiers = {
+            "hot": {"count": len(adapter._read_local()), "bytes": hot_bytes},
+            "archive": {"count": len(files), "bytes": sum(os.path.getsize(p) for p in files)},
+        }
+    with _lock:
+        samples = sorted(_restores)
+    tiers["restores"] = {
+        "count": len(samples),
+        "mean_seconds": sum(samples) / len(samples) if samples else 0.0,
+        "p95_seconds": samples[int(0.95 * (len(samples) - 1))] if samples else 0.0,
+    }
+    return tiers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive idle checkpoints or report tier sizes.")
+    parser.add_argument("--idle-days", type=float, default=IDLE_DAYS)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--stats", action="store_true", help="Only report tier sizes")
+    args = parser.parse_args()
+    if not args.stats:
+        print(json.dumps(archive_idle(args.idle_days, args.batch_size), indent=2))
+    print(json.dumps(tier_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
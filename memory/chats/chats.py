@@ -5,8 +5,17 @@ This module provides helper functions for loading, saving, and clearing chat his
 MongoDB is accessed via the helper defined in memory/mongodb/mongo_helper.py.
 """
 
+import logging
 from datetime import datetime
-from memory.mongodb.mongo_helper import CHATS_COLLECTION
+from memory.mongodb.mongo_helper import get_db
+from memory.mongodb.repository import ChatHistoryRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _repository():
+    """Resolve the chats collection on first use rather than at import time."""
+    return ChatHistoryRepository(get_db())
 
 def load_chat_history(session_id: str) -> dict:
     """
@@ -19,7 +28,7 @@ def load_chat_history(session_id: str) -> dict:
         dict: The saved chat state with keys: 'session_memory', 'turns', 'components'.
               If no document is found, returns an initial empty state.
     """
-    doc = CHATS_COLLECTION.find_one({"session_id": session_id})
+    doc = _repository().load(session_id)
     if doc:
         return doc
     return {"session_memory": {}, "turns": [], "components": {}}
@@ -45,8 +54,8 @@ def save_chat_history(session_id: str, session_memory: dict, turns: list, compon
         "updated_at": datetime.utcnow().isoformat()
     }
     # Upsert the record—update if exists, or insert a new document.
-    CHATS_COLLECTION.update_one({"session_id": session_id}, {"$set": data}, upsert=True)
-    print(f"Chat history saved for session '{session_id}'.")
+    _repository().save(session_id, data)
+    logger.debug("Chat history saved for session '%s'.", session_id)
 
 def clear_chat_history(session_id: str) -> None:
     """
@@ -55,5 +64,5 @@ def clear_chat_history(session_id: str) -> None:
     Parameters:
         session_id (str): Unique identifier for the chat session.
     """
-    CHATS_COLLECTION.delete_one({"session_id": session_id})
-    print(f"Chat history cleared for session '{session_id}'.")
\ No newline at end of file
+    _repository().clear(session_id)
+    logger.debug("Chat history cleared for session '%s'.", session_id)
\ No newline at end of file
@@ -0,0 +1,415 @@
+# consolidation.py
+"""
+Offline consolidation of long-lived user memory.
+
+Checkpoints keep every turn's emotion, intent, topic, personalization entry and
+message, and user documents keep every profile update, so they grow for as
+long as a user stays with us. This job keeps the most recent ``keep_turns``
+entries (``keep_profiles`` profile updates) as they are and folds everything
+older into a compact ``session_memory["consolidated"]`` block:
+
+- label counts for emotions, intents, topics and risk levels,
+- the number of emotion changes and the drift rate,
+- the latest personalization entry,
+- a text summary (built from the statistics, or written by an LLM with
+  ``--summarize``) and optionally its embedding (``--embed``).
+
+Running it again folds the next slice into the existing block. It also drops
+``components["memory_core"]``, a copy of ``session_memory`` that the pipeline
+rewrites on every turn anyway.
+
+Users are read in ``user_id`` order in batches, consolidated on a process
+pool, and written back with one bulk write per batch. A write only applies if
+the checkpoint was not saved again in the meantime. Progress is recorded in a
+JSON file after every batch, so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m memory.consolidation --progress consolidation.json [--workers 8] [--summarize] [--embed]
+"""
+import argparse
+import bisect
+import json
+import logging
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+KEEP_TURNS = int(os.environ.get("TCA_CONSOLIDATE_KEEP_TURNS", "50"))
+KEEP_PROFILES = int(os.environ.get("TCA_CONSOLIDATE_KEEP_PROFILES", "20"))
+
+TREND_KEYS = {"emotion_trends": "emotions", "intents": "intents", "topics": "topics",
+              "tones": "tones", "risk_levels": "risk_levels"}
+SUMMARY_TURNS = 200  # most recent folded turns shown to the summarizer
+
+
+################################################################################
+# Consolidating one user
+################################################################################
+
+def _label(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _split(values, keep):
+    """(older entries to fold, entries to keep)."""
+    if len(values) <= keep:
+        return [], values
+    return values[:len(values) - keep], values[len(values) - keep:]
+
+
+def _describe(consolidated):
+    parts = [f"{consolidated['turns']} earlier turns."]
+    for name in TREND_KEYS.values():
+        top = Counter(consolidated[name]).most_common(3)
+        if top:
+            parts.append(f"Most frequent {name}: " + ", ".join(f"{k} ({v})" for k, v in top) + ".")
+    parts.append(f"Emotion changed {consolidated['emotion_changes']} times "
+                 f"(drift rate {consolidated['drift_rate']:.2f}).")
+    return " ".join(parts)
+
+
+def consolidate_checkpoint(state, keep_turns=KEEP_TURNS, summarizer=None, embedder=None):
+    """
+    Compact one checkpoint.
+
+    Parameters:
+        state (dict): Checkpoint as saved by ``LangGraphMemoryAdapter``.
+        keep_turns (int): Most recent entries kept verbatim.
+        summarizer (callable, optional): ``summarizer(previous_summary, turns)``
+            returns the new summary text.
+        embedder (callable, optional): ``embedder(text)`` returns a vector.
+
+    Returns:
+        dict or None: The compacted checkpoint, or None if nothing changed.
+    """
+    memory = dict(state.get("session_memory") or {})
+    components = dict(state.get("components") or {})
+    folded = {key: _split(memory.get(key) or [], keep_turns) for key in
+              list(TREND_KEYS) + ["personalization", "turns", "timestamps", "sources"]}
+    old_turns, _ = _split(state.get("turns") or [], keep_turns)
+    if not any(old for old, _ in folded.values()) and not old_turns and "memory_core" not in components:
+        return None
+
+    previous = memory.get("consolidated") or {}
+    consolidated = {
+        "turns": previous.get("turns", 0) + max(len(old) for old, _ in folded.values()),
+        "emotion_changes": previous.get("emotion_changes", 0),
+        "first_emotion": previous.get("first_emotion"),
+        "last_emotion": previous.get("last_emotion"),
+        "personalization": previous.get("personalization"),
+        "summary": previous.get("summary"),
+        "embedding": previous.get("embedding"),
+    }
+    for key, name in TREND_KEYS.items():
+        counts = Counter(previous.get(name) or {})
+        counts.update(label for label in map(_label, folded[key][0]) if label is not None)
+        consolidated[name] = dict(counts)
+
+    last = consolidated["last_emotion"]
+    for emotion in map(_label, folded["emotion_trends"][0]):
+        if emotion is None:
+            continue
+        if consolidated["first_emotion"] is None:
+            consolidated["first_emotion"] = emotion
+        if last is not None and emotion != last:
+            consolidated["emotion_changes"] += 1
+        last = emotion
+    consolidated["last_emotion"] = last
+    consolidated["drift_rate"] = consolidated["emotion_changes"] / max(1, consolidated["turns"] - 1)
+
+    for entry in reversed(folded["personalization"][0]):
+        if entry:
+            consolidated["personalization"] = entry
+            break
+
+    if folded["turns"][0] or old_turns:
+        if summarizer is not None:
+            turns = (folded["turns"][0] or old_turns)[-SUMMARY_TURNS:]
+            consolidated["summary"] = summarizer(previous.get("summary"), turns)
+        else:
+            consolidated["summary"] = _describe(consolidated)
+        if embedder is not None:
+            consolidated["embedding"] = embedder(consolidated["summary"])
+    consolidated["consolidated_at"] = datetime.utcnow().isoformat()
+
+    for key, (_, kept) in folded.items():
+        if key in memory:
+            memory[key] = kept
+    memory["consolidated"] = consolidated
+    components.pop("memory_core", None)
+
+    compact = dict(state)
+    compact["session_memory"] = memory
+    compact["components"] = components
+    if "turns" in state:
+        compact["turns"] = state["turns"][len(old_turns):]
+    return compact
+
+
+def consolidate_user(user, keep_profiles=KEEP_PROFILES):
+    """
+    Trim a user document's ``profile_history`` to its last ``keep_profiles``
+    entries, counting the dropped ones in ``profile_history_folded``.
+
+    Returns:
+        dict or None: Fields to set, or None if nothing changed.
+    """
+    history = user.get("profile_history") or []
+    old, kept = _split(history, keep_profiles)
+    if not old:
+        return None
+    return {
+        "profile_history": kept,
+        "profile_history_folded": user.get("profile_history_folded", 0) + len(old),
+    }
+
+
+################################################################################
+# Worker processes
+################################################################################
+
+_summarizer = None
+_embedder = None
+
+
+def _llm_summarizer(previous, turns):
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from core.llm import get_chat_model
+    from core.routing import route
+
+    transcript = "\n".join(f"User: {t.get('user')}\nBot: {t.get('bot') or ''}" for t in turns)
+    prompt = ("Summarize the user's situation, recurring concerns and emotional trajectory in "
+              "at most 120 words, for a therapist reading it before the next session.")
+    if previous:
+        prompt += f"\nEarlier summary:\n{previous}"
+    llm = get_chat_model(model=route("consolidation").model, temperature=0.2, stage="consolidation")
+    result = llm.invoke([SystemMessage(content=prompt), HumanMessage(content=transcript)])
+    return result.content
+
+
+def _init_worker(summarize, embed):
+    global _summarizer, _embedder
+    if summarize:
+        _summarizer = _llm_summarizer
+    if embed:
+        from memory.vectorstore.vectorstore import get_embeddings
+        _embedder = get_embeddings().embed_query
+
+
+def _consolidate_batch(kind, docs, keep):
+    results = []
+    for doc in docs:
+        if kind == "chats":
+            compact = consolidate_checkpoint(doc, keep, _summarizer, _embedder)
+        else:
+            compact = consolidate_user(doc, keep)
+        before = len(json.dumps(doc, default=str))
+        after = len(json.dumps(compact, default=str)) if compact is not None and kind == "chats" else before
+        results.append((doc["user_id"], doc.get("updated_at"), compact, before, after))
+    return results
+
+
+################################################################################
+# Storage
+################################################################################
+
+class MongoStore:
+    """Reads and writes the ``chats`` and ``users`` collections in batches."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def read(self, kind, after, limit):
+        # ``chats`` also holds chat histories keyed by session_id; skip them.
+        query = {"user_id": {"$exists": True}}
+        if after is not None:
+            query["user_id"]["$gt"] = after
+        cursor = self.db[kind].find(query, {"_id": 0}).sort("user_id", 1).limit(limit)
+        return list(cursor)
+
+    def write(self, kind, updates):
+        """Apply ``(user_id, updated_at, fields)`` updates; returns how many applied."""
+        if not updates:
+            return 0
+        from pymongo import UpdateOne
+
+        ops = []
+        for user_id, updated_at, fields in updates:
+            query = {"user_id": user_id}
+            if kind == "chats":
+                # Skip users whose checkpoint was saved again since it was read.
+                query["updated_at"] = updated_at
+                fields = {k: fields[k] for k in ("session_memory", "turns", "components") if k in fields}
+            ops.append(UpdateOne(query, {"$set": fields}))
+        return self.db[kind].bulk_write(ops, ordered=False).modified_count
+
+    def flush(self):
+        pass
+
+
+class LocalStore:
+    """The local JSON stores, read once and written back on ``flush``."""
+
+    FILES = {"chats": "CHECKPOINT_FILE", "users": "MEMORY_PATH"}
+
+    def __init__(self):
+        import memory.langraph_adapter as langraph_adapter
+        import memory.memory_store as memory_store
+
+        self.modules = {"chats": langraph_adapter, "users": memory_store}
+        self.data = {kind: module._read_local() for kind, module in self.modules.items()}
+        self.ids = {kind: sorted(data) for kind, data in self.data.items()}
+        self.dirty = set()
+
+    def read(self, kind, after, limit):
+        ids = self.ids[kind]
+        start = 0
+        if after is not None:
+            start = bisect.bisect_right(ids, after)
+        return [dict(self.data[kind][user_id], user_id=user_id) for user_id in ids[start:start + limit]]
+
+    def write(self, kind, updates):
+        for user_id, _, fields in updates:
+            fields = {k: v for k, v in fields.items() if k != "user_id"}
+            if kind == "chats":
+                self.data[kind][user_id] = fields
+            else:
+                self.data[kind][user_id].update(fields)
+            self.dirty.add(kind)
+        return len(updates)
+
+    def flush(self):
+        for kind in self.dirty:
+            self.modules[kind]._write_local(self.data[kind])
+        self.dirty.clear()
+
+
+################################################################################
+# Job
+################################################################################
+
+class Consolidator:
+    """
+    Parameters:
+        store: ``MongoStore`` or ``LocalStore``.
+        progress_path (str, optional): Resume file.
+        workers (int): Worker processes.
+        batch_size (int): Users per read, worker task and bulk write.
+        keep_turns (int): Recent checkpoint entries kept verbatim.
+        keep_profiles (int): Recent profile updates kept.
+        summarize (bool): Write summaries with an LLM.
+        embed (bool): Embed the summaries.
+    """
+
+    def __init__(self, store, progress_path=None, workers=4, batch_size=200, keep_turns=KEEP_TURNS,
+                 keep_profiles=KEEP_PROFILES, summarize=False, embed=False):
+        self.store = store
+        self.progress_path = progress_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.keep = {"chats": keep_turns, "users": keep_profiles}
+        self.summarize = summarize
+        self.embed = embed
+        self.progress = {"chats": {"after": None, "done": False},
+                         "users": {"after": None, "done": False},
+                         "stats": {"scanned": 0, "compacted": 0, "skipped_changed": 0,
+                                   "bytes_before": 0, "bytes_after": 0}}
+        if progress_path and os.path.exists(progress_path):
+            with open(progress_path, "r") as f:
+                self.progress = json.load(f)
+
+    def _save_progress(self):
+        if not self.progress_path:
+            return
+        tmp = self.progress_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.progress, f, indent=2)
+        os.replace(tmp, self.progress_path)
+
+    def _apply(self, kind, results):
+        stats = self.progress["stats"]
+        updates = [(user_id, updated_at, compact)
+                   for user_id, updated_at, compact, _, _ in results if compact is not None]
+        applied = self.store.write(kind, updates)
+        self.store.flush()
+        stats["scanned"] += len(results)
+        stats["compacted"] += applied
+        stats["skipped_changed"] += len(updates) - applied
+        if kind == "chats":
+            stats["bytes_before"] += sum(r[3] for r in results if r[2] is not None)
+            stats["bytes_after"] += sum(r[4] for r in results if r[2] is not None)
+        self.progress[kind]["after"] = results[-1][0]
+        self._save_progress()
+
+    def _phase(self, executor, kind):
+        state = self.progress[kind]
+        if state["done"]:
+            return
+        after = state["after"]
+        inflight = deque()
+        while True:
+            # Keep a few batches ahead of the writer; results are applied in
+            # order so the resume point never skips an unfinished batch.
+            while len(inflight) < self.workers * 2:
+                docs = self.store.read(kind, after, self.batch_size)
+                if not docs:
+                    break
+                after = docs[-1]["user_id"]
+                inflight.append(executor.submit(_consolidate_batch, kind, docs, self.keep[kind]))
+            if not inflight:
+                break
+            results = inflight.popleft().result()
+            if results:
+                self._apply(kind, results)
+            logger.info("[%s] consolidated up to %s (%d scanned)", kind, self.progress[kind]["after"],
+                        self.progress["stats"]["scanned"])
+        state["done"] = True
+        self._save_progress()
+
+    def run(self):
+        """Consolidate checkpoints, then user profiles; returns the run statistics."""
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.summarize, self.embed)) as executor:
+            for kind in ("chats", "users"):
+                self._phase(executor, kind)
+        stats = dict(self.progress["stats"])
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        if stats["bytes_before"]:
+            stats["size_ratio"] = round(stats["bytes_after"] / stats["bytes_before"], 3)
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old user memory into summaries and statistics.")
+    parser.add_argument("--progress", help="Resume file (created if missing)")
+    parser.add_argument("--reset", action="store_true", help="Start over, ignoring the resume file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--keep-turns", type=int, default=KEEP_TURNS)
+    parser.add_argument("--keep-profiles", type=int, default=KEEP_PROFILES)
+    parser.add_argument("--summarize", action="store_true", help="Write summaries with an LLM")
+    parser.add_argument("--embed", action="store_true", help="Store an embedding of each summary")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from memory.langraph_adapter import _get_mongo_db
+
+    if args.reset and args.progress and os.path.exists(args.progress):
+        os.remove(args.progress)
+    db = _get_mongo_db()
+    store = MongoStore(db) if db is not None else LocalStore()
+    consolidator = Consolidator(store, args.progress, workers=args.workers, batch_size=args.batch_size,
+                                keep_turns=args.keep_turns, keep_profiles=args.keep_profiles,
+                                summarize=args.summarize, embed=args.embed)
+    print(json.dumps(consolidator.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 # memory_store.py
 import json
+import logging
 import os
+import threading
 from dotenv import load_dotenv
-from pymongo import MongoClient
 from datetime import datetime
 from typing import Dict, Any, Optional, List
+from memory.mongodb.repository import UserRepository
 
 # Load environment variables
 load_dotenv()
@@ -15,22 +17,43 @@ USE_MONGO = os.environ.get("USE_MONGO", "false").lower() == "true"
 MONGO_URI = os.environ.get("MONGO_URI", "")
 DEFAULT_USER_ID = os.environ.get("USER_ID", "default-user")
 
-# Initialize MongoDB connection if enabled
-mongo_client = None
+logger = logging.getLogger(__name__)
+
+# The MongoDB handle and the local file are both set up on first use, so that
+# importing this module neither opens a connection nor touches the disk.
 mongo_db = None
-if USE_MONGO and MONGO_URI:
-    try:
-        mongo_client = MongoClient(MONGO_URI)
-        mongo_db = mongo_client["gptr_db"]
-        print("MongoDB connection established")
-    except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        USE_MONGO = False
-
-# Initialize local file storage if it doesn't exist
-if not os.path.exists(MEMORY_PATH):
-    with open(MEMORY_PATH, "w") as f:
-        json.dump({}, f)
+
+# Serializes read-modify-write cycles on the local JSON file across threads.
+_local_lock = threading.RLock()
+
+def _get_mongo_db():
+    """Return the MongoDB database if Mongo persistence is enabled, connecting lazily."""
+    global USE_MONGO, mongo_db
+    if not (USE_MONGO and MONGO_URI):
+        return None
+    if mongo_db is None:
+        try:
+            from memory.mongodb.mongo_helper import get_db
+            mongo_db = get_db()
+            logger.info("MongoDB connection established")
+        except Exception as e:
+            logger.warning("Failed to connect to MongoDB: %s", e)
+            USE_MONGO = False
+    return mongo_db
+
+def _read_local() -> Dict[str, Any]:
+    """Read the whole local memory file, creating it if it doesn't exist."""
+    with _local_lock:
+        if not os.path.exists(MEMORY_PATH):
+            _write_local({})
+        with open(MEMORY_PATH, "r") as f:
+            return json.load(f)
+
+def _write_local(all_data: Dict[str, Any]) -> None:
+    """Write the whole local memory file."""
+    with _local_lock:
+        with open(MEMORY_PATH, "w") as f:
+            json.dump(all_data, f, indent=2)
 
 def get_user_id() -> str:
     """Get the user ID from environment variable or use default"""
@@ -44,24 +67,15 @@ def get_or_create_user(user_id: Optional[str] = None) -> Dict[str, Any]:
         user_id (str, optional): User ID to get/create. If None, uses the one from environment.
     
     Returns:
-        dict: User document
+        dict: User document (without ``_id`` and ``profile_history``)
     """
     if user_id is None:
         user_id = get_user_id()
         
-    if USE_MONGO and mongo_db is not None:
-        user = mongo_db["users"].find_one({"user_id": user_id})
-        if not user:
-            # Create new user document
-            user = {
-                "user_id": user_id,
-                "created_at": datetime.utcnow(),
-                "last_active": datetime.utcnow(),
-                "profile": {}
-            }
-            mongo_db["users"].insert_one(user)
-            print(f"Created new user document for {user_id}")
-        return user
+    db = _get_mongo_db()
+    if db is not None:
+        # One atomic upsert instead of a find followed by an insert.
+        return UserRepository(db).get_or_create(user_id)
     else:
         return {"user_id": user_id, "profile": {}}
 
@@ -75,11 +89,9 @@ def update_user_activity(user_id: Optional[str] = None) -> None:
     if user_id is None:
         user_id = get_user_id()
         
-    if USE_MONGO and mongo_db is not None:
-        mongo_db["users"].update_one(
-            {"user_id": user_id},
-            {"$set": {"last_active": datetime.utcnow()}}
-        )
+    db = _get_mongo_db()
+    if db is not None:
+        UserRepository(db).touch(user_id)
 
 def load_user_memory(user_id: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -94,9 +106,10 @@ def load_user_memory(user_id: Optional[str] = None) -> Dict[str, Any]:
     if user_id is None:
         user_id = get_user_id()
         
-    if USE_MONGO and mongo_db is not None:
-        # Get or create user document
-        user = get_or_create_user(user_id)
+    db = _get_mongo_db()
+    if db is not None:
+        # Get or create the user and update last_active in one round trip.
+        user = UserRepository(db).get_or_create(user_id, fields=("profile",), touch=True)
                 
         # Combine into a single memory object
         memory_data = {
@@ -104,15 +117,10 @@ def load_user_memory(user_id: Optional[str] = None) -> Dict[str, Any]:
             "last_updated": datetime.utcnow().isoformat()
         }
         
-        # Update last active timestamp
-        update_user_activity(user_id)
-        
         return memory_data
     else:
         # Load from local file
-        with open(MEMORY_PATH, "r") as f:
-            all_data = json.load(f)
-        return all_data.get(user_id, {})
+        return _read_local().get(user_id, {})
 
 def save_user_memory(user_id: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> None:
     """
@@ -128,27 +136,17 @@ def save_user_memory(user_id: Optional[str] = None, data: Optional[Dict[str, Any
     if data is None:
         data = {}
     
-    if USE_MONGO and mongo_db is not None:
-        # Update user document
-        user_update = {
-            "profile": data.get("profile", {}),
-            "last_active": datetime.utcnow()
-        }
-        mongo_db["users"].update_one(
-            {"user_id": user_id},
-            {"$set": user_update},
-            upsert=True
-        )
-        
-        print(f"User memory saved to MongoDB for user {user_id}")
+    db = _get_mongo_db()
+    if db is not None:
+        UserRepository(db).save_profile(user_id, data.get("profile", {}))
+        logger.debug("User memory saved to MongoDB for user %s", user_id)
     else:
         # Save to local file
-        with open(MEMORY_PATH, "r") as f:
-            all_data = json.load(f)
-        all_data[user_id] = data
-        with open(MEMORY_PATH, "w") as f:
-            json.dump(all_data, f, indent=2)
-        print(f"User memory saved to local file for user {user_id}")
+        with _local_lock:
+            all_data = _read_local()
+            all_data[user_id] = data
+            _write_local(all_data)
+        logger.debug("User memory saved to local file for user %s", user_id)
 
 def get_user_profile(user_id: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -163,9 +161,9 @@ def get_user_profile(user_id: Optional[str] = None) -> Dict[str, Any]:
     if user_id is None:
         user_id = get_user_id()
         
-    if USE_MONGO and mongo_db is not None:
-        user = get_or_create_user(user_id)
-        return user.get("profile", {})
+    db = _get_mongo_db()
+    if db is not None:
+        return UserRepository(db).profile(user_id)
     else:
         memory_data = load_user_memory(user_id)
         return memory_data.get("profile", {})
@@ -184,52 +182,44 @@ def update_user_profile(user_id: Optional[str] = None, profile_data: Optional[Di
     if profile_data is None:
         profile_data = {}
         
-    if USE_MONGO and mongo_db is not None:
+    db = _get_mongo_db()
+    if db is not None:
         try:
-            # Get existing user document or create new one
-            user = get_or_create_user(user_id)
-            
-            # Get the current profile array or create new one if it doesn't exist
-            user_profile_history = user.get("profile_history", [])
-            
-            # Create a new profile entry with timestamp
-            profile_entry = {
-                "timestamp": datetime.utcnow(),
-                "data": profile_data
-            }
-            
-            # Append the new profile entry to history
-            mongo_db["users"].update_one(
-                {"user_id": user_id},
-                {
-                    "$push": {
-                        "profile_history": profile_entry
-                    },
-                    "$set": {
-                        "last_active": datetime.utcnow()
-                    }
-                },
-                upsert=True
-            )
-            
-            # Also update the profile in the chats collection for consistency
-            mongo_db["chats"].update_one(
-                {"user_id": user_id},
-                {
-                    "$set": {
-                        "user_profile": profile_entry,
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                },
-                upsert=True
-            )
-            
-            print(f"Updated profile for user {user_id} in all collections")
+            # Appends to the history (creating the user if needed) and copies
+            # the entry onto the checkpoint: two writes, no reads.
+            UserRepository(db).record_profile(user_id, profile_data)
+            logger.debug("Updated profile for user %s in all collections", user_id)
         except Exception as e:
-            print(f"Error updating profile in MongoDB: {e}")
+            logger.warning("Error updating profile in MongoDB: %s", e)
             raise
     else:
         # Save to local file
         memory_data = load_user_memory(user_id)
         memory_data["profile"] = profile_data
         save_user_memory(user_id, memory_data)
+
+def update_user_profiles(updates: Dict[str, List[Dict[str, Any]]]) -> None:
+    """
+    Record profile updates for many users at once.
+
+    Equivalent to calling ``update_user_profile`` for every entry, but with one
+    bulk write per collection (or one local file write).
+
+    Parameters:
+        updates (dict): Lists of profile data, oldest first, keyed by user ID.
+    """
+    updates = {user_id: entries for user_id, entries in updates.items() if entries}
+    if not updates:
+        return
+
+    db = _get_mongo_db()
+    if db is not None:
+        UserRepository(db).record_profiles(updates)
+        logger.debug("Updated profiles for %d users in all collections", len(updates))
+    else:
+        with _local_lock:
+            all_data = _read_local()
+            for user_id, entries in updates.items():
+                all_data.setdefault(user_id, {})["profile"] = entries[-1]
+            _write_local(all_data)
+        logger.debug("Updated profiles for %d users in local file", len(updates))
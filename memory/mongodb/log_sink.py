@@ -0,0 +1,194 @@
+# memory/mongodb/log_sink.py
+"""
+Buffered, non-blocking writes of log/trace events to a MongoDB collection.
+
+Producers hand events to ``BufferedMongoSink.emit`` (or ``await
+sink.asend(...)`` from a coroutine), which only enqueues them. A background
+thread writes them with ``insert_many`` whenever ``batch_size`` events are
+waiting or ``flush_interval`` seconds have passed. The queue is bounded: on
+overflow the sink either drops the event and counts it (``overflow="drop"``,
+the default) or makes the producer wait up to ``block_timeout`` seconds for
+room (``overflow="block"``). ``close()`` flushes what is queued; it is also
+registered to run at interpreter exit.
+
+``MongoLogHandler`` adapts a sink to the ``logging`` module so pipeline log
+records can be stored the same way.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from core import metrics
+
+# Not under "core", so MongoLogHandler never feeds the sink's own failures back into it.
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE = int(os.environ.get("TCA_LOG_SINK_QUEUE", "10000"))
+BATCH_SIZE = int(os.environ.get("TCA_LOG_SINK_BATCH", "500"))
+FLUSH_INTERVAL = float(os.environ.get("TCA_LOG_SINK_INTERVAL", "1.0"))
+OVERFLOW = os.environ.get("TCA_LOG_SINK_OVERFLOW", "drop")
+
+_STOP = object()
+
+
+class BufferedMongoSink:
+    """
+    Parameters:
+        collection: pymongo collection (anything with ``insert_many``).
+        name (str): Label for stats and metrics.
+        max_queue (int): Maximum number of buffered events.
+        batch_size (int): Events per ``insert_many``.
+        flush_interval (float): Maximum seconds an event waits before a flush.
+        overflow (str): "drop" or "block" when the queue is full.
+        block_timeout (float): Seconds a producer may wait in "block" mode
+            before the event is dropped after all.
+    """
+
+    def __init__(self, collection, name="logs", max_queue=MAX_QUEUE, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, overflow=OVERFLOW, block_timeout=1.0):
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.collection = collection
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"tca-sink-{name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def emit(self, event) -> bool:
+        """
+        Queue one event (a dict); never performs I/O.
+
+        Returns:
+            bool: False if the event was dropped.
+        """
+        if self._closed:
+            self._count("dropped")
+            metrics.increment("tca_log_sink_events_total", sink=self.name, result="dropped")
+            return False
+        doc = dict(event)
+        doc.setdefault("created_at", datetime.utcnow().isoformat())
+        try:
+            if self.overflow == "block":
+                self._queue.put(doc, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(doc)
+        except queue.Full:
+            self._count("dropped")
+            metrics.increment("tca_log_sink_events_total", sink=self.name, result="dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    async def asend(self, event) -> bool:
+        """Coroutine form of ``emit``; in "block" mode waits off the event loop."""
+        if self.overflow == "block" and self._queue.full():
+            return await asyncio.get_running_loop().run_in_executor(None, self.emit, event)
+        return self.emit(event)
+
+    def _write(self, batch):
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            self._count("failed", len(batch))
+            metrics.increment("tca_log_sink_events_total", len(batch), sink=self.name, result="failed")
+            logger.warning("Log sink '%s' failed to write %d events: %s", self.name, len(batch), e)
+            return
+        self._count("written", len(batch))
+        self._count("batches")
+        metrics.increment("tca_log_sink_events_total", len(batch), sink=self.name, result="written")
+        metrics.observe("tca_log_sink_batch_size", len(batch), sink=self.name)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get()
+            except Exception:
+                return
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+                flush_at = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = flush_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+            if stopping:
+                # Drain whatever is still queued.
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            for i in range(0, len(batch), self.batch_size):
+                self._write(batch[i:i + self.batch_size])
+
+    def close(self, timeout=10.0) -> None:
+        """Stop accepting events, flush the queue and wait for the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        try:
+            atexit.unregister(self.close)
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+class MongoLogHandler(logging.Handler):
+    """``logging`` handler that forwards records to a ``BufferedMongoSink``."""
+
+    def __init__(self, sink, level=logging.NOTSET):
+        super().__init__(level)
+        self.sink = sink
+
+    def emit(self, record):
+        try:
+            self.sink.emit({
+                "logger": record.name,
+                "level": record.levelname,
+                "message": record.getMessage(),
+                "created_at": datetime.utcfromtimestamp(record.created).isoformat(),
+            })
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.sink.close()
+        super().close()
@@ -3,19 +3,78 @@ from dotenv import load_dotenv
 load_dotenv()  # load environment variables from .env, if available
 
 import os
-from pymongo import MongoClient
+import threading
 
 # Get the MongoDB URI from the environment.
 MONGO_URI = os.environ.get("MONGO_URI")
-if not MONGO_URI:
-    raise ValueError("MONGO_URI environment variable must be set")
-
-# Create a global MongoClient and initialize the database.
-client = MongoClient(MONGO_URI)
-db = client["gptr_db"]
-
-# Collections for different types of data.
-VECTOR_COLLECTION = db["vector_store"]
-REPORTS_COLLECTION = db["reports"]
-LOGS_COLLECTION = db["logs"]
-CHATS_COLLECTION = db["chats"]
\ No newline at end of file
+DB_NAME = "gptr_db"
+
+# Collections for different types of data, resolved lazily on first access.
+_COLLECTIONS = {
+    "VECTOR_COLLECTION": "vector_store",
+    "REPORTS_COLLECTION": "reports",
+    "LOGS_COLLECTION": "logs",
+    "CHATS_COLLECTION": "chats",
+}
+
+_client = None
+_client_lock = threading.Lock()
+_listening_client = None  # the client created with the command-counting listener
+
+
+def get_client():
+    """
+    Return the shared MongoClient, creating it on first use.
+
+    pymongo is only imported here so that importing this module stays cheap
+    and never touches the network.
+    """
+    global _client, _listening_client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not MONGO_URI:
+                    raise ValueError("MONGO_URI environment variable must be set")
+                from pymongo import MongoClient
+                from core.metrics import mongo_listeners
+                _client = _listening_client = MongoClient(MONGO_URI, event_listeners=mongo_listeners())
+    return _client
+
+
+def set_client(client) -> None:
+    """
+    Replace the shared client, e.g. with a mongomock client for offline runs.
+
+    Parameters:
+        client: Any object exposing pymongo's ``client[db_name][collection]`` API.
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def counts_commands(client) -> bool:
+    """True if ``client`` reports its commands to ``core.metrics`` itself."""
+    return client is not None and client is _listening_client
+
+
+def get_db():
+    """Return the shared ``gptr_db`` database handle."""
+    return get_client()[DB_NAME]
+
+
+def get_collection(name: str):
+    """Return a collection of the shared database by name."""
+    return get_db()[name]
+
+
+def __getattr__(name):
+    # Keep ``client``, ``db`` and the ``*_COLLECTION`` constants importable
+    # without connecting at import time.
+    if name == "client":
+        return get_client()
+    if name == "db":
+        return get_db()
+    if name in _COLLECTIONS:
+        return get_collection(_COLLECTIONS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,186 @@
+# memory/mongodb/report_cache.py
+"""
+Cache of research reports in the ``reports`` collection.
+
+Reports are keyed by the normalized query, the report type and the source
+configuration (``cache_key``). A cached report younger than ``ttl`` seconds is
+served as is. An older one, up to ``ttl + max_stale``, is served immediately
+while a background task runs the research again and replaces it
+(stale-while-revalidate). Anything older, or a missing report, is produced in
+the foreground. Concurrent requests for the same key share one research run.
+
+Lookups are counted in ``tca_report_cache_total`` (fresh/stale/miss) and
+background refreshes in ``tca_report_cache_refresh_total``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+
+from core import metrics
+from memory.mongodb.schema import Report
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = float(os.environ.get("TCA_REPORT_CACHE_TTL", "86400"))
+MAX_STALE_SECONDS = float(os.environ.get("TCA_REPORT_CACHE_MAX_STALE", "604800"))
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return _SPACES.sub(" ", query).strip().rstrip("?!.").strip()
+
+
+def cache_key(query, report_type, source=None) -> str:
+    """
+    Stable key for a report request.
+
+    Parameters:
+        query (str): The research query.
+        report_type (str): e.g. "research_report".
+        source (dict, optional): Source configuration (report_source, vector
+            store, ...); any JSON-serializable value.
+    """
+    payload = json.dumps(
+        {"query": normalize_query(query), "report_type": report_type, "source": source},
+        sort_keys=True, default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ReportCache:
+    """
+    Parameters:
+        collection: pymongo collection holding the reports.
+        ttl (float): Seconds a report is served without refreshing.
+        max_stale (float): Further seconds a report may be served while a
+            refresh runs in the background.
+    """
+
+    def __init__(self, collection, ttl=TTL_SECONDS, max_stale=MAX_STALE_SECONDS):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._inflight = {}
+        self._refreshes = set()
+        self._indexed = False
+
+    async def _run(self, fn, *args, **kwargs):
+        # pymongo is blocking; keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+    async def _ensure_index(self):
+        if self._indexed:
+            return
+        self._indexed = True
+        try:
+            await self._run(self.collection.create_index, "cache_key")
+        except Exception as e:
+            logger.warning("Could not create the report cache index: %s", e)
+
+    async def lookup(self, key):
+        """Return the cached report document for ``key``, or None."""
+        await self._ensure_index()
+        return await self._run(self.collection.find_one, {"cache_key": key})
+
+    async def store(self, key, query, report_type, source, content):
+        """Insert or replace the report for ``key``."""
+        now = datetime.utcnow()
+        report = Report(
+            report_id=str(now.timestamp()),
+            content=content,
+            created_at=now.isoformat(),
+            cache_key=key,
+            query=query,
+            report_type=report_type,
+            source=source,
+            refreshed_at=time.time(),
+        ).dict()
+        await self._run(
+            self.collection.update_one,
+            {"cache_key": key},
+            {"$set": {k: v for k, v in report.items() if k not in ("report_id", "created_at")},
+             "$setOnInsert": {"report_id": report["report_id"], "created_at": report["created_at"]}},
+            upsert=True,
+        )
+
+    async def _produce(self, key, query, report_type, source, produce):
+        # One research run per key; later callers await the same future.
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            content = await produce()
+            await self.store(key, query, report_type, source, content)
+            future.set_result(content)
+            return content
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged twice.
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _refresh(self, key, query, report_type, source, produce):
+        try:
+            await self._produce(key, query, report_type, source, produce)
+            metrics.increment("tca_report_cache_refresh_total", result="ok")
+        except Exception as e:
+            metrics.increment("tca_report_cache_refresh_total", result="error")
+            logger.warning("Background report refresh failed (%s: %s); keeping the cached report",
+                           type(e).__name__, e)
+
+    async def get_or_create(self, query, report_type, source, produce):
+        """
+        Return a report for the request, using the cache where possible.
+
+        Parameters:
+            query (str): The research query.
+            report_type (str): The report type.
+            source (dict): Source configuration, part of the cache key.
+            produce (callable): Coroutine function with no arguments that runs
+                the research and returns the report text.
+
+        Returns:
+            tuple: (report text, "fresh" | "stale" | "miss").
+        """
+        key = cache_key(query, report_type, source)
+        doc = await self.lookup(key)
+        age = time.time() - doc["refreshed_at"] if doc and doc.get("refreshed_at") else None
+
+        if age is not None and age < self.ttl:
+            status = "fresh"
+            content = doc["content"]
+        elif age is not None and age < self.ttl + self.max_stale:
+            status = "stale"
+            content = doc["content"]
+            if key not in self._inflight:
+                task = asyncio.ensure_future(self._refresh(key, query, report_type, source, produce))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+        else:
+            status = "miss"
+            content = await self._produce(key, query, report_type, source, produce)
+
+        metrics.increment("tca_report_cache_total", result=status)
+        return content, status
+
+    async def wait_refreshes(self):
+        """Wait for background refreshes, e.g. before a short-lived script exits."""
+        while self._refreshes:
+            await asyncio.gather(*list(self._refreshes), return_exceptions=True)
@@ -0,0 +1,234 @@
+# memory/mongodb/repository.py
+"""
+Data access for the collections the pipeline reads and writes on every turn.
+
+- ``INDEXES`` declares the indexes the queries below rely on, and
+  ``ensure_indexes(db)`` creates them once per process; repositories call it
+  when they are created.
+- Every read asks only for the fields its caller uses. In particular, the
+  unbounded ``profile_history`` array is never read whole.
+- Read-then-write sequences are single atomic operations. For example,
+  ``get_or_create`` is one ``find_one_and_update`` with ``upsert`` and
+  ``$setOnInsert``, so concurrent first visits cannot create two users.
+
+Round trips per turn go to ``tca_mongo_ops_per_turn``. Clients created by
+``mongo_helper.get_client`` count them with a command listener. For other
+clients (e.g. mongomock installed with ``set_client``) the repositories count
+their own calls.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Profile history entries included in the personalization context.
+CONTEXT_HISTORY = int(os.environ.get("TCA_PROFILE_CONTEXT_HISTORY", "5"))
+
+# Unique indexes are sparse: ``chats`` holds checkpoints keyed by user_id
+# (langraph_adapter) and chat histories keyed by session_id (chats.py).
+INDEXES = {
+    "users": [
+        {"keys": [("user_id", 1)], "unique": True},
+    ],
+    "chats": [
+        {"keys": [("user_id", 1)], "unique": True, "sparse": True},
+        {"keys": [("session_id", 1)], "unique": True, "sparse": True},
+        {"keys": [("updated_at", 1)]},  # archive and analytics time filters
+    ],
+}
+
+_ensured = set()
+_ensure_lock = threading.Lock()
+
+
+def ensure_indexes(db):
+    """
+    Create the indexes in ``INDEXES`` unless already done for ``db``.
+
+    An index that cannot be built (e.g. a unique index over existing
+    duplicates) is logged and skipped; queries still work, only slower.
+    """
+    # ``client[name]`` returns a new Database object each time, so key on the
+    # (long-lived) client and the database name rather than the handle.
+    key = (id(db.client), db.name)
+    with _ensure_lock:
+        if key in _ensured:
+            return
+        _ensured.add(key)
+    for collection, indexes in INDEXES.items():
+        for spec in indexes:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                db[collection].create_index(spec["keys"], **options)
+            except Exception as e:
+                logger.warning("Could not create index %s on %s: %s", spec["keys"], collection, e)
+
+
+def _count(db, command):
+    """Count a round trip when the client has no command listener to do it."""
+    from memory.mongodb import mongo_helper
+
+    if not mongo_helper.counts_commands(db.client):
+        metrics.record_mongo_op(command)
+
+
+def _projection(fields):
+    projection = {"_id": 0}
+    projection.update({field: 1 for field in fields})
+    return projection
+
+
+class UserRepository:
+    """The ``users`` collection, plus the profile copy kept on checkpoints."""
+
+    def __init__(self, db):
+        ensure_indexes(db)
+        self.db = db
+        self.users = db["users"]
+        self.chats = db["chats"]
+
+    def get_or_create(self, user_id, fields=("user_id", "profile", "created_at", "last_active"),
+                      touch=False):
+        """
+        Return the user's document, creating it if needed, in one round trip.
+
+        Parameters:
+            user_id (str): The user.
+            fields (tuple): Fields to return.
+            touch (bool): Also set ``last_active`` to now.
+        """
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.utcnow()
+        update = {"$setOnInsert": {"created_at": now, "profile": {}}}
+        if touch:
+            update["$set"] = {"last_active": now}
+        else:
+            update["$setOnInsert"]["last_active"] = now
+        for attempt in range(2):
+            _count(self.db, "findAndModify")
+            try:
+                return self.users.find_one_and_update(
+                    {"user_id": user_id}, update, projection=_projection(fields),
+                    upsert=True, return_document=ReturnDocument.AFTER)
+            except DuplicateKeyError:
+                # Lost an insert race; the other writer's document now exists.
+                if attempt:
+                    raise
+
+    def profile(self, user_id):
+        """The user's profile, creating the user if needed."""
+        return self.get_or_create(user_id, fields=("profile",)).get("profile", {})
+
+    def personalization_context(self, user_id, history=CONTEXT_HISTORY):
+        """The user's document with only the latest ``history`` profile entries."""
+        _count(self.db, "find")
+        return self.users.find_one({"user_id": user_id},
+                                   {"_id": 0, "profile_history": {"$slice": -history}})
+
+    def save_profile(self, user_id, profile):
+        """Replace the profile and mark the user active."""
+        _count(self.db, "update")
+        self.users.update_one({"user_id": user_id},
+                              {"$set": {"profile": profile, "last_active": datetime.utcnow()},
+                               "$setOnInsert": {"created_at": datetime.utcnow()}},
+                              upsert=True)
+
+    def touch(self, user_id):
+        _count(self.db, "update")
+        self.users.update_one({"user_id": user_id}, {"$set": {"last_active": datetime.utcnow()}})
+
+    def record_profile(self, user_id, data):
+        """Append a profile update to the history and copy it onto the checkpoint."""
+        self.record_profiles({user_id: [data]})
+
+    def record_profiles(self, updates):
+        """
+        Append profile updates for many users: one write per collection.
+
+        Parameters:
+            updates (dict): Lists of profile data, oldest first, keyed by user ID.
+        """
+        now = datetime.utcnow()
+        user_ops, chat_ops = [], []
+        for user_id, entries in updates.items():
+            history = [{"timestamp": now, "data": data} for data in entries]
+            user_ops.append(({"user_id": user_id},
+                             {"$push": {"profile_history": {"$each": history}},
+                              "$set": {"last_active": now},
+                              "$setOnInsert": {"created_at": now, "profile": {}}}))
+            chat_ops.append(({"user_id": user_id},
+                             {"$set": {"user_profile": history[-1], "updated_at": now.isoformat()}}))
+        for collection, ops in ((self.users, user_ops), (self.chats, chat_ops)):
+            _count(self.db, "update")
+            if len(ops) == 1:
+                collection.update_one(*ops[0], upsert=True)
+            else:
+                from pymongo import UpdateOne
+                collection.bulk_write([UpdateOne(f, u, upsert=True) for f, u in ops], ordered=False)
+
+
+class CheckpointRepository:
+    """Pipeline checkpoints in ``chats``, keyed by ``user_id``."""
+
+    def __init__(self, db):
+        ensure_indexes(db)
+        self.db = db
+        self.chats = db["chats"]
+
+    def load(self, user_id, fields=None):
+        """
+        The user's checkpoint, or None.
+
+        Parameters:
+            fields (tuple, optional): Top-level fields to return; all by default.
+        """
+        _count(self.db, "find")
+        return self.chats.find_one({"user_id": user_id},
+                                   _projection(fields) if fields else {"_id": 0})
+
+    def load_many(self, user_ids, fields=None):
+        """Checkpoints keyed by user ID, for the users that have one."""
+        _count(self.db, "find")
+        projection = _projection(("user_id",) + tuple(fields)) if fields else {"_id": 0}
+        return {doc["user_id"]: doc for doc in
+                self.chats.find({"user_id": {"$in": list(user_ids)}}, projection)}
+
+    def save(self, user_id, state):
+        _count(self.db, "update")
+        self.chats.update_one({"user_id": user_id}, {"$set": state}, upsert=True)
+
+    def save_many(self, states):
+        from pymongo import UpdateOne
+
+        _count(self.db, "update")
+        self.chats.bulk_write([UpdateOne({"user_id": user_id}, {"$set": state}, upsert=True)
+                               for user_id, state in states.items()], ordered=False)
+
+
+class ChatHistoryRepository:
+    """Chat histories in ``chats``, keyed by ``session_id`` (``memory/chats``)."""
+
+    FIELDS = ("session_memory", "turns", "components")
+
+    def __init__(self, db):
+        ensure_indexes(db)
+        self.db = db
+        self.chats = db["chats"]
+
+    def load(self, session_id):
+        _count(self.db, "find")
+        return self.chats.find_one({"session_id": session_id}, _projection(self.FIELDS))
+
+    def save(self, session_id, data):
+        _count(self.db, "update")
+        self.chats.update_one({"session_id": session_id}, {"$set": data}, upsert=True)
+
+    def clear(self, session_id):
+        _count(self.db, "delete")
+        self.chats.delete_one({"session_id": session_id})
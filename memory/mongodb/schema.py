@@ -1,11 +1,16 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import Any, List, Dict
 from datetime import datetime
 
 class Report(BaseModel):
     report_id: str = Field(..., description="Unique report identifier")
     content: str = Field(..., description="The content of the report")
     created_at: str = Field(..., description="Timestamp when the report was created")
+    cache_key: str = Field(None, description="Key of the normalized query, report type and source")
+    query: str = Field(None, description="The research query as asked")
+    report_type: str = Field(None, description="Report type used to produce the report")
+    source: Dict[str, Any] = Field(None, description="Source configuration used to produce the report")
+    refreshed_at: float = Field(None, description="Epoch seconds when the content was last produced")
 
 class Log(BaseModel):
     log_id: str = Field(..., description="Unique log identifier")
@@ -0,0 +1,350 @@
+"""
+Module: memory/vectorstore/ingest.py
+
+Bulk ingestion of our own documents into the ``gptr_db.vector_store``
+collection used by ``load_vector_store``.
+
+Documents are streamed from text files, directories and JSONL files, split
+into overlapping chunks and deduplicated by a hash of their normalized text
+(within the run and against what is already stored). New chunks are embedded
+in batches of ``batch_size`` with up to ``concurrency`` batches in flight, and
+each embedded batch is written with one ``insert_many``. Embedding requests go
+through the LLM scheduler (``core.scheduler``), so rate limits and transient
+errors are retried the same way as chat calls.
+
+Documents whose chunks are all stored are recorded in a checkpoint file; an
+interrupted run started again with the same checkpoint skips them. The run
+ends with a throughput report.
+
+Usage:
+    python -m memory.vectorstore.ingest docs/ notes.jsonl --checkpoint ingest.ckpt.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.environ.get("TCA_INGEST_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.environ.get("TCA_INGEST_CHUNK_OVERLAP", "200"))
+BATCH_SIZE = int(os.environ.get("TCA_INGEST_BATCH_SIZE", "256"))
+CONCURRENCY = int(os.environ.get("TCA_INGEST_CONCURRENCY", "8"))
+
+# Field names MongoDBAtlasVectorSearch reads by default.
+TEXT_KEY = "text"
+EMBEDDING_KEY = "embedding"
+
+TEXT_SUFFIXES = (".txt", ".md", ".rst", ".html", ".csv")
+
+_SPACES = re.compile(r"\s+")
+
+
+################################################################################
+# Reading and chunking
+################################################################################
+
+def _jsonl_documents(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record.pop("text", None) or record.pop("page_content", None) or record.pop("content", None)
+            if not text:
+                continue
+            metadata = record.pop("metadata", None) or record
+            doc_id = str(record.get("id") or f"{path}:{lineno}")
+            yield doc_id, text, dict(metadata, source=metadata.get("source", path))
+
+
+def iter_documents(paths):
+    """
+    Stream ``(doc_id, text, metadata)`` from files and directories.
+
+    JSONL lines need a ``text`` (or ``page_content`` / ``content``) field; the
+    remaining fields, or a ``metadata`` object, become the chunk metadata.
+    Other files with a known text suffix are read whole.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    if name.endswith((".jsonl",) + TEXT_SUFFIXES):
+                        yield from iter_documents([full])
+        elif path.endswith(".jsonl"):
+            yield from _jsonl_documents(path)
+        else:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                yield path, f.read(), {"source": path}
+
+
+def split_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split ``text`` into chunks of at most ``chunk_size`` characters that
+    overlap by about ``overlap``, ending on a paragraph, line, sentence or
+    word boundary where one is close enough.
+    """
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for sep in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(sep)
+                if cut > chunk_size // 2:
+                    end = start + cut + len(sep)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def content_hash(text):
+    """Hash of the chunk text with case and whitespace normalized."""
+    normalized = _SPACES.sub(" ", text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+################################################################################
+# Checkpoint
+################################################################################
+
+class Checkpoint:
+    """Ids of fully ingested documents, persisted as JSON."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.completed = set(json.load(f).get("completed", []))
+
+    def __contains__(self, doc_id):
+        return doc_id in self.completed
+
+    def mark(self, doc_id):
+        self.completed.add(doc_id)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"completed": sorted(self.completed), "updated_at": time.time()}, f)
+        os.replace(tmp, self.path)
+
+
+################################################################################
+# Ingestion
+################################################################################
+
+class Ingestor:
+    """
+    Parameters:
+        collection: pymongo collection of the vector store.
+        embeddings: LangChain embeddings model (``embed_documents``).
+        batch_size (int): Chunks per embedding request and per ``insert_many``.
+        concurrency (int): Embedding batches in flight.
+        chunk_size (int): Maximum characters per chunk.
+        overlap (int): Characters shared by consecutive chunks.
+        checkpoint (Checkpoint, optional): Resume state.
+        checkpoint_every (int): Save the checkpoint after this many batches.
+    """
+
+    def __init__(self, collection, embeddings, batch_size=BATCH_SIZE, concurrency=CONCURRENCY,
+                 chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, checkpoint=None, checkpoint_every=10):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.checkpoint = checkpoint or Checkpoint()
+        self.checkpoint_every = checkpoint_every
+        self.stats = {"documents": 0, "resumed": 0, "chunks": 0, "duplicates": 0,
+                      "embedded": 0, "inserted": 0, "failed_batches": 0}
+        self._remaining = {}
+        self._batches = 0
+
+    def ensure_index(self):
+        try:
+            self.collection.create_index("content_hash", unique=True, sparse=True)
+        except Exception as e:
+            logger.warning("Could not create the content_hash index: %s", e)
+
+    def _embed(self, texts):
+        from core.scheduler import get_scheduler
+
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return self.embeddings.embed_documents(texts)
+        return scheduler.call(self.model, "ingest", texts, {},
+                              lambda: self.embeddings.embed_documents(texts))
+
+    def _stored_hashes(self, hashes):
+        cursor = self.collection.find({"content_hash": {"$in": hashes}}, {"content_hash": 1, "_id": 0})
+        return {doc["content_hash"] for doc in cursor}
+
+    def _write(self, batch):
+        """Embed and insert one batch; returns how many chunks were inserted."""
+        vectors = self._embed([doc[TEXT_KEY] for doc in batch])
+        for doc, vector in zip(batch, vectors):
+            doc[EMBEDDING_KEY] = vector
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            return len(batch)
+        except Exception as e:
+            # Another run may have stored some of the same chunks meanwhile.
+            details = getattr(e, "details", None) or {}
+            errors = details.get("writeErrors") or []
+            if errors and all(err.get("code") == 11000 for err in errors):
+                return details.get("nInserted", len(batch) - len(errors))
+            raise
+
+    def _done(self, doc_ids):
+        for doc_id in doc_ids:
+            self._remaining[doc_id] -= 1
+            if self._remaining[doc_id] == 0:
+                del self._remaining[doc_id]
+                self.checkpoint.mark(doc_id)
+
+    def _submit(self, executor, batch, inflight):
+        stored = self._stored_hashes([doc["content_hash"] for doc in batch])
+        if stored:
+            self.stats["duplicates"] += sum(doc["content_hash"] in stored for doc in batch)
+            self._done([doc["_doc_id"] for doc in batch if doc["content_hash"] in stored])
+            batch = [doc for doc in batch if doc["content_hash"] not in stored]
+        if not batch:
+            return
+        doc_ids = [doc.pop("_doc_id") for doc in batch]
+        inflight[executor.submit(self._write, batch)] = (doc_ids, len(batch))
+
+    def _collect(self, futures, inflight):
+        for future in futures:
+            doc_ids, size = inflight.pop(future)
+            try:
+                inserted = future.result()
+            except Exception as e:
+                # The documents stay out of the checkpoint, so a rerun retries them.
+                self.stats["failed_batches"] += 1
+                logger.warning("Batch of %d chunks failed (%s: %s)", size, type(e).__name__, e)
+                continue
+            self.stats["embedded"] += size
+            self.stats["inserted"] += inserted
+            metrics.increment("tca_ingest_chunks_total", inserted, result="inserted")
+            self._done(doc_ids)
+            self._batches += 1
+            if self._batches % self.checkpoint_every == 0:
+                self.checkpoint.save()
+
+    def run(self, documents):
+        """
+        Ingest ``(doc_id, text, metadata)`` tuples.
+
+        Returns:
+            dict: Counts and throughput for the run.
+        """
+        self.ensure_index()
+        start = time.perf_counter()
+        seen = set()
+        pending = []
+        inflight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="tca-ingest") as executor:
+            try:
+                for doc_id, text, metadata in documents:
+                    if doc_id in self.checkpoint:
+                        self.stats["resumed"] += 1
+                        continue
+                    self.stats["documents"] += 1
+                    queued = 0
+                    for index, chunk in enumerate(split_text(text, self.chunk_size, self.overlap)):
+                        self.stats["chunks"] += 1
+                        digest = content_hash(chunk)
+                        if digest in seen:
+                            self.stats["duplicates"] += 1
+                            continue
+                        seen.add(digest)
+                        pending.append(dict(metadata, **{TEXT_KEY: chunk, "content_hash": digest,
+                                                         "chunk_index": index, "_doc_id": doc_id}))
+                        queued += 1
+                    if queued:
+                        self._remaining[doc_id] = self._remaining.get(doc_id, 0) + queued
+                    elif doc_id not in self._remaining:
+                        self.checkpoint.mark(doc_id)
+
+                    while len(pending) >= self.batch_size:
+                        if len(inflight) >= self.concurrency:
+                            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                            self._collect(done, inflight)
+                        self._submit(executor, pending[:self.batch_size], inflight)
+                        del pending[:self.batch_size]
+                if pending:
+                    self._submit(executor, pending, inflight)
+                self._collect(list(inflight), inflight)
+            finally:
+                # On interruption, let running batches finish so their documents
+                # are checkpointed; batches not started yet are dropped.
+                for future in list(inflight):
+                    if future.cancel():
+                        inflight.pop(future)
+                self._collect(list(inflight), inflight)
+                self.checkpoint.save()
+
+        seconds = time.perf_counter() - start
+        metrics.increment("tca_ingest_chunks_total", self.stats["duplicates"], result="duplicate")
+        report = dict(self.stats)
+        report["seconds"] = round(seconds, 2)
+        report["chunks_per_second"] = round(self.stats["chunks"] / seconds, 1) if seconds else 0.0
+        report["embedded_per_second"] = round(self.stats["embedded"] / seconds, 1) if seconds else 0.0
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load documents into the MongoDB vector store.")
+    parser.add_argument("paths", nargs="+", help="Files, directories or .jsonl files")
+    parser.add_argument("--checkpoint", help="Resume file (created if missing)")
+    parser.add_argument("--reset", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--collection", default="vector_store")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    from memory.mongodb.mongo_helper import get_collection
+    from memory.vectorstore.vectorstore import get_embeddings
+
+    if args.reset and args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    ingestor = Ingestor(
+        get_collection(args.collection),
+        get_embeddings(),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        chunk_size=args.chunk_size,
+        overlap=args.overlap,
+        checkpoint=Checkpoint(args.checkpoint),
+    )
+    print(json.dumps(ingestor.run(iter_documents(args.paths)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,24 +5,36 @@ This module provides a helper to instantiate a MongoDB-backed vector store using
 Atlas integration. It uses the connection defined in memory/mongodb/mongo_helper.py.
 """
 
-from memory.mongodb.mongo_helper import MONGO_URI, db
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import MongoDBAtlasVectorSearch
+from memory.mongodb.mongo_helper import MONGO_URI
 
-def load_vector_store() -> MongoDBAtlasVectorSearch:
+# The full collection string needs to include database and collection.
+FULL_COLLECTION = "gptr_db.vector_store"
+INDEX_NAME = "default"
+
+def get_embeddings():
+    """Return the embeddings model used for the vector store."""
+    from langchain_community.embeddings import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(disallowed_special=())
+
+def load_vector_store():
     """
     Instantiate and return a MongoDBAtlasVectorSearch instance.
     
+    The langchain_community integrations are imported here, on first use, so
+    that importing this module does not pull in the embedding stack.
+    
     Returns:
         MongoDBAtlasVectorSearch: A vector store instance backed by MongoDB.
     """
-    embeddings = OpenAIEmbeddings(disallowed_special=())
-    # The full collection string needs to include database and collection.
-    full_collection = "gptr_db.vector_store"
+    from langchain_community.vectorstores import MongoDBAtlasVectorSearch
+
+    if not MONGO_URI:
+        raise ValueError("MONGO_URI environment variable must be set")
     vector_store = MongoDBAtlasVectorSearch.from_connection_string(
         MONGO_URI,
-        full_collection,
-        embeddings,
-        index_name="default"
+        FULL_COLLECTION,
+        get_embeddings(),
+        index_name=INDEX_NAME
     )
     return vector_store
\ No newline at end of file
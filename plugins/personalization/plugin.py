@@ -1,47 +1,25 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
+from core.routing import invoke_routed
+from core.structured import Field, Schema
+
+ANALYSIS_SCHEMA = Schema("personalization", {
+    "profile": Field(dict, required=False,
+                     description="personal details, traits, preferences, location, job, etc"),
+    "todos": Field(list, required=False, items=str, description="tasks they want or need to do"),
+    "instructions": Field(str, required=False,
+                          description="how they want things done or answered"),
+    "goals": Field(list, required=False, items=str, description="short or long-term goals"),
+})
+
+PROMPT = (
+    "You are a personalization assistant. Extract personal details, preferences, "
+    f"tasks and goals from the user's message. Reply with {ANALYSIS_SCHEMA.describe()}. "
+    "Leave out keys with nothing to report, and reply {} if there is nothing."
+)
 
 def analyze_personalization_context(user_input):
-    llm = ChatOpenAI(model="gpt-4", temperature=0.3)
-    prompt = (
-        "You are a personalization assistant. Extract personal details, preferences, tasks and goals from user input. "
-        "Output a clean JSON without quotes, using only relevant fields:\n"
-        "- profile: Personal details, traits, preferences, characteristics, location, job, etc\n"
-        "- todos: Tasks, to-dos, things they want/need to do\n"
-        "- instructions: How they want things done or how they prefer to be answered\n" 
-        "- goals: Short or long-term goals mentioned\n\n"
-        "Examples:\n\n"
-        "Input: stop being so nice\n"
-        "Output: {\n"
-        "  instructions: be direct without fluff\n"
-        "}\n\n"
-        "Input: I live in jerusalem\n" 
-        "Output: {\n"
-        "  profile: {\n"
-        "    location: jerusalem\n"
-        "  }\n"
-        "}\n\n"
-        "Input: i got fired and am trying to build a business\n"
-        "Output: {\n"
-        "  profile: {\n"
-        "    job: got fired recently and trying to build a business\n"
-        "  },\n"
-        "  goals: [build a business]\n"
-        "}\n\n"
-        f"User input: {user_input}\n"
-    )
     messages = [
-        SystemMessage(content=prompt),
+        SystemMessage(content=PROMPT),
         HumanMessage(content=user_input)
     ]
-    result = llm.invoke(messages)
-    try:
-        analysis = eval(result.content)
-    except Exception:
-        analysis = {
-            "profile": {},
-            "todos": [],
-            "instructions": "",
-            "goals": ""
-        }
-    return analysis
+    return invoke_routed("personalization", messages, ANALYSIS_SCHEMA)
@@ -1,29 +1,160 @@
-from langchain_openai import ChatOpenAI
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
 from langchain_core.messages import SystemMessage, HumanMessage
+from core.routing import current_mode, invoke_routed, route
+from core.scheduler import DeadlineExceeded, current_deadline
+from core.structured import FALLBACK_SOURCE, Field, Schema, StructuredOutputError
 
-def analyze_security_context(user_input):
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
-    prompt = (
-        "You are a security compliance analyzer. Given the following user input, "
-        "analyze and determine potential security risks and concerns. "
-        "Output a short JSON with keys 'intent', 'emotion', 'topic', 'tone', and 'risk_level'.\n\n"
-        f"User input: {user_input}\n\n"
-        "Example output:\n"
-        '{"intent": "general_query", "emotion": "neutral", "topic": "security compliance", "tone": "technical", "risk_level": "low"}\n'
-    )
+logger = logging.getLogger(__name__)
+
+RISK_LEVELS = ("low", "medium", "high", "critical")
+
+ANALYSIS_SCHEMA = Schema("security_analysis", {
+    "intent": Field(str, description="e.g. general_query, jailbreak_attempt"),
+    "emotion": Field(str),
+    "topic": Field(str),
+    "tone": Field(str),
+    "risk_level": Field(str, choices=RISK_LEVELS),
+    "confidence": Field(float, required=False, description="0-1, how sure you are"),
+})
+
+# Used when the reply cannot be parsed even after repair. The risk stays
+# above "low" so an unreadable verdict is never taken as an all-clear.
+DEFAULT_ANALYSIS = {"intent": "general_query", "emotion": "neutral", "topic": "security compliance",
+                    "tone": "technical", "risk_level": "medium"}
+
+PROMPT = (
+    "You are a security compliance analyzer. Determine the potential security "
+    "risks and concerns of the user's message. "
+    f"Reply with {ANALYSIS_SCHEMA.describe()}."
+)
+
+# Opt-in cross-session batching: concurrent screening requests wait up to
+# BATCH_MAX_WAIT_MS for others and are classified together in one call, with
+# up to BATCH_CONCURRENCY batch calls in flight.
+BATCHING = os.environ.get("TCA_SECURITY_BATCH", "false").lower() == "true"
+BATCH_MAX_SIZE = int(os.environ.get("TCA_SECURITY_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("TCA_SECURITY_BATCH_MAX_WAIT_MS", "10"))
+BATCH_CONCURRENCY = int(os.environ.get("TCA_SECURITY_BATCH_CONCURRENCY", "4"))
+
+BATCH_SCHEMA = Schema("security_analysis_batch", {
+    "results": Field(list, description="one object per message, in any order"),
+})
+
+BATCH_PROMPT = (
+    "You are a security compliance analyzer. You will receive several independent "
+    "user messages as a JSON list of {\"id\", \"message\"}. Determine the potential "
+    "security risks and concerns of each message on its own. "
+    f"Reply with {BATCH_SCHEMA.describe()}; each result is {ANALYSIS_SCHEMA.describe()}, "
+    "plus the message's \"id\"."
+)
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _analyze_one(user_input, mode=None):
     messages = [
-        SystemMessage(content=prompt),
+        SystemMessage(content=PROMPT),
         HumanMessage(content=user_input)
     ]
-    result = llm.invoke(messages)
     try:
-        analysis = eval(result.content)
-    except Exception:
-        analysis = {
-            "intent": "general_query",
-            "emotion": "neutral", 
-            "topic": "security compliance",
-            "tone": "technical",
-            "risk_level": "low"
-        }
-    return analysis
\ No newline at end of file
+        return invoke_routed("security_analysis", messages, ANALYSIS_SCHEMA, mode=mode)
+    except StructuredOutputError as e:
+        logger.warning("Security analysis unusable (%s); assuming risk '%s'", e, DEFAULT_ANALYSIS["risk_level"])
+        return dict(DEFAULT_ANALYSIS, source=FALLBACK_SOURCE)
+
+
+class _BatchMiss(Exception):
+    """A message the batch reply did not answer usably."""
+
+
+def _classify_batch(mode, items):
+    """
+    Classify several ``(message, deadline)`` items in one call.
+
+    Returns one analysis per message. Messages the reply leaves out, gets
+    wrong, or answers with low confidence (when escalation is configured)
+    get a ``_BatchMiss`` instead, and their callers ask about them alone; so
+    do all of them when the shared call itself fails.
+    """
+    from core.scheduler import deadline
+
+    texts = [text for text, _ in items]
+    deadlines = [d for _, d in items]
+    # Give the shared call as long as its most patient caller allows; callers
+    # with nearer deadlines stop waiting on their own (analyze_security_context).
+    budget = None if None in deadlines else max(0.0, max(deadlines) - time.monotonic())
+    with deadline(budget) if budget is not None else contextlib.nullcontext():
+        if len(texts) == 1:
+            return [_analyze_one(texts[0], mode)]
+        messages = [
+            SystemMessage(content=BATCH_PROMPT),
+            HumanMessage(content=json.dumps([{"id": i, "message": text} for i, text in enumerate(texts)])),
+        ]
+        try:
+            reply = invoke_routed("security_analysis", messages, BATCH_SCHEMA, mode=mode)
+        except Exception as e:
+            # An invalid reply, a rate limit or exhausted retries is not any one
+            # caller's failure: each retries alone, within its own deadline.
+            logger.info("Security batch of %d failed (%s: %s); classifying singly",
+                        len(texts), type(e).__name__, e)
+            return [_BatchMiss(f"batch call failed: {type(e).__name__}") for _ in texts]
+
+    r = route("security_analysis", mode)
+    results = [_BatchMiss("missing from batch reply") for _ in texts]
+    for item in reply["results"]:
+        try:
+            index = int(item.pop("id"))
+            analysis = ANALYSIS_SCHEMA.validate(item)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            continue
+        if not 0 <= index < len(texts):
+            continue
+        confidence = analysis.get("confidence")
+        if r.escalate_to and isinstance(confidence, (int, float)) and confidence < r.min_confidence:
+            results[index] = _BatchMiss("low confidence in batch reply")
+        else:
+            results[index] = analysis
+    return results
+
+
+def _get_batcher(mode):
+    from core.batching import MicroBatcher
+
+    with _batchers_lock:
+        batcher = _batchers.get(mode)
+        if batcher is None:
+            batcher = MicroBatcher(lambda items: _classify_batch(mode, items), BATCH_MAX_SIZE,
+                                   BATCH_MAX_WAIT_MS / 1000, name=f"security:{mode or 'default'}",
+                                   concurrency=BATCH_CONCURRENCY)
+            _batchers[mode] = batcher
+        return batcher
+
+
+def batch_stats():
+    """Items, batches and mean/largest batch size per mode's batcher."""
+    with _batchers_lock:
+        return {batcher.name: batcher.stats() for batcher in _batchers.values()}
+
+
+def analyze_security_context(user_input):
+    mode = current_mode()
+    if BATCHING:
+        at = current_deadline()
+        future = _get_batcher(mode).submit((user_input, at))
+        try:
+            return future.result(None if at is None else max(0.0, at - time.monotonic()))
+        except FutureTimeout:
+            if future.done():
+                raise  # the call itself timed out
+            raise DeadlineExceeded("security_analysis: deadline passed while batched")
+        except _BatchMiss:
+            pass  # not (reliably) answered in the batch; ask about it alone
+    return _analyze_one(user_input, mode)
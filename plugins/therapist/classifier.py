@@ -0,0 +1,394 @@
+# classifier.py
+"""
+Local fast path for therapist analysis.
+
+One multinomial logistic-regression model per label (emotion, intent, topic,
+tone) over hashed character n-gram and word features, trained on analyses the
+LLM already produced and which are saved in our checkpoints. At inference the
+classifier answers only when emotion, intent and topic all clear the
+confidence threshold; otherwise ``analyze_therapist_context`` escalates to the
+LLM. Tone is best effort: the model's tone when it is trained and confident,
+``DEFAULT_TONE`` otherwise.
+
+Training data comes from checkpoints: ``session_memory.turns[i].user`` paired
+with ``emotion_trends``/``intents``/``topics``/``tones`` (appended in lockstep
+with the turns; checkpoints older than ``tones`` only have the latest tone, in
+``components.last_analysis``). Turns the LLM did not label (a ``sources``
+entry such as ``"local_classifier"`` or ``"fallback"``) are skipped, so
+retraining never learns from its own predictions or defaults. JSONL files of
+``{"text": ..., "emotion": ..., "intent": ..., "topic": ..., "tone": ...}``
+are accepted as well.
+
+Usage:
+    python -m plugins.therapist.classifier train --source memory/langgraph_checkpoints.json \\
+        --output models/therapist_classifier.json.gz
+    python -m plugins.therapist.classifier evaluate --model models/therapist_classifier.json.gz \\
+        --source memory/langgraph_checkpoints.json --threshold 0.8
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import re
+import time
+import zlib
+
+LABELS = ("emotion", "intent", "topic", "tone")
+# Labels that must clear the threshold for a local answer.
+REQUIRED_LABELS = ("emotion", "intent", "topic")
+DEFAULT_TONE = "neutral"
+FORMAT_VERSION = 1
+
+_WORD = re.compile(r"\w+")
+
+
+def featurize(text, n_features, ngram_range=(2, 4)):
+    """
+    Hash character n-grams (within word boundaries) and words into a sparse,
+    L2-normalized vector.
+
+    Returns:
+        dict: feature index -> value.
+    """
+    features = {}
+    mask = n_features - 1
+    lo, hi = ngram_range
+    for word in _WORD.findall(text.lower()):
+        key = zlib.crc32(b"w:" + word.encode("utf-8")) & mask
+        features[key] = features.get(key, 0.0) + 1.0
+        padded = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                key = zlib.crc32(padded[i:i + n].encode("utf-8")) & mask
+                features[key] = features.get(key, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+
+class LabelModel:
+    """Softmax regression for one label over sparse hashed features."""
+
+    def __init__(self, classes):
+        self.classes = list(classes)
+        self.bias = [0.0] * len(self.classes)
+        self.weights = [{} for _ in self.classes]
+
+    def scores(self, x):
+        out = []
+        for k, w in enumerate(self.weights):
+            s = self.bias[k]
+            for f, v in x.items():
+                wf = w.get(f)
+                if wf is not None:
+                    s += wf * v
+            out.append(s)
+        return out
+
+    def probabilities(self, x):
+        scores = self.scores(x)
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, x):
+        probs = self.probabilities(x)
+        k = max(range(len(probs)), key=probs.__getitem__)
+        return self.classes[k], probs[k]
+
+    def fit(self, xs, ys, epochs=8, lr=0.5, l2=1e-5, seed=0):
+        index = {c: k for k, c in enumerate(self.classes)}
+        order = list(range(len(xs)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            step = lr / (1.0 + epoch)
+            for i in order:
+                x, target = xs[i], index[ys[i]]
+                probs = self.probabilities(x)
+                for k, p in enumerate(probs):
+                    grad = p - (1.0 if k == target else 0.0)
+                    if abs(grad) < 1e-4:
+                        continue
+                    self.bias[k] -= step * grad
+                    w = self.weights[k]
+                    for f, v in x.items():
+                        wf = w.get(f, 0.0)
+                        w[f] = wf - step * (grad * v + l2 * wf)
+        return self
+
+    def prune(self, threshold=1e-3):
+        self.weights = [{f: v for f, v in w.items() if abs(v) >= threshold} for w in self.weights]
+
+    def to_dict(self):
+        return {
+            "classes": self.classes,
+            "bias": self.bias,
+            "weights": [{str(f): round(v, 6) for f, v in w.items()} for w in self.weights],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["classes"])
+        model.bias = data["bias"]
+        model.weights = [{int(f): v for f, v in w.items()} for w in data["weights"]]
+        return model
+
+
+class LocalClassifier:
+    """
+    Per-label models sharing one feature space.
+
+    Parameters:
+        n_features (int): Hash space size (power of two).
+        ngram_range (tuple): Character n-gram lengths.
+    """
+
+    def __init__(self, n_features=2 ** 18, ngram_range=(2, 4)):
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.models = {}
+
+    def featurize(self, text):
+        return featurize(text, self.n_features, self.ngram_range)
+
+    def fit(self, examples, labels=LABELS, min_examples=2, epochs=8):
+        """Train one model per label from dicts holding "text" and label values."""
+        cache = {}
+        for label in labels:
+            rows = [e for e in examples if e.get(label)]
+            if len({e[label] for e in rows}) < 2 or len(rows) < min_examples:
+                continue
+            xs = []
+            for e in rows:
+                x = cache.get(e["text"])
+                if x is None:
+                    x = cache[e["text"]] = self.featurize(e["text"])
+                xs.append(x)
+            ys = [e[label] for e in rows]
+            model = LabelModel(sorted(set(ys))).fit(xs, ys, epochs=epochs)
+            model.prune()
+            self.models[label] = model
+        return self
+
+    def predict(self, text):
+        """Return {label: (value, confidence)} for every trained label."""
+        x = self.featurize(text)
+        return {label: model.predict(x) for label, model in self.models.items()}
+
+    def analyze(self, text, threshold):
+        """
+        Answer locally if confident.
+
+        Returns:
+            dict or None: An analysis with every label in ``LABELS``, or None when
+            a label in ``REQUIRED_LABELS`` is missing from the model or below
+            ``threshold``.
+        """
+        if any(label not in self.models for label in REQUIRED_LABELS):
+            return None
+        predictions = self.predict(text)
+        confidence = min(predictions[label][1] for label in REQUIRED_LABELS)
+        if confidence < threshold:
+            return None
+        analysis = {label: predictions[label][0] for label in REQUIRED_LABELS}
+        tone, tone_confidence = predictions.get("tone", (DEFAULT_TONE, 0.0))
+        analysis["tone"] = tone if tone_confidence >= threshold else DEFAULT_TONE
+        analysis["confidence"] = round(confidence, 4)
+        analysis["source"] = "local_classifier"
+        return analysis
+
+    def save(self, path):
+        data = {
+            "version": FORMAT_VERSION,
+            "n_features": self.n_features,
+            "ngram_range": list(self.ngram_range),
+            "models": {label: model.to_dict() for label, model in self.models.items()},
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported classifier format: {data.get('version')}")
+        classifier = cls(data["n_features"], data["ngram_range"])
+        classifier.models = {label: LabelModel.from_dict(m) for label, m in data["models"].items()}
+        return classifier
+
+
+_cached = {}
+
+
+def get_local_classifier():
+    """
+    Return the classifier configured by ``TCA_LOCAL_CLASSIFIER`` (a model path),
+    loading it once per process, or None when the fast path is disabled.
+    """
+    path = os.environ.get("TCA_LOCAL_CLASSIFIER")
+    if not path:
+        return None
+    classifier = _cached.get(path)
+    if classifier is None:
+        classifier = _cached[path] = LocalClassifier.load(path)
+    return classifier
+
+
+def examples_from_checkpoint(state):
+    """Extract labelled examples from one checkpoint document."""
+    memory = state.get("session_memory") or {}
+    turns = memory.get("turns") or state.get("turns") or []
+    texts = [t.get("user") for t in turns if isinstance(t, dict)]
+    columns = {
+        "emotion": memory.get("emotion_trends") or [],
+        "intent": memory.get("intents") or [],
+        "topic": memory.get("topics") or [],
+        "tone": memory.get("tones") or [],
+    }
+    # Older checkpoints have no (or a shorter) sources list; their turns count as LLM-labelled.
+    sources = memory.get("sources") or []
+    examples = []
+    # Labels and turns are appended in lockstep, so align them from the end.
+    for offset in range(1, len(texts) + 1):
+        text = texts[-offset]
+        if not text:
+            continue
+        if offset <= len(sources) and sources[-offset] is not None:
+            continue
+        example = {"text": text, "_offset": offset}
+        for label, values in columns.items():
+            if offset <= len(values) and isinstance(values[-offset], str):
+                example[label] = values[-offset]
+        examples.append(example)
+    last = (state.get("components") or {}).get("last_analysis") or {}
+    if examples and examples[0].pop("_offset") == 1 and last and last.get("source") is None:
+        # The newest turn's full analysis (the only tone older checkpoints kept).
+        for label in LABELS:
+            if isinstance(last.get(label), str):
+                examples[0][label] = last[label]
+    for example in examples:
+        example.pop("_offset", None)
+    return [e for e in examples if len(e) > 1]
+
+
+def load_examples(source):
+    """
+    Load labelled examples.
+
+    Parameters:
+        source (str): "mongo" for the chats collection, a checkpoint JSON file
+            ({user_id: checkpoint}), or a JSONL file of labelled examples.
+    """
+    if source == "mongo":
+        from memory.mongodb.mongo_helper import get_collection
+        projection = {"session_memory": 1, "turns": 1, "components.last_analysis": 1, "_id": 0}
+        examples = []
+        for doc in get_collection("chats").find({}, projection):
+            examples.extend(examples_from_checkpoint(doc))
+        return examples
+    if source.endswith(".jsonl"):
+        with open(source, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    with open(source, "r") as f:
+        data = json.load(f)
+    examples = []
+    for state in data.values():
+        if isinstance(state, dict):
+            examples.extend(examples_from_checkpoint(state))
+    return examples
+
+
+def evaluate(classifier, examples, threshold, llm_latency_ms):
+    """
+    Compare local predictions with the LLM's labels.
+
+    Returns:
+        dict: Per-label agreement overall and on locally answered inputs,
+        coverage at the threshold, local latency, and estimated LLM time saved.
+    """
+    agreement = {label: [0, 0] for label in classifier.models}
+    confident = {label: [0, 0] for label in classifier.models}
+    answered = 0
+    local_seconds = 0.0
+    for example in examples:
+        start = time.perf_counter()
+        local = classifier.analyze(example["text"], threshold)
+        local_seconds += time.perf_counter() - start
+        answered += local is not None
+        predictions = classifier.predict(example["text"])
+        for label, (value, _) in predictions.items():
+            if not example.get(label):
+                continue
+            hit = value == example[label]
+            agreement[label][0] += hit
+            agreement[label][1] += 1
+            if local is not None:
+                confident[label][0] += hit
+                confident[label][1] += 1
+    n = len(examples) or 1
+
+    def rate(pair):
+        return pair[0] / pair[1] if pair[1] else None
+
+    return {
+        "examples": len(examples),
+        "threshold": threshold,
+        "coverage": answered / n,
+        "agreement": {label: rate(pair) for label, pair in agreement.items()},
+        "agreement_when_local": {label: rate(pair) for label, pair in confident.items()},
+        "local_latency_us": local_seconds / n * 1e6,
+        "llm_latency_ms": llm_latency_ms,
+        "estimated_llm_ms_saved_per_turn": answered / n * llm_latency_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the local therapist classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="Train from saved analyses")
+    train.add_argument("--source", required=True, help="'mongo', checkpoint JSON, or JSONL")
+    train.add_argument("--output", required=True, help="Model path (.json or .json.gz)")
+    train.add_argument("--holdout", type=float, default=0.2, help="Fraction held out for the report")
+    train.add_argument("--epochs", type=int, default=8)
+    train.add_argument("--features", type=int, default=18, help="log2 of the hash space")
+    train.add_argument("--threshold", type=float, default=0.8)
+    train.add_argument("--llm-latency-ms", type=float, default=800.0)
+    train.add_argument("--seed", type=int, default=0)
+
+    ev = sub.add_parser("evaluate", help="Report agreement with the LLM and latency saved")
+    ev.add_argument("--model", required=True)
+    ev.add_argument("--source", required=True)
+    ev.add_argument("--threshold", type=float, default=0.8)
+    ev.add_argument("--llm-latency-ms", type=float, default=800.0)
+
+    args = parser.parse_args()
+    examples = load_examples(args.source)
+    if args.command == "train":
+        random.Random(args.seed).shuffle(examples)
+        cut = int(len(examples) * (1 - args.holdout))
+        train_set, test_set = examples[:cut], examples[cut:]
+        classifier = LocalClassifier(n_features=2 ** args.features)
+        classifier.fit(train_set, epochs=args.epochs)
+        classifier.save(args.output)
+        report = evaluate(classifier, test_set, args.threshold, args.llm_latency_ms)
+        report["trained_labels"] = sorted(classifier.models)
+        report["train_examples"] = len(train_set)
+        print(json.dumps(report, indent=2))
+    else:
+        classifier = LocalClassifier.load(args.model)
+        print(json.dumps(evaluate(classifier, examples, args.threshold, args.llm_latency_ms),
+                         indent=2))
+
+
+if __name__ == "__main__":
+    main()
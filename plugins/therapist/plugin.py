@@ -1,23 +1,49 @@
-from langchain_openai import ChatOpenAI
+import logging
+import os
+
 from langchain_core.messages import SystemMessage, HumanMessage
+from core import metrics
+from core.routing import invoke_routed
+from core.structured import FALLBACK_SOURCE, Field, Schema, StructuredOutputError
+from plugins.therapist.classifier import get_local_classifier
+
+logger = logging.getLogger(__name__)
+
+# Minimum per-label confidence for the local classifier to answer without the LLM.
+LOCAL_THRESHOLD = float(os.environ.get("TCA_LOCAL_CLASSIFIER_THRESHOLD", "0.8"))
+
+ANALYSIS_SCHEMA = Schema("therapist_analysis", {
+    "emotion": Field(str, description="primary emotion, e.g. fatigue"),
+    "intent": Field(str, description="e.g. emotional_disclosure"),
+    "topic": Field(str, description="e.g. personal struggle"),
+    "tone": Field(str, description="e.g. vulnerable"),
+    "confidence": Field(float, required=False, description="0-1, how sure you are"),
+})
+
+# Used when the reply cannot be parsed even after repair.
+DEFAULT_ANALYSIS = {"emotion": "neutral", "intent": "emotional_disclosure",
+                    "topic": "personal struggle", "tone": "neutral"}
+
+PROMPT = (
+    "You are a therapist assistant. Determine the primary emotion and intent "
+    f"of the user's message. Reply with {ANALYSIS_SCHEMA.describe()}."
+)
 
 def analyze_therapist_context(user_input):
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
-    prompt = (
-        "You are a therapist assistant. Given the following user input, "
-        "analyze and determine the user's primary emotion and intent. "
-        "Output a short JSON with keys 'emotion', 'intent', 'topic', and 'tone'.\n\n"
-        f"User input: {user_input}\n\n"
-        "Example output:\n"
-        '{"emotion": "fatigue", "intent": "emotional_disclosure", "topic": "personal struggle", "tone": "vulnerable"}\n'
-    )
+    classifier = get_local_classifier()
+    if classifier is not None:
+        local = classifier.analyze(user_input, LOCAL_THRESHOLD)
+        metrics.increment("tca_local_classifier_total",
+                          result="local" if local is not None else "escalated")
+        if local is not None:
+            return local
+
     messages = [
-        SystemMessage(content=prompt),
+        SystemMessage(content=PROMPT),
         HumanMessage(content=user_input)
     ]
-    result = llm.invoke(messages)
     try:
-        analysis = eval(result.content)
-    except Exception:
-        analysis = {"emotion": "neutral", "intent": "emotional_disclosure", "topic": "personal struggle", "tone": "neutral"}
-    return analysis
\ No newline at end of file
+        return invoke_routed("therapist_analysis", messages, ANALYSIS_SCHEMA)
+    except StructuredOutputError as e:
+        logger.warning("Therapist analysis unusable (%s); using the neutral default", e)
+        return dict(DEFAULT_ANALYSIS, source=FALLBACK_SOURCE)
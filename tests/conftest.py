@@ -0,0 +1,16 @@
+import pytest
+
+from core import llm
+from fakes import ScriptedModel
+
+
+@pytest.fixture
+def scripted_llm():
+    """Install a ``ScriptedModel`` behind ``get_chat_model``: ``scripted_llm(*replies)``."""
+    def install(*replies):
+        model = ScriptedModel(replies)
+        llm.set_chat_model_factory(lambda **kwargs: model)
+        return model
+
+    yield install
+    llm.set_chat_model_factory(None)
@@ -0,0 +1,29 @@
+"""Fake chat models for tests."""
+
+
+class Reply:
+    """Minimal chat model reply."""
+
+    def __init__(self, content):
+        self.content = content
+        self.response_metadata = {}
+
+
+class ScriptedModel:
+    """
+    Chat model that answers from a script and records every prompt.
+
+    Replies are used in order and the last one repeats; an exception in the
+    script is raised instead of returned.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append(messages)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return Reply(reply)
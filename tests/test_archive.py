@@ -0,0 +1,52 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import memory.langraph_adapter as adapter
+import memory.memory_store as memory_store
+from memory import archive
+
+CHECKPOINT = {
+    "user_id": "u1",
+    "session_memory": {"emotion_trends": ["calm", "sad"], "user_profile": {"name": "Old"}},
+    "turns": [{"user": "hi", "bot": "hello"}, {"user": "long day", "bot": "tell me more"}],
+    "components": {},
+    "updated_at": "2020-01-01T00:00:00",
+}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock.MongoClient().db
+    monkeypatch.setattr(adapter, "_get_mongo_db", lambda: db)
+    monkeypatch.setattr(memory_store, "_get_mongo_db", lambda: db)
+    return db
+
+
+def test_archive_then_profile_write_then_load_restores_the_conversation(db):
+    db.chats.insert_one(dict(CHECKPOINT))
+    db.chats.insert_one({"session_id": "s1", "session_memory": {}, "turns": []})  # a chat history
+
+    assert archive.archive_idle(idle_days=30)["archived"] == 1
+    assert db.chats.count_documents({"user_id": "u1"}) == 0
+
+    # A profile update for the archived user leaves a partial document in chats.
+    memory_store.update_user_profiles({"u1": [{"name": "Ada"}]})
+    state = adapter.LangGraphMemoryAdapter.load_checkpoint("u1")
+
+    assert state["turns"] == CHECKPOINT["turns"]
+    assert state["session_memory"] == CHECKPOINT["session_memory"]
+    assert state["user_profile"]["data"] == {"name": "Ada"}
+    assert db[archive.ARCHIVE_COLLECTION].count_documents({}) == 0
+    assert db.chats.find_one({"user_id": "u1"})["turns"] == CHECKPOINT["turns"]
+
+
+def test_tier_stats_without_collstats(db):
+    db.chats.insert_one(dict(CHECKPOINT))
+    archive.archive_idle(idle_days=30)
+
+    tiers = archive.tier_stats()
+
+    assert tiers["hot"]["count"] == 0
+    assert tiers["archive"]["count"] == 1
+    assert tiers["archive"]["storage_bytes"] > 0
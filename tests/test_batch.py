@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks import fake_llm
+from core import llm
+from core.batch import process_batch
+
+SESSIONS = ("a", "b", "c", "d")
+
+
+@pytest.fixture
+def offline_llm():
+    fake_llm.install(latency=0.002)
+    yield
+    llm.set_chat_model_factory(None)
+
+
+def test_results_come_back_in_input_order(offline_llm):
+    items = [(SESSIONS[i % 3 if i % 5 else 3], f"message {i}") for i in range(30)]
+
+    results = list(process_batch(items, mode="security", respond=False, concurrency=4,
+                                 batch_size=7, persist=False, load_state=False))
+
+    assert [r["index"] for r in results] == list(range(30))
+    assert [(r["session_id"], r["message"]) for r in results] == items
+    assert all(r["error"] is None for r in results)
+
+
+def test_each_session_sees_its_messages_in_order(offline_llm, monkeypatch):
+    from core.pipeline import TCAPipeline
+
+    seen = {}
+    process = TCAPipeline.process
+
+    def recording_process(self, user_input, **kwargs):
+        seen.setdefault(self.session_id, []).append(user_input)
+        return process(self, user_input, **kwargs)
+
+    monkeypatch.setattr(TCAPipeline, "process", recording_process)
+    items = [(SESSIONS[i % 4], f"message {i}") for i in range(24)]
+
+    list(process_batch(items, mode="security", respond=False, concurrency=4,
+                       batch_size=5, persist=False, load_state=False))
+
+    for session_id in SESSIONS:
+        assert seen[session_id] == [m for sid, m in items if sid == session_id]
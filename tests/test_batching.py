@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.batching import MicroBatcher
+from fakes import Reply
+
+
+def test_results_go_back_to_their_own_callers_in_order():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_size=8, max_wait=0.05, name="test")
+    futures = [batcher.submit(i) for i in range(20)]
+
+    assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(20)]
+    assert [item for batch in batches for item in batch] == list(range(20))
+    assert max(len(batch) for batch in batches) == 8
+    assert batcher.stats()["items"] == 20
+
+
+def test_an_exception_result_fails_only_its_own_caller():
+    batcher = MicroBatcher(lambda items: [ValueError(i) if i % 2 else i for i in items],
+                           max_size=4, max_wait=0.05, name="test")
+    futures = [batcher.submit(i) for i in range(4)]
+
+    assert futures[0].result(timeout=5) == 0
+    assert futures[2].result(timeout=5) == 2
+    for future in (futures[1], futures[3]):
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+
+
+def test_a_batch_failure_reaches_every_caller_in_the_batch():
+    def fail(items):
+        raise RuntimeError("provider down")
+
+    batcher = MicroBatcher(fail, max_size=4, max_wait=0.05, name="test")
+    futures = [batcher.submit(i) for i in range(4)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="provider down"):
+            future.result(timeout=5)
+
+
+def test_a_wrong_number_of_results_is_a_batch_failure():
+    batcher = MicroBatcher(lambda items: items[:-1], max_size=2, max_wait=0.05, name="test")
+    futures = [batcher.submit(i) for i in range(2)]
+
+    for future in futures:
+        with pytest.raises(ValueError, match="1 results for 2 items"):
+            future.result(timeout=5)
+
+
+def test_batches_run_concurrently_up_to_the_limit():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(items):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return items
+
+    batcher = MicroBatcher(slow, max_size=1, max_wait=0.0, name="test", concurrency=3)
+    futures = [batcher.submit(i) for i in range(9)]
+
+    assert [f.result(timeout=5) for f in futures] == list(range(9))
+    assert peak[0] == 3
+
+
+class _BatchFailsModel:
+    """Fails every batched prompt (say, a rate limit); answers single prompts."""
+
+    def __init__(self):
+        self.batch_calls = 0
+
+    def invoke(self, messages, **kwargs):
+        if "several independent" in messages[0].content:
+            self.batch_calls += 1
+            raise RuntimeError("rate limited")
+        return Reply(json.dumps({"intent": "general_query", "emotion": "neutral", "topic": messages[-1].content,
+                                 "tone": "technical", "risk_level": "low"}))
+
+
+def test_security_batch_failure_falls_back_to_single_calls(monkeypatch):
+    from core import llm
+    from plugins.security import plugin
+
+    model = _BatchFailsModel()
+    llm.set_chat_model_factory(lambda **kwargs: model)
+    monkeypatch.setattr(plugin, "BATCHING", True)
+    monkeypatch.setattr(plugin, "BATCH_MAX_WAIT_MS", 100)
+    monkeypatch.setattr(plugin, "_batchers", {})
+    try:
+        messages = [f"question {i}" for i in range(4)]
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(plugin.analyze_security_context, messages))
+    finally:
+        llm.set_chat_model_factory(None)
+
+    assert model.batch_calls >= 1
+    assert [r["topic"] for r in results] == messages
@@ -0,0 +1,40 @@
+from plugins.therapist.classifier import DEFAULT_TONE, LocalClassifier, examples_from_checkpoint
+
+TIRED = {"emotion": "fatigue", "intent": "emotional_disclosure", "topic": "sleep"}
+WORK = {"emotion": "anxiety", "intent": "seeking_advice", "topic": "work"}
+
+
+def _examples():
+    tired = ["I am so tired", "I could not sleep again", "exhausted all day", "so sleepy and tired"]
+    work = ["my boss keeps shouting", "deadline at work tomorrow", "work meeting stress", "my job is too much"]
+    return [dict(TIRED, text=t) for t in tired] + [dict(WORK, text=t) for t in work]
+
+
+def test_answers_without_a_trained_tone_model():
+    classifier = LocalClassifier(n_features=2 ** 12).fit(_examples(), epochs=30)
+    assert "tone" not in classifier.models
+
+    analysis = classifier.analyze("I am tired and could not sleep", threshold=0.5)
+
+    assert analysis is not None
+    assert analysis["emotion"] == "fatigue"
+    assert analysis["tone"] == DEFAULT_TONE
+    assert analysis["source"] == "local_classifier"
+
+
+def test_training_examples_skip_turns_not_labelled_by_the_llm():
+    state = {
+        "session_memory": {
+            "turns": [{"user": "first"}, {"user": "second"}, {"user": "third"}],
+            "emotion_trends": ["calm", "sad", "happy"],
+            "intents": ["a", "b", "c"],
+            "topics": ["x", "y", "z"],
+            "tones": ["warm", "low", "bright"],
+            "sources": [None, "local_classifier", "fallback"],
+        },
+        "components": {"last_analysis": {"emotion": "happy", "tone": "bright", "source": "fallback"}},
+    }
+
+    examples = examples_from_checkpoint(state)
+
+    assert examples == [{"text": "first", "emotion": "calm", "intent": "a", "topic": "x", "tone": "warm"}]
@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.llm import SingleFlight
+
+
+def _run_overlapping(flight, fn, callers=5):
+    """Start ``callers`` calls for one key while the leader is held; return their futures."""
+    release = threading.Event()
+    calls = []
+
+    def leader_fn():
+        calls.append(1)
+        release.wait(5)
+        return fn()
+
+    executor = ThreadPoolExecutor(max_workers=callers)
+    futures = [executor.submit(flight.do, "key", leader_fn) for _ in range(callers)]
+    end = time.monotonic() + 5
+    while flight.stats()["requests"] < callers and time.monotonic() < end:
+        time.sleep(0.001)
+    release.set()
+    executor.shutdown(wait=True)
+    return futures, calls
+
+
+def test_overlapping_calls_share_one_request():
+    flight = SingleFlight()
+    futures, calls = _run_overlapping(flight, lambda: "reply")
+
+    assert [f.result() for f in futures] == ["reply"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"requests": 5, "coalesced": 4, "coalescing_rate": 0.8}
+
+
+def test_the_leaders_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    def fail():
+        raise ConnectionError("provider down")
+
+    futures, calls = _run_overlapping(flight, fail)
+
+    assert len(calls) == 1
+    for future in futures:
+        with pytest.raises(ConnectionError, match="provider down"):
+            future.result()
+
+
+def test_nothing_is_cached_after_the_call_completes():
+    flight = SingleFlight()
+    replies = iter(["first", "second"])
+
+    assert flight.do("key", lambda: next(replies)) == "first"
+    assert flight.do("key", lambda: next(replies)) == "second"
+    assert flight.stats()["coalesced"] == 0
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from core import registry
+
+
+def analyze_marketing_context(user_input):
+    return {"campaign": user_input}
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(registry, "_targets", {})
+    monkeypatch.setattr(registry, "_analyzers", {})
+    monkeypatch.setattr(registry, "_modes", {})
+    monkeypatch.setattr(registry, "_loaded", False)
+    monkeypatch.setattr(registry, "_load_entry_points", lambda: None)
+    return registry
+
+
+def test_plugins_file_is_loaded(fresh_registry, tmp_path, monkeypatch):
+    config = {
+        "analyzers": {"marketing": f"{__name__}:analyze_marketing_context"},
+        "modes": {
+            "marketing": {
+                "response": "therapist",
+                "analyzers": [
+                    {"name": "marketing", "timeout": 20},
+                    {"name": "personalization", "key": "personalization", "required": False},
+                ],
+            }
+        },
+    }
+    path = tmp_path / "plugins.json"
+    path.write_text(json.dumps(config))
+    monkeypatch.setenv("TCA_PLUGINS", str(path))
+
+    mode = fresh_registry.get_mode("marketing")
+
+    assert mode.response == "therapist"
+    assert [a.name for a in mode.analyzers] == ["marketing", "personalization"]
+    assert mode.analyzers[0].timeout == 20.0
+    assert fresh_registry.get_analyzer("marketing")("spring sale") == {"campaign": "spring sale"}
+    # Built-ins are still there alongside the file's entries.
+    assert fresh_registry.get_mode("therapist").response == "therapist"
@@ -0,0 +1,124 @@
+import pytest
+
+from core import scheduler
+from core.scheduler import LLMScheduler, ModelScheduler, PRIORITY_ANALYSIS
+from fakes import Reply
+
+
+class FakeClock:
+    """Stands in for the ``time`` module: ``sleep`` advances ``monotonic``."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class APIError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after}})()
+
+
+class FlakyCall:
+    """Raises the scripted errors in order, then returns a reply."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    def __call__(self):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return Reply("ok")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    # Full jitter: take the top of the range so the delays are predictable.
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def _call(llm_scheduler, fn):
+    return llm_scheduler.call("m", "therapist_analysis", "prompt", {}, fn)
+
+
+def test_transient_errors_are_retried_with_exponential_backoff(clock):
+    fn = FlakyCall(ConnectionError(), APIError(503), ConnectionError())
+
+    assert _call(LLMScheduler(limits={}), fn).content == "ok"
+    assert fn.attempts == 4
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+
+
+def test_retry_after_is_honoured_and_a_429_halves_concurrency(clock):
+    llm_scheduler = LLMScheduler(limits={"m": {"initial_concurrency": 8}})
+    fn = FlakyCall(APIError(429, retry_after="7"))
+
+    _call(llm_scheduler, fn)
+
+    assert clock.sleeps == [7.0]
+    # Halved by the 429, then grown by 1/limit on the successful retry.
+    assert llm_scheduler.for_model("m").limit == pytest.approx(4.25)
+
+
+def test_no_retry_that_would_overrun_the_deadline(clock):
+    fn = FlakyCall(ConnectionError(), ConnectionError())
+
+    with scheduler.deadline(2.5):
+        with pytest.raises(ConnectionError):
+            _call(LLMScheduler(limits={}), fn)
+    assert fn.attempts == 2
+    assert clock.sleeps == [1.0]
+
+
+def test_permanent_errors_are_not_retried(clock):
+    fn = FlakyCall(APIError(400))
+
+    with pytest.raises(APIError):
+        _call(LLMScheduler(limits={}), fn)
+    assert fn.attempts == 1
+    assert clock.sleeps == []
+
+
+def _finish(model_scheduler, **outcome):
+    model_scheduler.acquire(PRIORITY_ANALYSIS, cost=1)
+    model_scheduler.release(**outcome)
+
+
+def test_concurrency_grows_additively_and_shrinks_multiplicatively():
+    model_scheduler = ModelScheduler("m", initial_concurrency=4, max_concurrency=5)
+
+    _finish(model_scheduler, latency=0.1)
+    assert model_scheduler.limit == pytest.approx(4.25)
+
+    _finish(model_scheduler, throttled=True)
+    assert model_scheduler.limit == pytest.approx(2.125)
+
+    for _ in range(100):
+        _finish(model_scheduler, latency=0.1)
+    assert model_scheduler.limit == 5
+
+    # A call far slower than the moving average backs off gently.
+    _finish(model_scheduler, latency=1.0)
+    assert model_scheduler.limit == pytest.approx(4.5)
+
+
+def test_concurrency_never_drops_below_the_minimum():
+    model_scheduler = ModelScheduler("m", initial_concurrency=2, min_concurrency=1)
+
+    for _ in range(5):
+        _finish(model_scheduler, throttled=True)
+    assert model_scheduler.limit == 1
+    assert model_scheduler.in_flight == 0
@@ -0,0 +1,51 @@
+import pytest
+
+from core.structured import FALLBACK_SOURCE, Field, Schema, StructuredOutputError, invoke_structured
+from fakes import ScriptedModel
+
+SCHEMA = Schema("test_analysis", {
+    "emotion": Field(str),
+    "risk_level": Field(str, choices=("low", "high")),
+})
+
+
+def test_parses_fenced_json_and_normalizes_choices():
+    parsed = SCHEMA.parse('```json\n{"emotion": "calm", "risk_level": "HIGH"}\n```')
+    assert parsed == {"emotion": "calm", "risk_level": "high"}
+
+
+def test_repairs_an_invalid_reply():
+    model = ScriptedModel(["not json at all", '{"emotion": "calm", "risk_level": "low"}'])
+
+    assert invoke_structured(model, ["prompt"], SCHEMA) == {"emotion": "calm", "risk_level": "low"}
+    assert len(model.calls) == 2
+    # The repair prompt shows the model its own reply and what was wrong with it.
+    assert model.calls[1][-2].content == "not json at all"
+    assert "no JSON object" in model.calls[1][-1].content
+
+
+def test_raises_when_the_repair_fails_too():
+    model = ScriptedModel(["not json at all", '{"emotion": "calm"}'])
+
+    with pytest.raises(StructuredOutputError) as info:
+        invoke_structured(model, ["prompt"], SCHEMA, max_repairs=1)
+    assert "missing 'risk_level'" in str(info.value)
+    assert len(model.calls) == 2
+
+
+def test_therapist_analyzer_falls_back_to_the_neutral_default(scripted_llm):
+    from plugins.therapist.plugin import DEFAULT_ANALYSIS, analyze_therapist_context
+
+    scripted_llm("not json at all")
+
+    assert analyze_therapist_context("I had a long day") == dict(DEFAULT_ANALYSIS, source=FALLBACK_SOURCE)
+
+
+def test_security_analyzer_falls_back_to_a_cautious_risk_level(scripted_llm):
+    from plugins.security.plugin import analyze_security_context
+
+    scripted_llm("not json at all")
+
+    analysis = analyze_security_context("how do I reset my password?")
+    assert analysis["source"] == FALLBACK_SOURCE
+    assert analysis["risk_level"] not in ("low", None)